@@ -1,8 +1,122 @@
+import math
+import time
+from ParserDatabases import Cache
+from ParserDatabases import Dialect
+from ParserDatabases import Rollup
+from ParserDatabases import Sketch
+
+INTERVAL_UNITS = {'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400, 'WEEK': 604800}
+
+
+# Интервал в виде '30 SECOND' / '5 MINUTE' или число минут -> секунды
+def interval_seconds(interval):
+    if isinstance(interval, int):
+        return interval * 60
+    amount, unit = str(interval).split()
+    return int(amount) * INTERVAL_UNITS[unit.upper().rstrip('S')]
+
+
+# Начало временного интервала (UTC) в виде 'ГГГГ-ММ-ДД ЧЧ:ММ'
+def bucket_label(epoch):
+    return time.strftime('%Y-%m-%d %H:%M', time.gmtime(epoch))
+
+
+# Ближайшая граница минуты не раньше since: полные минуты берутся из
+# поминутных агрегатов, неполная минута [since, граница) - из log_data по индексу
+def minute_ceil(since):
+    return -(-since // 60) * 60
+
+
+# Запрос в логе - ровно три слова (метод, путь, протокол), см. Parser.LOG_PATTERN
+REQUEST_WORDS = 3
+
+
+# В нормализованной схеме (normalized=True) тексты user_agent, referer и request
+# лежат в справочниках: агрегация идёт по целым id, а текст подтягивается
+# JOIN-ом только для итоговых строк.
+# С rollups=True временные запросы и статистика по воркерам и User-Agent
+# считаются по поминутным агрегатам rollup_*, которые ведёт импорт; пока
+# агрегаты не покрывают все строки log_data, запросы идут по самой log_data.
+# С sketches=True самые частые User-Agent и пары IP/User-Agent берутся
+# приближённо из скетчей Space-Saving, число различных значений - из
+# поминутных скетчей HyperLogLog, перцентили задержек - из поминутных
+# скетчей квантилей по воркерам; все скетчи сохраняет импорт. Пока скетчи
+# учитывают не все строки log_data, запросы идут по самой log_data.
+# С result_cache (Cache.ResultCache) повторные вызовы с теми же аргументами
+# при неизменной версии данных отдаются из кэша.
+# Запросы пишутся в стиле MySQL; различия СУБД берёт на себя Dialect.
 class LogAnalyzer:
-    def __init__(self, db_connector):
+    def __init__(self, db_connector, normalized=False, rollups=False, sketches=False, result_cache=None):
         self.db_connector = db_connector
+        self.dialect = Dialect.for_database(db_connector.database)
+        self.normalized = normalized
+        self.rollups = rollups
+        self.sketches = sketches
+        self.result_cache = result_cache
+        # Результаты проверок покрытия: имя -> (версия данных, покрывают ли агрегаты log_data)
+        self.coverage = {}
+
+    # Режимы, от которых зависит ответ, входят в ключ кэша
+    def cache_scope(self):
+        return self.normalized, self.rollups, self.sketches
+
+    def execute(self, query, params=None):
+        return self.db_connector.execute_query(self.dialect.query(query), params)
+
+    # Строки запроса по мере чтения с сервера, без сборки всего результата в памяти
+    def stream(self, query, params=None):
+        return self.db_connector.stream_query(self.dialect.query(query), params)
+
+    # Агрегаты ведёт только импорт с соответствующим флагом: если часть строк log_data
+    # загружена без него, ответ по ним был бы неполным. Число учтённых строк сравнивается
+    # с COUNT(*) по log_data; проверка повторяется только при смене версии данных.
+    def covers_log_data(self, name, covered_rows, log_data_rows_query):
+        version = Cache.current_version(self.db_connector)
+        checked = self.coverage.get(name)
+        if checked is None or checked[0] != version:
+            total = self.execute(log_data_rows_query)[0][0]
+            checked = self.coverage[name] = (version, int(covered_rows()) == int(total))
+        return checked[1]
+
+    def rollups_complete(self):
+        return self.covers_log_data('rollups', lambda: self.execute(Rollup.COVERED_ROWS_QUERY)[0][0],
+                                    Rollup.LOG_DATA_ROWS_QUERY)
+
+    def sketches_complete(self):
+        return self.covers_log_data('sketches', self.sketched_rows, Sketch.LOG_DATA_ROWS_QUERY)
+
+    def sketched_rows(self):
+        sketch = Sketch.load_sketch(self.db_connector, 'user_agent')
+        return 0 if sketch is None else sketch.total
+
+    # Первые slash_count + 1 слов запроса; три и больше - запрос целиком, без строковых функций
+    def request_pattern(self, column, slash_count):
+        if slash_count + 1 >= REQUEST_WORDS:
+            return column
+        return self.dialect.leading_words(column, slash_count + 1)
     
+    @Cache.cached()
     def get_ip_user_agent_statistics(self, n):
+        if self.sketches and self.sketches_complete():
+            sketch = Sketch.load_sketch(self.db_connector, 'ip_user_agent')
+            if sketch is None:
+                return []
+            return [(ip_address, user_agent, count)
+                    for (ip_address, user_agent), count, _ in sketch.most_common(n)]
+        if self.normalized:
+            query = """
+                SELECT t.ip_address, u.value, t.count
+                FROM (
+                    SELECT ip_address, user_agent_id, COUNT(*) AS count
+                    FROM log_data
+                    GROUP BY ip_address, user_agent_id
+                    ORDER BY count DESC
+                    LIMIT %s
+                ) t
+                JOIN user_agents u ON u.id = t.user_agent_id
+                ORDER BY t.count DESC
+            """
+            return self.execute(query, (n,))
         query = f"""
             SELECT ip_address, user_agent, COUNT(*) as count
             FROM log_data
@@ -10,20 +124,63 @@ class LogAnalyzer:
             ORDER BY count DESC
             LIMIT {n}
         """
-        result = self.db_connector.execute_query(query)
+        result = self.execute(query)
         return result
     
+    @Cache.cached()
     def get_query_frequency(self, dT):
-        query = """
-            SELECT DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i') AS interval_start, COUNT(*) AS frequency
+        # Группировка по целочисленному номеру интервала длиной dT минут
+        width = dT * 60
+        if self.rollups and self.rollups_complete():
+            query = f"""
+                SELECT {self.dialect.integer_division('minute_epoch', '%s')} AS bucket, SUM(requests) AS frequency
+                FROM rollup_status_minute
+                GROUP BY bucket
+                ORDER BY bucket
+            """
+            result = self.execute(query, (width,))
+            return [(bucket_label(row[0] * width), int(row[1])) for row in result]
+        query = f"""
+            SELECT {self.dialect.integer_division('epoch', '%s')} AS bucket, COUNT(*) AS frequency
             FROM log_data
-            GROUP BY interval_start
-            ORDER BY interval_start
+            WHERE epoch IS NOT NULL
+            GROUP BY bucket
+            ORDER BY bucket
         """
-        result = self.db_connector.execute_query(query)
-        return result
+        result = self.execute(query, (width,))
+        return [(bucket_label(row[0] * width), row[1]) for row in result]
     
+    @Cache.cached()
     def get_top_user_agents(self, N):
+        if self.sketches and self.sketches_complete():
+            sketch = Sketch.load_sketch(self.db_connector, 'user_agent')
+            if sketch is None:
+                return []
+            return [(user_agent, count) for user_agent, count, _ in sketch.most_common(N)]
+        if self.normalized:
+            query = """
+                SELECT u.value, t.frequency
+                FROM (
+                    SELECT user_agent_id, COUNT(*) AS frequency
+                    FROM log_data
+                    GROUP BY user_agent_id
+                    ORDER BY frequency DESC
+                    LIMIT %s
+                ) t
+                JOIN user_agents u ON u.id = t.user_agent_id
+                ORDER BY t.frequency DESC
+            """
+            return self.execute(query, (N,))
+        if self.rollups and self.rollups_complete():
+            query = """
+                SELECT MAX(user_agent), SUM(requests) AS frequency
+                FROM rollup_user_agent_minute
+                GROUP BY user_agent_hash
+                ORDER BY frequency DESC
+                LIMIT %s
+            """
+            result = self.execute(query, (N,))
+            return [(row[0], int(row[1])) for row in result]
         query = """
             SELECT user_agent, COUNT(*) AS frequency
             FROM log_data
@@ -31,20 +188,51 @@ class LogAnalyzer:
             ORDER BY frequency DESC
             LIMIT %s
         """
-        result = self.db_connector.execute_query(query, (N,))
+        result = self.execute(query, (N,))
         return result
     
+    # Погрешность приближённых top-K: для каждого скетча число учтённых строк,
+    # число счётчиков и максимальное завышение оценки (не больше строк / счётчиков)
+    @Cache.cached()
+    def get_top_k_error_bounds(self):
+        bounds = []
+        for name in ('ip_user_agent', 'user_agent'):
+            sketch = Sketch.load_sketch(self.db_connector, name)
+            if sketch is not None:
+                bounds.append((name, sketch.total, sketch.capacity, sketch.max_error()))
+        return bounds
+
+    @Cache.cached(relative_time=True)
     def get_status_code_statistics(self, dT):
+        since = int(time.time()) - dT * 60
+        if self.rollups and self.rollups_complete():
+            query = """
+                SELECT status_code, SUM(frequency) AS frequency
+                FROM (
+                    SELECT status_code, requests AS frequency
+                    FROM rollup_status_minute
+                    WHERE status_code BETWEEN 500 AND 599 AND minute_epoch >= %s
+                    UNION ALL
+                    SELECT status_code, 1 AS frequency
+                    FROM log_data
+                    WHERE status_code BETWEEN 500 AND 599 AND epoch >= %s AND epoch < %s
+                ) t
+                GROUP BY status_code
+            """
+            boundary = minute_ceil(since)
+            result = self.execute(query, (boundary, since, boundary))
+            return [(row[0], int(row[1])) for row in result]
         query = """
             SELECT status_code, COUNT(*) AS frequency
             FROM log_data
-            WHERE status_code LIKE '5%%'
-            AND timestamp >= NOW() - INTERVAL %s MINUTE
+            WHERE status_code BETWEEN 500 AND 599
+            AND epoch >= %s
             GROUP BY status_code
         """
-        result = self.db_connector.execute_query(query, (dT,))
+        result = self.execute(query, (since,))
         return result
     
+    @Cache.cached()
     def get_longest_shortest_requests(self, limit, order_by):
         if order_by == "longest":
             order_by_clause = "DESC"
@@ -53,69 +241,362 @@ class LogAnalyzer:
         else:
             raise ValueError("Invalid order_by value. Must be 'longest' or 'shortest'.")
 
+        if self.normalized:
+            query = f"""
+                SELECT r.value, t.time_taken
+                FROM (
+                    SELECT request_id, time_taken
+                    FROM log_data
+                    ORDER BY time_taken {order_by_clause}
+                    LIMIT %s
+                ) t
+                JOIN requests r ON r.id = t.request_id
+                ORDER BY t.time_taken {order_by_clause}
+            """
+            return self.execute(query, (limit,))
+
         query = f"""
             SELECT request, time_taken
             FROM log_data
             ORDER BY time_taken {order_by_clause}
             LIMIT %s
         """
-        result = self.db_connector.execute_query(query, (limit,))
+        result = self.execute(query, (limit,))
         return result
 
+    @Cache.cached()
     def get_common_requests(self, N, slash_count):
+        if self.normalized:
+            query = f"""
+                SELECT {self.request_pattern('r.value', slash_count)} AS request_pattern, SUM(t.frequency) AS frequency
+                FROM (
+                    SELECT request_id, COUNT(*) AS frequency
+                    FROM log_data
+                    GROUP BY request_id
+                ) t
+                JOIN requests r ON r.id = t.request_id
+                WHERE r.value LIKE 'GET %%'
+                GROUP BY request_pattern
+                ORDER BY frequency DESC
+                LIMIT %s
+            """
+            return self.execute(query, (N,))
+        if self.dialect.pregroup_text and slash_count + 1 < REQUEST_WORDS:
+            query = f"""
+                SELECT {self.request_pattern('t.request', slash_count)} AS request_pattern,
+                SUM(t.frequency) AS frequency
+                FROM (
+                    SELECT request, COUNT(*) AS frequency
+                    FROM log_data
+                    WHERE request LIKE 'GET %%'
+                    GROUP BY request
+                ) t
+                GROUP BY request_pattern
+                ORDER BY frequency DESC
+                LIMIT %s
+            """
+            return self.execute(query, (N,))
         query = f"""
-            SELECT SUBSTRING_INDEX(request, ' ', {slash_count+1}) AS request_pattern, COUNT(*) AS frequency
+            SELECT {self.request_pattern('request', slash_count)} AS request_pattern, COUNT(*) AS frequency
             FROM log_data
             WHERE request LIKE 'GET %%'
             GROUP BY request_pattern
             ORDER BY frequency DESC
             LIMIT %s
         """
-        result = self.db_connector.execute_query(query, (N,))
+        result = self.execute(query, (N,))
         return result
     
+    @Cache.cached()
     def get_upstream_requests_WORKER(self):
+        if self.rollups and self.rollups_complete():
+            query = """
+                SELECT balancer_worker_name, SUM(requests) AS request_count,
+                SUM(time_taken_sum) * 1.0 / SUM(requests) AS average_time
+                FROM rollup_worker_minute
+                GROUP BY balancer_worker_name
+                ORDER BY balancer_worker_name
+            """
+            result = self.execute(query)
+            return [(row[0], int(row[1]), row[2]) for row in result]
         query = """
-            SELECT BALANCER_WORKER_NAME, COUNT(*) AS request_count, AVG(timestamp) AS average_time
+            SELECT BALANCER_WORKER_NAME, COUNT(*) AS request_count, AVG(time_taken) AS average_time
             FROM log_data
             WHERE BALANCER_WORKER_NAME IS NOT NULL
             GROUP BY BALANCER_WORKER_NAME
+            ORDER BY BALANCER_WORKER_NAME
         """
-        result = self.db_connector.execute_query(query)
+        result = self.execute(query)
         return result
     
+    @Cache.cached()
     def get_conversion_statistics(self, sort_by):
-        query = """
-            SELECT SUBSTRING_INDEX(SUBSTRING_INDEX(Referer, '/', 3), '/', -1) AS domain,
+        if self.normalized:
+            query = f"""
+                SELECT {self.dialect.url_host('r.value')} AS domain,
+                SUM(t.conversion_count) AS conversion_count
+                FROM (
+                    SELECT referer_id, COUNT(*) AS conversion_count
+                    FROM log_data
+                    WHERE referer_id IS NOT NULL
+                    GROUP BY referer_id
+                ) t
+                JOIN referers r ON r.id = t.referer_id
+                GROUP BY domain
+                ORDER BY {sort_by} DESC
+            """
+            return self.execute(query)
+        if self.dialect.pregroup_text:
+            query = f"""
+                SELECT {self.dialect.url_host('t.referer')} AS domain,
+                SUM(t.conversion_count) AS conversion_count
+                FROM (
+                    SELECT referer, COUNT(*) AS conversion_count
+                    FROM log_data
+                    WHERE referer IS NOT NULL
+                    GROUP BY referer
+                ) t
+                GROUP BY domain
+                ORDER BY {sort_by} DESC
+            """
+            return self.execute(query)
+        query = f"""
+            SELECT {self.dialect.url_host('Referer')} AS domain,
             COUNT(*) AS conversion_count
             FROM log_data
             WHERE Referer IS NOT NULL
             GROUP BY domain
-            ORDER BY {} DESC
-        """.format(sort_by)
+            ORDER BY {sort_by} DESC
+        """
 
-        result = self.db_connector.execute_query(query)
+        result = self.execute(query)
         return result
     
+    @Cache.cached(relative_time=True)
     def get_upstream_requests(self, interval):
         query = """
             SELECT COUNT(*) AS upstream_request_count, AVG(time_taken) AS average_time
             FROM log_data
-            WHERE `timestamp` >= NOW() - INTERVAL %s
-                AND `BALANCER_WORKER_NAME` IS NOT NULL
+            WHERE epoch >= %s
+                AND BALANCER_WORKER_NAME IS NOT NULL
         """
-        result = self.db_connector.execute_query(query, (interval,))
+        since = int(time.time()) - interval_seconds(interval)
+        result = self.execute(query, (since,))
         return result
     
-    def find_most_active_periods(self, N):
-        query = """
-            SELECT CONCAT(DATE_FORMAT(`timestamp`, '%%Y-%%m-%%d %%H:'), LPAD((MINUTE(`timestamp`) DIV %s) * %s, 2, '0')) AS period,
-            COUNT(*) AS request_count
+    @Cache.cached(relative_time=True)
+    def find_most_active_periods(self, N, interval=None):
+        # Периоды длиной N минут; interval ограничивает окно, например '1 DAY'
+        since = 0 if interval is None else int(time.time()) - interval_seconds(interval)
+        width = N * 60
+        if self.rollups and self.rollups_complete():
+            query = f"""
+                SELECT period, SUM(request_count) AS request_count
+                FROM (
+                    SELECT {self.dialect.integer_division('minute_epoch', '%s')} AS period, requests AS request_count
+                    FROM rollup_status_minute
+                    WHERE minute_epoch >= %s
+                    UNION ALL
+                    SELECT {self.dialect.integer_division('epoch', '%s')} AS period, 1 AS request_count
+                    FROM log_data
+                    WHERE epoch >= %s AND epoch < %s
+                ) t
+                GROUP BY period
+                ORDER BY request_count DESC
+                LIMIT %s
+            """
+            boundary = minute_ceil(since)
+            result = self.execute(query, (width, boundary, width, since, boundary, N))
+            return [(bucket_label(row[0] * width), int(row[1])) for row in result]
+        query = f"""
+            SELECT {self.dialect.integer_division('epoch', '%s')} AS period, COUNT(*) AS request_count
             FROM log_data
-            WHERE `timestamp` >= DATE_SUB(NOW(), INTERVAL %s)
+            WHERE epoch >= %s
             GROUP BY period
             ORDER BY request_count DESC
             LIMIT %s
         """
-        result = self.db_connector.execute_query(query, (N, N, N, N))
-        return result
\ No newline at end of file
+        result = self.execute(query, (width, since, N))
+        return [(bucket_label(row[0] * width), row[1]) for row in result]
+
+    # Число различных IP, User-Agent и forwarded_for по интервалам в dT минут
+    # (за последние interval, если он задан)
+    @Cache.cached(relative_time=True)
+    def get_distinct_statistics(self, dT, interval=None):
+        since = 0 if interval is None else int(time.time()) - interval_seconds(interval)
+        width = dT * 60
+        if self.sketches and self.sketches_complete():
+            buckets = self.distinct_sketches(since, width)
+            return [
+                (bucket_label(bucket * width),)
+                + tuple(buckets[bucket][field].count() for field, _ in Sketch.DISTINCT_FIELDS)
+                for bucket in sorted(buckets)
+            ]
+        user_agent = "user_agent_id" if self.normalized else "user_agent"
+        query = f"""
+            SELECT {self.dialect.integer_division('epoch', '%s')} AS bucket, COUNT(DISTINCT ip_address),
+            COUNT(DISTINCT {user_agent}), COUNT(DISTINCT forwarded_for)
+            FROM log_data
+            WHERE epoch >= %s
+            GROUP BY bucket
+            ORDER BY bucket
+        """
+        result = self.execute(query, (width, since))
+        return [(bucket_label(row[0] * width),) + tuple(row[1:]) for row in result]
+
+    # Число различных IP, User-Agent и forwarded_for за всё окно interval (или за всё время)
+    @Cache.cached(relative_time=True)
+    def get_distinct_counts(self, interval=None):
+        since = 0 if interval is None else int(time.time()) - interval_seconds(interval)
+        if self.sketches and self.sketches_complete():
+            sketches = self.distinct_sketches(since, None).get(0)
+            if sketches is None:
+                return [(0, 0, 0)]
+            return [tuple(sketches[field].count() for field, _ in Sketch.DISTINCT_FIELDS)]
+        user_agent = "user_agent_id" if self.normalized else "user_agent"
+        query = f"""
+            SELECT COUNT(DISTINCT ip_address), COUNT(DISTINCT {user_agent}), COUNT(DISTINCT forwarded_for)
+            FROM log_data
+            WHERE epoch >= %s
+        """
+        return self.execute(query, (since,))
+
+    # Поминутные скетчи HyperLogLog, объединённые по интервалам в width секунд
+    # (width=None - в один скетч); неполная минута на границе окна досчитывается по log_data
+    def distinct_sketches(self, since, width):
+        buckets = {}
+
+        def bucket_sketches(epoch):
+            bucket = 0 if width is None else epoch // width
+            sketches = buckets.get(bucket)
+            if sketches is None:
+                sketches = buckets[bucket] = {field: Sketch.HyperLogLog() for field, _ in Sketch.DISTINCT_FIELDS}
+            return sketches
+
+        boundary = minute_ceil(since)
+        query = "SELECT minute_epoch, field, registers FROM hll_minute WHERE minute_epoch >= %s"
+        for minute, field, registers in self.execute(query, (boundary,)):
+            bucket_sketches(minute)[field].merge_string(registers)
+        if boundary > since:
+            if self.normalized:
+                query = """
+                    SELECT l.epoch, l.ip_address, u.value, l.forwarded_for
+                    FROM log_data l
+                    LEFT JOIN user_agents u ON u.id = l.user_agent_id
+                    WHERE l.epoch >= %s AND l.epoch < %s
+                """
+            else:
+                query = """
+                    SELECT epoch, ip_address, user_agent, forwarded_for
+                    FROM log_data
+                    WHERE epoch >= %s AND epoch < %s
+                """
+            for row in self.execute(query, (since, boundary)):
+                sketches = bucket_sketches(row[0])
+                for (field, _), value in zip(Sketch.DISTINCT_FIELDS, row[1:]):
+                    if value is not None:
+                        sketches[field].add(value)
+        return buckets
+
+    # Перцентили time_taken по воркерам за окно interval (или за всё время):
+    # (воркер, запросов, перцентили...), а с dT - по интервалам в dT минут:
+    # (начало интервала, воркер, запросов, перцентили...). Значения приближённые,
+    # с относительной точностью Sketch.LATENCY_ACCURACY; exact=True - точные по log_data
+    @Cache.cached(relative_time=True)
+    def get_latency_percentiles(self, dT=None, interval=None, percentiles=Sketch.PERCENTILES, exact=False):
+        since = 0 if interval is None else int(time.time()) - interval_seconds(interval)
+        width = None if dT is None else dT * 60
+        if exact:
+            statistics = self.exact_latency_percentiles(since, width, percentiles)
+        else:
+            if self.sketches and self.sketches_complete():
+                groups = self.latency_sketches(since, width)
+            else:
+                groups = self.scan_latency_sketches(since, width)
+            statistics = {key: (sketch.count, [sketch.percentile(p) for p in percentiles])
+                          for key, sketch in groups.items()}
+        if width is None:
+            return [(worker, count) + tuple(values)
+                    for (_, worker), (count, values) in sorted(statistics.items())]
+        return [(bucket_label(bucket * width), worker, count) + tuple(values)
+                for (bucket, worker), (count, values) in sorted(statistics.items())]
+
+    # Без готовых гистограмм строки окна читаются потоком и сразу раскладываются
+    # по корзинам QuantileSketch: память зависит от числа групп, а не строк
+    def scan_latency_sketches(self, since, width):
+        groups = {}
+        query = """
+            SELECT epoch, balancer_worker_name, time_taken
+            FROM log_data
+            WHERE epoch >= %s AND balancer_worker_name IS NOT NULL
+        """
+        for epoch, worker, time_taken in self.stream(query, (since,)):
+            key = (0 if width is None else epoch // width, worker)
+            sketch = groups.get(key)
+            if sketch is None:
+                sketch = groups[key] = Sketch.QuantileSketch()
+            sketch.add(time_taken)
+        return groups
+
+    # Точные перцентили: сервер считает строки групп и отдаёт значения отсортированными,
+    # из потока берутся только строки с рангами ceil(p / 100 * count)
+    def exact_latency_percentiles(self, since, width, percentiles):
+        # Без dT группа - только воркер: константа в GROUP BY читалась бы как номер столбца
+        bucket = "0" if width is None else self.dialect.integer_division("epoch", width)
+        group = "balancer_worker_name" if width is None else f"{bucket}, balancer_worker_name"
+        condition = "epoch >= %s AND balancer_worker_name IS NOT NULL"
+        counts_query = f"""
+            SELECT {bucket}, balancer_worker_name, COUNT(*)
+            FROM log_data
+            WHERE {condition}
+            GROUP BY {group}
+        """
+        counts = {(bucket_number, worker): count for bucket_number, worker, count
+                  in self.execute(counts_query, (since,))}
+        query = f"""
+            SELECT {bucket}, balancer_worker_name, time_taken
+            FROM log_data
+            WHERE {condition}
+            ORDER BY {group}, time_taken
+        """
+        statistics = {}
+        key = None
+        for bucket_number, worker, time_taken in self.stream(query, (since,)):
+            if (bucket_number, worker) != key:
+                key = (bucket_number, worker)
+                count = counts[key]
+                ranks = [max(1, math.ceil(p / 100 * count)) for p in percentiles]
+                values = [None] * len(percentiles)
+                statistics[key] = (count, values)
+                position = 0
+            position += 1
+            for index, rank in enumerate(ranks):
+                if rank == position:
+                    values[index] = time_taken
+        return statistics
+
+    # Поминутные скетчи задержек, объединённые по (интервал в width секунд, воркер);
+    # неполная минута на границе окна досчитывается по log_data
+    def latency_sketches(self, since, width):
+        groups = {}
+
+        def group_sketch(epoch, worker):
+            key = (0 if width is None else epoch // width, worker)
+            sketch = groups.get(key)
+            if sketch is None:
+                sketch = groups[key] = Sketch.QuantileSketch()
+            return sketch
+
+        boundary = minute_ceil(since)
+        query = "SELECT minute_epoch, balancer_worker_name, histogram FROM latency_minute WHERE minute_epoch >= %s"
+        for minute, worker, histogram in self.execute(query, (boundary,)):
+            group_sketch(minute, worker).merge(Sketch.QuantileSketch.from_json(histogram))
+        if boundary > since:
+            query = """
+                SELECT epoch, balancer_worker_name, time_taken
+                FROM log_data
+                WHERE epoch >= %s AND epoch < %s AND balancer_worker_name IS NOT NULL
+            """
+            for epoch, worker, time_taken in self.execute(query, (since, boundary)):
+                group_sketch(epoch, worker).add(time_taken)
+        return groups
@@ -0,0 +1,171 @@
+import functools
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from ParserDatabases import Dialect
+
+# Кэш результатов LogAnalyzer. Ключ - метод, аргументы, база и версия данных:
+# импорт увеличивает версию в таблице data_version в той же транзакции,
+# что и каждую порцию строк, поэтому после фиксации новых данных старые
+# ключи больше не совпадают и устаревший результат не возвращается.
+# Вместе со строкой версии создаётся случайный токен: у пересозданной базы
+# версия снова начинается с 1, но токен другой, и старые ключи не совпадают.
+
+RESULT_CACHE_SIZE = 256
+
+DATA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS data_version (
+        name VARCHAR(64) PRIMARY KEY,
+        version BIGINT NOT NULL
+    )
+"""
+
+
+def create_version_table(connection):
+    cursor = connection.cursor()
+    cursor.execute(DATA_VERSION_TABLE)
+    cursor.close()
+
+
+# Строка data_version с токеном базы; в SQL токен - случайное целое, чтобы не менять схему таблицы
+TOKEN_NAME = 'log_data_token'
+
+# Ключи версии данных и токена в Redis
+REDIS_VERSION_KEY = 'log:data_version'
+REDIS_TOKEN_KEY = 'log:data_token'
+
+
+def new_token():
+    return uuid.uuid4().int >> 66
+
+
+# Увеличение версии log_data; фиксируется вместе с транзакцией загрузчика.
+# Токен записывается, только если его ещё нет. В MongoDB версия и токен - документ
+# коллекции data_version, в Redis - счётчик и строка; транзакции там нет
+def bump_version(connection, database_type):
+    if database_type == "mongodb":
+        connection['data_version'].update_one(
+            {'_id': 'log_data'}, {'$inc': {'version': 1}, '$setOnInsert': {'token': uuid.uuid4().hex}}, upsert=True)
+        return
+    if database_type == "redis":
+        connection.set(REDIS_TOKEN_KEY, uuid.uuid4().hex, nx=True)
+        connection.incr(REDIS_VERSION_KEY)
+        return
+    dialect = Dialect.for_database(database_type)
+    cursor = connection.cursor()
+    cursor.execute(dialect.insert_ignore('data_version', ['name', 'version'], 'name'), (TOKEN_NAME, new_token()))
+    cursor.execute(dialect.upsert('data_version', ['name'], ['version'], [('version', 'add')]), ('log_data', 1))
+    cursor.close()
+
+
+# Версия данных - пара (токен, номер); до первого импорта токена нет. Базу без таблицы
+# data_version (например, загруженную прежней версией) считаем версией 0 без токена
+def current_version(db_connector):
+    if db_connector.database == "mongodb":
+        db_connector.connect()
+        document = db_connector.connection['data_version'].find_one({'_id': 'log_data'})
+        return (document.get('token'), document['version']) if document else (None, 0)
+    if db_connector.database == "redis":
+        db_connector.connect()
+        token, version = db_connector.connection.mget(REDIS_TOKEN_KEY, REDIS_VERSION_KEY)
+        return token, int(version or 0)
+    dialect = Dialect.for_database(db_connector.database)
+    query = dialect.query("SELECT name, version FROM data_version WHERE name IN (%s, %s)")
+    try:
+        rows = dict(db_connector.execute_query(query, ('log_data', TOKEN_NAME)) or ())
+    except Exception:
+        if db_connector.execute_query(dialect.query(dialect.table_exists()), ('data_version',)):
+            raise
+        return None, 0
+    return rows.get(TOKEN_NAME), rows.get('log_data', 0)
+
+
+# База, к которой относится результат: тип СУБД, хост и имя базы
+def database_identity(db_connector):
+    return db_connector.database, db_connector.host, db_connector.db_name
+
+
+# LRU-кэш не больше max_entries результатов; с path содержимое подгружается
+# из файла при создании и записывается в него явным save() или close(), а не
+# при каждом промахе. Отчёт вызывает анализатор из нескольких потоков, поэтому
+# операции идут под блокировкой; запись файла идёт уже без неё.
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Есть изменения, ещё не записанные в файл
+        self.dirty = False
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as file:
+                self.entries = pickle.load(file)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    # Запись снимка во временный файл и замена, чтобы не оставить файл недописанным
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = OrderedDict(self.entries)
+            self.dirty = False
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'wb') as file:
+            pickle.dump(entries, file)
+        os.replace(temporary, self.path)
+
+    def close(self):
+        self.save()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dirty = True
+
+
+# Декоратор метода анализатора: результат берётся из self.result_cache, если он задан.
+# В ключ входят база и версия данных вместе с токеном, поэтому результаты одной базы
+# не возвращаются для другой или для пересозданной. Для запросов с окном относительно текущего времени в ключ входит текущая секунда,
+# от которой анализатор отсчитывает окно.
+def cached(relative_time=False):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.result_cache is None:
+                return method(self, *args, **kwargs)
+            key = (method.__name__, args, tuple(sorted(kwargs.items())), self.cache_scope(),
+                   database_identity(self.db_connector), current_version(self.db_connector),
+                   int(time.time()) if relative_time else None)
+            result = self.result_cache.get(key)
+            if result is None:
+                result = list(method(self, *args, **kwargs))
+                self.result_cache.put(key, result)
+            return list(result)
+        return wrapper
+    return decorator
@@ -0,0 +1,102 @@
+import os
+import time
+from ParserDatabases import Dialect
+from ParserDatabases import Reader
+
+# Контрольные точки инкрементального импорта. Для каждого файла в целевой
+# базе хранится inode, размер, смещение после последней загруженной строки
+# и хэш этой строки. Точка обновляется в той же транзакции, что и пакет
+# строк, поэтому после сбоя импорт продолжается без повторной вставки.
+
+
+class CheckpointStore:
+    def __init__(self, connection, database_type):
+        self.connection = connection
+        self.placeholder = Dialect.for_database(database_type).placeholder
+
+    def create_table(self):
+        create_table_query = """
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                log_file VARCHAR(512) PRIMARY KEY,
+                inode BIGINT,
+                size BIGINT,
+                byte_offset BIGINT,
+                line_hash CHAR(32),
+                updated_at BIGINT
+            )
+        """
+        # Задержка поступления данных в режиме --follow, для мониторинга
+        create_lag_table_query = """
+            CREATE TABLE IF NOT EXISTS ingest_lag (
+                log_file VARCHAR(512) PRIMARY KEY,
+                committed_at BIGINT,
+                rows_committed INT,
+                lag_seconds DOUBLE PRECISION
+            )
+        """
+        cursor = self.connection.cursor()
+        cursor.execute(create_table_query)
+        cursor.execute(create_lag_table_query)
+        cursor.close()
+        self.connection.commit()
+
+    # Позиция, с которой нужно продолжить чтение файла
+    def resume(self, log_file):
+        path = os.path.abspath(log_file)
+        try:
+            stat = os.stat(log_file)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Log file {path} does not exist; nothing to import.") from None
+        state = {'log_file': path, 'inode': stat.st_ino, 'size': stat.st_size, 'offset': 0}
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT inode, size, byte_offset, line_hash FROM import_checkpoints WHERE log_file = {self.placeholder}",
+            (path,))
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return state
+        inode, size, offset, line_hash = row
+        if inode != stat.st_ino:
+            print(f"Файл {path} заменён (ротация), импорт начинается с начала.")
+        elif stat.st_size < offset:
+            print(f"Файл {path} усечён, импорт начинается с начала.")
+        elif Reader.line_hash(log_file, offset) != line_hash:
+            print(f"Содержимое файла {path} изменилось, импорт начинается с начала.")
+        else:
+            state['offset'] = offset
+        return state
+
+    # Сохраняется без фиксации транзакции: commit выполняет вызывающий код.
+    # Если в state есть последняя прочитанная строка, файл не перечитывается.
+    def save(self, state):
+        path = state['log_file']
+        if state.get('last_line') is not None:
+            line_hash = Reader.hash_line(state['last_line'])
+        else:
+            line_hash = Reader.line_hash(path, state['offset'])
+        values = (path, state['inode'], state['size'], state['offset'], line_hash, int(time.time()))
+        placeholders = ", ".join([self.placeholder] * len(values))
+        cursor = self.connection.cursor()
+        cursor.execute(f"DELETE FROM import_checkpoints WHERE log_file = {self.placeholder}", (path,))
+        cursor.execute(
+            f"INSERT INTO import_checkpoints (log_file, inode, size, byte_offset, line_hash, updated_at) "
+            f"VALUES ({placeholders})", values)
+        cursor.close()
+
+    def save_lag(self, log_file, committed_at, rows, lag_seconds):
+        values = (log_file, int(committed_at), rows, lag_seconds)
+        placeholders = ", ".join([self.placeholder] * len(values))
+        cursor = self.connection.cursor()
+        cursor.execute(f"DELETE FROM ingest_lag WHERE log_file = {self.placeholder}", (log_file,))
+        cursor.execute(
+            f"INSERT INTO ingest_lag (log_file, committed_at, rows_committed, lag_seconds) VALUES ({placeholders})",
+            values)
+        cursor.close()
+
+
+# Пропускает строки дальше, запоминая в state смещение конца последней из них
+def track_offset(lines, state):
+    for line, offset in lines:
+        state['offset'] = offset
+        yield line
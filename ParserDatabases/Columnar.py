@@ -0,0 +1,177 @@
+import calendar
+import json
+import mmap
+import os
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+from ParserDatabases import Loader
+from ParserDatabases import Parser
+from ParserDatabases import Reader
+
+# Колоночный кэш разобранного лога: каталог с отдельным файлом на столбец.
+# Числа хранятся массивами int64, строки - кодами int32 и словарём значений.
+# Повторная загрузка отображает файлы в память (mmap) и читает столбцы без
+# копирования, поэтому повторный импорт и анализ обходятся без регулярных выражений.
+
+FORMAT_VERSION = 1
+
+# Числовые столбцы; timestamp хранится как локальное время лога в секундах от 1970-01-01
+NUMERIC_COLUMNS = ('timestamp', 'status_code', 'response_size', 'time_taken', 'epoch')
+
+# Отсутствующее значение в числовом столбце
+NULL = -(1 << 63)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def source_state(log_file):
+    stat = os.stat(log_file)
+    return {'path': os.path.abspath(log_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# Кэш пригоден, если он дописан до конца и построен по текущему состоянию файла
+def is_fresh(path, log_file):
+    try:
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return meta.get('version') == FORMAT_VERSION and meta.get('source') == source_state(log_file)
+
+
+@lru_cache(maxsize=4096)
+def local_time(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+# Запись кэша; подключается к загрузчику как наблюдатель (write_batch) и
+# пишет каждый пакет в файлы столбцов. meta.json создаётся последним в close(),
+# поэтому недописанный кэш не считается пригодным.
+class ColumnarWriter:
+    def __init__(self, path, log_file):
+        self.path = path
+        self.source = source_state(log_file)
+        self.rows = 0
+        self.dictionaries = {}
+        self.files = {}
+        os.makedirs(path, exist_ok=True)
+        meta_file = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+        for column in Loader.LOG_DATA_COLUMNS:
+            if column in NUMERIC_COLUMNS:
+                self.files[column] = open(os.path.join(path, f'{column}.bin'), 'wb')
+            else:
+                self.files[column] = open(os.path.join(path, f'{column}.codes'), 'wb')
+                self.dictionaries[column] = {}
+
+    def write_batch(self, batch):
+        for position, column in enumerate(Loader.LOG_DATA_COLUMNS):
+            if column in NUMERIC_COLUMNS:
+                values = array('q')
+                if column == 'timestamp':
+                    for row in batch:
+                        value = row[position]
+                        values.append(NULL if value is None else calendar.timegm(value.timetuple()))
+                else:
+                    for row in batch:
+                        value = row[position]
+                        values.append(NULL if value is None else value)
+            else:
+                dictionary = self.dictionaries[column]
+                values = array('i')
+                for row in batch:
+                    value = row[position]
+                    code = dictionary.get(value)
+                    if code is None:
+                        code = dictionary[value] = len(dictionary)
+                    values.append(code)
+            values.tofile(self.files[column])
+        self.rows += len(batch)
+
+    def close(self, rejected=0):
+        for file in self.files.values():
+            file.close()
+        for column, dictionary in self.dictionaries.items():
+            with open(os.path.join(self.path, f'{column}.dict'), 'w', encoding='utf-8', newline='') as file:
+                file.write('\n'.join(dictionary))
+        meta = {
+            'version': FORMAT_VERSION,
+            'source': self.source,
+            'rows': self.rows,
+            'rejected': rejected,
+            'columns': list(Loader.LOG_DATA_COLUMNS),
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+
+# Чтение кэша: столбцы - memoryview поверх mmap без копирования данных
+class ColumnarCache:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        self.rows = meta['rows']
+        self.rejected = meta['rejected']
+        self.maps = []
+
+    def column(self, name):
+        if name in NUMERIC_COLUMNS:
+            file_name, typecode = f'{name}.bin', 'q'
+        else:
+            file_name, typecode = f'{name}.codes', 'i'
+        with open(os.path.join(self.path, file_name), 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return memoryview(b'').cast(typecode)
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapping)
+        return memoryview(mapping).cast(typecode)
+
+    def dictionary(self, name):
+        with open(os.path.join(self.path, f'{name}.dict'), encoding='utf-8', newline='') as file:
+            return file.read().split('\n')
+
+    # Строки в том же виде, что отдаёт Parser.parse_line
+    def iter_rows(self):
+        columns = []
+        for column in Loader.LOG_DATA_COLUMNS:
+            values = self.column(column)
+            if column == 'timestamp':
+                columns.append(None if value == NULL else local_time(value) for value in values)
+            elif column in NUMERIC_COLUMNS:
+                columns.append(None if value == NULL else value for value in values)
+            else:
+                columns.append(map(self.dictionary(column).__getitem__, values))
+        return zip(*columns)
+
+    def close(self):
+        # memoryview, ещё ссылающиеся на отображение, не дают закрыть mmap
+        for mapping in self.maps:
+            try:
+                mapping.close()
+            except BufferError:
+                pass
+        self.maps = []
+
+
+# Построение кэша по файлу лога без загрузки в базу
+def build_cache(path, log_file, chunk_size=Reader.CHUNK_SIZE, batch_size=Loader.BATCH_SIZE):
+    writer = ColumnarWriter(path, log_file)
+    parse_line = Parser.parse_line
+    rejected = 0
+    batch = []
+    for line in Reader.read_lines(log_file, chunk_size):
+        values = parse_line(line)
+        if values is None:
+            rejected += 1
+            continue
+        batch.append(values)
+        if len(batch) >= batch_size:
+            writer.write_batch(batch)
+            batch = []
+    if batch:
+        writer.write_batch(batch)
+    writer.close(rejected)
+    return writer.rows
@@ -1,12 +1,35 @@
 import pymysql
 import psycopg2
 import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
 import h2
 from pymongo import MongoClient
 import redis
 
+# Максимальное число соединений в пуле
+POOL_SIZE = 4
+
+# Строк в одной порции fetchmany у stream_query
+STREAM_FETCH_SIZE = 10000
+
+# Соединение, пролежавшее в пуле дольше (секунд), перед выдачей проверяется запросом
+HEALTH_CHECK_INTERVAL = 30
+
+
+
+# Пул соединений: соединения создаются по мере надобности, но не больше pool_size;
+# checkout() выдаёт соединение (ждёт освобождения, если все заняты), release()
+# возвращает его в пул. connection - основное соединение процесса, оно
+# создаётся один раз и переиспользуется при повторных connect().
+# MongoDB и Redis ведут собственные пулы, а SQLite в памяти существует только
+# внутри одного соединения, поэтому для них используется одно общее соединение.
+# sqlite_cache_mb и sqlite_mmap_mb - кэш страниц и отображение файла в память (МБ)
+# для соединения, которое загружает SQLite; None - значения SQLite по умолчанию.
 class DatabaseConnector:
-    def __init__(self, database, host=None, port=None, username=None, password=None, db_name=None):
+    def __init__(self, database, host=None, port=None, username=None, password=None, db_name=None,
+                 pool_size=POOL_SIZE, sqlite_cache_mb=None, sqlite_mmap_mb=None):
         self.database = database
         self.host = host
         self.port = port
@@ -14,45 +37,165 @@ class DatabaseConnector:
         self.password = password
         self.db_name = db_name
         self.connection = None
+        self.shared = database in ("h2", "mongodb", "redis") or (database == "sqlite" and db_name == ":memory:")
+        self.pool_size = 1 if self.shared else pool_size
+        self.sqlite_cache_mb = sqlite_cache_mb
+        self.sqlite_mmap_mb = sqlite_mmap_mb
+        self.idle = []
+        self.created = 0
+        self.condition = threading.Condition()
+        self.database_created = False
+        # Ограничение времени запросов execute_query на сервере (секунд); None - без ограничения
+        self.statement_timeout = None
 
     def connect(self):
+        if self.connection is not None and self.is_healthy(self.connection):
+            return
+        if self.connection is not None:
+            self.discard(self.connection)
+        self.connection = self.checkout()
+
+    def create_connection(self):
         if self.database == "mysql":
-            self.connection = self.connect_mysql()
+            return self.connect_mysql()
         elif self.database == "postgresql":
-            self.connection = self.connect_postgresql()
+            return self.connect_postgresql()
         elif self.database == "sqlite":
-            self.connection = self.connect_sqlite()
+            return self.connect_sqlite()
         elif self.database == "h2":
-            self.connection = self.connect_h2()
+            return self.connect_h2()
         elif self.database == "mongodb":
-            self.connection = self.connect_mongodb()
+            return self.connect_mongodb()
         elif self.database == "redis":
-            self.connection = self.connect_redis()
+            return self.connect_redis()
 
-    def connect_mysql(self):
-        connection = pymysql.connect(
-            host=self.host,
-            port=self.port,
-            user=self.username,
-            password=self.password,
-            charset='utf8'
-        )
+    def is_healthy(self, connection):
+        try:
+            if self.database == "mysql":
+                connection.ping(reconnect=False)
+            elif self.database == "postgresql":
+                if connection.closed:
+                    return False
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            elif self.database == "sqlite":
+                connection.execute("SELECT 1")
+            elif self.database == "redis":
+                connection.ping()
+        except Exception:
+            return False
+        return True
+
+    # Выдача соединения из пула; None - ждать сколько угодно
+    def checkout(self, timeout=None):
+        if self.shared:
+            with self.condition:
+                if self.connection is None:
+                    self.connection = self.create_connection()
+                    self.created = 1
+                return self.connection
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                while self.idle:
+                    connection, released_at = self.idle.pop()
+                    if time.monotonic() - released_at < HEALTH_CHECK_INTERVAL or self.is_healthy(connection):
+                        return connection
+                    self.close_connection(connection)
+                if self.created < self.pool_size:
+                    self.created += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No free connection in the pool of {self.pool_size}")
+                self.condition.wait(remaining)
+        try:
+            return self.create_connection()
+        except Exception:
+            with self.condition:
+                self.created -= 1
+                self.condition.notify()
+            raise
 
-        # Создание базы данных, если она не существует
-        create_db_query = f"CREATE DATABASE IF NOT EXISTS {self.db_name}"
-        with connection.cursor() as cursor:
-            cursor.execute(create_db_query)
+    # Возврат соединения в пул; незавершённая транзакция откатывается,
+    # чтобы следующий пользователь видел свежие данные
+    def release(self, connection):
+        if self.shared or connection is self.connection:
+            return
+        try:
+            connection.rollback()
+        except Exception:
+            self.discard(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
 
-        # Подключение к созданной или существующей базе данных
+    def discard(self, connection):
+        with self.condition:
+            self.close_connection(connection)
+            if connection is self.connection:
+                self.connection = None
+            self.condition.notify()
+
+    # Вызывается под self.condition
+    def close_connection(self, connection):
+        self.created -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def pooled(self, timeout=None):
+        connection = self.checkout(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    # Курсор, который читает результат с сервера порциями, а не целиком:
+    # SSCursor в MySQL, именованный (серверный) курсор в PostgreSQL
+    def server_cursor(self, connection, name="export"):
+        if self.database == "mysql":
+            return connection.cursor(pymysql.cursors.SSCursor)
+        elif self.database == "postgresql":
+            return connection.cursor(name=name)
+        return connection.cursor()
+
+    def close(self):
+        with self.condition:
+            connections = [connection for connection, _ in self.idle]
+            if self.connection is not None:
+                connections.append(self.connection)
+            self.idle = []
+            self.connection = None
+            self.created = 0
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def connect_mysql(self):
         connection = pymysql.connect(
             host=self.host,
             port=self.port,
             user=self.username,
             password=self.password,
-            database=self.db_name,
             charset='utf8'
         )
 
+        # Создание базы данных, если она не существует (один раз на процесс)
+        if not self.database_created:
+            create_db_query = f"CREATE DATABASE IF NOT EXISTS {self.db_name}"
+            with connection.cursor() as cursor:
+                cursor.execute(create_db_query)
+            self.database_created = True
+
+        # Переключение на созданную или существующую базу данных в том же соединении
+        connection.select_db(self.db_name)
         return connection
 
     def connect_postgresql(self):
@@ -65,10 +208,34 @@ class DatabaseConnector:
         )
         return connection
 
+    # Соединение из пула может попасть в другой поток, но используется только одним потоком за раз.
+    # WAL позволяет читателям отчёта работать параллельно с записью. Кэш страниц, mmap и
+    # временные структуры сортировок остаются по умолчанию SQLite, чтобы память не росла с базой
     def connect_sqlite(self):
-        connection = sqlite3.connect(self.db_name)
+        connection = sqlite3.connect(self.db_name, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
         return connection
 
+    # Увеличенные кэш страниц и mmap SQLite на время загрузки через connection;
+    # после неё прежние значения восстанавливаются и память кэша освобождается
+    @contextmanager
+    def bulk_load_settings(self, connection):
+        settings = []
+        if self.database == "sqlite":
+            if self.sqlite_cache_mb is not None:
+                settings.append(('cache_size', -self.sqlite_cache_mb * 1024))
+            if self.sqlite_mmap_mb is not None:
+                settings.append(('mmap_size', self.sqlite_mmap_mb * 1024 * 1024))
+        previous = [(name, connection.execute(f"PRAGMA {name}").fetchone()[0]) for name, _ in settings]
+        for name, value in settings:
+            connection.execute(f"PRAGMA {name}={value}")
+        try:
+            yield
+        finally:
+            for name, value in previous:
+                connection.execute(f"PRAGMA {name}={value}")
+
     def connect_h2(self):
         connection = h2.H2Database(":memory:")
         return connection
@@ -82,9 +249,59 @@ class DatabaseConnector:
         connection = redis.Redis(host=self.host, port=self.port, password=self.password, db=self.db_name)
         return connection
 
-    # Запрос к базе данных
-    def execute_query(self, query,params=None):
-        cursor = self.connection.cursor()
-        cursor.execute(query, params)
-        result = cursor.fetchall()
-        return result
\ No newline at end of file
+    # Запрос к базе данных на соединении из пула; курсор закрывается после чтения результата
+    def execute_query(self, query, params=None):
+        with self.pooled() as connection:
+            with self.statement_limit(connection), closing(connection.cursor()) as cursor:
+                if params is None:
+                    cursor.execute(query)
+                else:
+                    cursor.execute(query, params)
+                return cursor.fetchall()
+
+    # Строки запроса порциями fetchmany через серверный курсор: результат
+    # не собирается в памяти целиком, соединение занято до конца чтения
+    def stream_query(self, query, params=None, fetch_size=STREAM_FETCH_SIZE):
+        with self.pooled() as connection:
+            with self.statement_limit(connection), closing(self.server_cursor(connection, "stream")) as cursor:
+                if params is None:
+                    cursor.execute(query)
+                else:
+                    cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+
+    # С statement_timeout запрос прерывает сам сервер: max_execution_time в MySQL,
+    # statement_timeout в транзакции PostgreSQL (откатывается при возврате в пул),
+    # interrupt() по таймеру в SQLite. Прерванный запрос завершается ошибкой,
+    # соединение остаётся пригодным. H2 прерывание не поддерживает. Настройки задаются
+    # отдельным курсором: серверный курсор PostgreSQL выполняет только свой запрос
+    @contextmanager
+    def statement_limit(self, connection):
+        timeout = self.statement_timeout
+        if timeout is None:
+            yield
+            return
+        milliseconds = max(int(timeout * 1000), 1)
+        timer = None
+        if self.database == "mysql":
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(f"SET SESSION max_execution_time = {milliseconds}")
+        elif self.database == "postgresql":
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(f"SET LOCAL statement_timeout = {milliseconds}")
+        elif self.database == "sqlite":
+            timer = threading.Timer(timeout, connection.interrupt)
+            timer.daemon = True
+            timer.start()
+        try:
+            yield
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if self.database == "mysql":
+                with closing(connection.cursor()) as cursor:
+                    cursor.execute("SET SESSION max_execution_time = 0")
\ No newline at end of file
@@ -1,76 +1,573 @@
+import gzip
+import logging
+import os
+import shutil
 import time
-import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from ParserDatabases import Cache
+from ParserDatabases import Checkpoint
+from ParserDatabases import Columnar
+from ParserDatabases import Dialect
+from ParserDatabases import Dictionary
+from ParserDatabases import Follow
+from ParserDatabases import Loader
+from ParserDatabases import Mongo
+from ParserDatabases import Parser
+from ParserDatabases import Pipeline
+from ParserDatabases import Reader
+from ParserDatabases import RedisStore
+from ParserDatabases import Rollup
+from ParserDatabases import Sketch
+
+logger = logging.getLogger(__name__)
+
+# Границы микропакета в режиме --follow
+FOLLOW_BATCH_ROWS = 5000
+FOLLOW_MAX_LATENCY = 0.5
+
+# Вторичные индексы под запросы LogAnalyzer: временные окна по epoch,
+# статистика 5xx, самые долгие/быстрые запросы, статистика по воркерам
+# и группировки по user_agent (префиксные индексы по LONGTEXT)
+LOG_DATA_INDEXES = (
+    ('idx_log_data_epoch', 'epoch'),
+    ('idx_log_data_status_epoch', 'status_code, epoch'),
+    ('idx_log_data_time_taken', 'time_taken'),
+    ('idx_log_data_worker_time_taken', 'balancer_worker_name, time_taken'),
+    ('idx_log_data_user_agent', 'user_agent(255)'),
+    ('idx_log_data_ip_user_agent', 'ip_address, user_agent(255)'),
+)
+
+# В нормализованной схеме группировки по user_agent идут по целому id
+NORMALIZED_INDEXES = (
+    ('idx_log_data_epoch', 'epoch'),
+    ('idx_log_data_status_epoch', 'status_code, epoch'),
+    ('idx_log_data_time_taken', 'time_taken'),
+    ('idx_log_data_worker_time_taken', 'balancer_worker_name, time_taken'),
+    ('idx_log_data_user_agent_id', 'user_agent_id'),
+    ('idx_log_data_ip_user_agent_id', 'ip_address, user_agent_id'),
+)
+
+
+# Хранилища без SQL: нет таблиц, транзакций, справочников и поминутных агрегатов в SQL
+NON_SQL_DATABASES = ("mongodb", "redis")
+
+# Диапазон байт, который разбирает один дочерний процесс при --workers: около 1 МБ,
+# то есть порядка одного пакета загрузчика, а не десятков мегабайт строк за раз
+PARSE_RANGE_SIZE = 1024 * 1024
+# Диапазонов в работе на один процесс: процесс не простаивает, пока писатель забирает предыдущий
+PARSE_RANGES_PER_WORKER = 2
+
+# Строк в одной порции fetchmany при экспорте
+EXPORT_FETCH_SIZE = 10000
+# Размер буфера файла экспорта и копирования частей
+EXPORT_BUFFER_SIZE = 1024 * 1024
+# Уровень сжатия gzip: 6 — разумный баланс, чтобы упираться в диск, а не в CPU
+EXPORT_GZIP_LEVEL = 6
+
+
+# Форматирование порции строк из базы (id и столбцы log_data) обратно в формат лога
+def format_log_lines(rows):
+    format_line = Parser.format_line
+    return ''.join(format_line(data[1:]) for data in rows)
+
+
+# Файл экспорта: буферизованный текстовый или gzip-сжатый
+def open_export_file(log_file, compress):
+    if compress:
+        return gzip.open(log_file, 'wt', compresslevel=EXPORT_GZIP_LEVEL, encoding='utf-8')
+    return open(log_file, 'w', buffering=EXPORT_BUFFER_SIZE, encoding='utf-8')
+
+
+# Разбор строк лога: генератор, отдающий по одному кортежу значений на строку.
+# Нераспознанные строки учитываются в stats['rejected'].
+def parse_log_lines(lines, stats=None):
+    parse_line = Parser.parse_line
+    for line in lines:
+        values = parse_line(line)
+        if values is not None:
+            yield values
+        elif stats is not None:
+            stats['rejected'] += 1
+
+
+# Разбор одного диапазона байт файла; выполняется в дочернем процессе
+def parse_log_range(log_file, start, end, chunk_size=Reader.CHUNK_SIZE):
+    stats = {'rejected': 0}
+    rows = list(parse_log_lines(Reader.read_lines(log_file, chunk_size, start, end), stats))
+    return rows, stats['rejected']
+
+
+# Параллельный разбор файла пулом процессов. Диапазоны отдаются писателю
+# в исходном порядке; в работе одновременно не более max_in_flight диапазонов
+# по range_size байт, поэтому память родителя ограничена их произведением,
+# а не размером файла
+def parse_log_file_parallel(log_file, workers, stats, chunk_size=Reader.CHUNK_SIZE, range_size=PARSE_RANGE_SIZE,
+                            max_in_flight=None):
+    if max_in_flight is None:
+        max_in_flight = workers * PARSE_RANGES_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, end in Reader.split_ranges(log_file, range_size):
+            pending.append(executor.submit(parse_log_range, log_file, start, end, min(chunk_size, range_size)))
+            if len(pending) >= max_in_flight:
+                rows, rejected = pending.popleft().result()
+                stats['rejected'] += rejected
+                yield from rows
+        while pending:
+            rows, rejected = pending.popleft().result()
+            stats['rejected'] += rejected
+            yield from rows
+
+
 class LogDataManager:
-    def __init__(self, db_connector, database_type):
+    def __init__(self, db_connector, database_type, chunk_size=Reader.CHUNK_SIZE, batch_size=Loader.BATCH_SIZE,
+                 workers=1, defer_indexes=None, normalized=False, dictionary_size=Dictionary.DICTIONARY_SIZE,
+                 incremental=False, rollups=False, sketches=False, sketch_capacity=Sketch.TOP_K_CAPACITY,
+                 columnar_cache=None, pipeline=False):
         self.db_connector = db_connector
         self.database_type = database_type
+        self.dialect = Dialect.for_database(database_type)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.workers = workers
+        self.defer_indexes = defer_indexes
+        self.normalized = normalized and database_type not in NON_SQL_DATABASES
+        self.dictionary_size = dictionary_size
+        self.incremental = incremental
+        self.rollups = rollups and database_type not in NON_SQL_DATABASES
+        self.sketches = sketches and database_type not in NON_SQL_DATABASES
+        self.sketch_capacity = sketch_capacity
+        self.columnar_cache = columnar_cache
+        self.pipeline = pipeline
+        if incremental and database_type in NON_SQL_DATABASES:
+            raise ValueError("Incremental import requires a transactional SQL database.")
+        self.rows_imported = 0
+        self.rejected_lines = 0
+        self.peak_memory_mb = None
+        self.lag_seconds = None
+        self.stage_utilisation = None
 
     def import_log_data(self, log_file):
         self.db_connector.connect()
-        cursor = self.db_connector.connection.cursor()
+        connection = self.db_connector.connection
+        with self.db_connector.bulk_load_settings(connection):
+            self.load_log_data(log_file, connection)
+
+    def load_log_data(self, log_file, connection):
         start_time = time.time()
 
-        # Создание таблицы log_data, если она не существует
-        create_table_query = """
+        if self.database_type == "mongodb":
+            # Коллекция создаётся первой вставкой, индексы строятся после загрузки
+            if self.defer_indexes_for_load(connection):
+                Mongo.drop_indexes(connection)
+        elif self.database_type != "redis":
+            self.create_table(connection)
+            if self.defer_indexes_for_load(connection):
+                self.drop_indexes(connection)
+
+        # Строки пишутся пакетами самым быстрым способом, доступным для СУБД
+        stats = {'rejected': 0}
+        loader = self.create_loader(connection, self.batch_size)
+        cache = None
+        cache_writer = None
+        pipeline = None
+        if self.columnar_cache is not None and not self.incremental:
+            # Колоночный кэш по текущему состоянию файла заменяет разбор;
+            # если его нет, он пишется попутно с загрузкой
+            if Columnar.is_fresh(self.columnar_cache, log_file):
+                print(f"Строки читаются из колоночного кэша {self.columnar_cache}.")
+                cache = Columnar.ColumnarCache(self.columnar_cache)
+                stats['rejected'] = cache.rejected
+            else:
+                cache_writer = Columnar.ColumnarWriter(self.columnar_cache, log_file)
+                loader.observers.append(cache_writer)
+        if self.incremental:
+            # Читаются только байты, дописанные после прошлой контрольной точки;
+            # пакет и новая контрольная точка фиксируются одной транзакцией
+            store = Checkpoint.CheckpointStore(connection, self.database_type)
+            store.create_table()
+            state = store.resume(log_file)
+            print(f"Импорт файла {log_file} с позиции {state['offset']} байт.")
+            lines = Reader.read_complete_lines(log_file, self.chunk_size, state['offset'])
+            parsed_rows = parse_log_lines(Checkpoint.track_offset(lines, state), stats)
+
+            def save_checkpoint():
+                store.save(state)
+                self.commit(loader, connection)
+
+            loader.on_flush = save_checkpoint
+        elif cache is not None:
+            parsed_rows = cache.iter_rows()
+        elif self.workers > 1:
+            parsed_rows = parse_log_file_parallel(log_file, self.workers, stats, self.chunk_size)
+        elif self.pipeline:
+            # Чтение, разбор и запись перекрываются в отдельных потоках
+            pipeline = Pipeline.IngestPipeline(log_file, self.chunk_size, stats=stats)
+            parsed_rows = pipeline.rows()
+        else:
+            parsed_rows = parse_log_lines(Reader.read_lines(log_file, self.chunk_size), stats)
+        rows = loader.load(parsed_rows)
+        if self.incremental:
+            store.save(state)
+        self.commit(loader, connection)
+        if cache is not None:
+            cache.close()
+        if pipeline is not None:
+            self.stage_utilisation = pipeline.report()
+            for name, busy, waiting_input, waiting_output in self.stage_utilisation:
+                print(f"Стадия {name}: работа {busy:.0%}, ожидание входа {waiting_input:.0%}, "
+                      f"ожидание выхода {waiting_output:.0%}")
+        if cache_writer is not None:
+            cache_writer.close(stats['rejected'])
+        if self.database_type != "redis":
+            index_start_time = time.time()
+            if self.database_type == "mongodb":
+                Mongo.create_indexes(connection)
+            else:
+                self.create_indexes(connection)
+            print(f"Построение индексов выполнено за {time.time() - index_start_time} секунд.")
+        self.rows_imported = rows
+        self.rejected_lines = stats['rejected']
+        end_time = time.time()
+        execution_time = end_time - start_time
+        print(f"Импорт лога в базу данных выполнен за {execution_time} секунд.")
+        if execution_time > 0:
+            print(f"Загружено строк: {rows} ({rows / execution_time:.0f} строк/с)")
+        print(f"Отброшено нераспознанных строк: {self.rejected_lines}")
+        self.peak_memory_mb = Reader.peak_memory_mb()
+        if self.peak_memory_mb is not None:
+            print(f"Пиковое потребление памяти: {self.peak_memory_mb:.1f} МБ")
+
+    # Непрерывная загрузка растущего лога микропакетами: пакет фиксируется, как только
+    # набрано max_batch_rows строк или первая строка пакета ждёт дольше max_latency секунд.
+    # Задержка (время фиксации минус время запроса из лога) пишется в ingest_lag.
+    def follow_log_data(self, log_file, max_batch_rows=FOLLOW_BATCH_ROWS, max_latency=FOLLOW_MAX_LATENCY,
+                        stop_event=None):
+        if self.database_type in NON_SQL_DATABASES:
+            raise ValueError("Follow mode requires a transactional SQL database.")
+        self.db_connector.connect()
+        connection = self.db_connector.connection
+        self.create_table(connection)
+        self.create_indexes(connection)
+        store = Checkpoint.CheckpointStore(connection, self.database_type)
+        store.create_table()
+        state = store.resume(log_file)
+        loader = self.create_loader(connection, max_batch_rows)
+        batch = {'started': None, 'oldest_epoch': None}
+
+        def commit_batch():
+            committed_at = time.time()
+            rows = loader.rows_loaded - self.rows_imported
+            if batch['oldest_epoch'] is not None:
+                self.lag_seconds = committed_at - batch['oldest_epoch']
+            store.save(state)
+            store.save_lag(state['log_file'], committed_at, rows, self.lag_seconds)
+            self.commit(loader, connection)
+            self.rows_imported = loader.rows_loaded
+            batch.update(started=None, oldest_epoch=None)
+            logger.info("Зафиксировано строк: %s, задержка: %s с", rows, self.lag_seconds)
+
+        loader.on_flush = commit_batch
+        # При ротации хвост старого файла фиксируется до того, как позиция перейдёт на новый
+        follower = Follow.LogFollower(log_file, state, self.chunk_size, stop_event=stop_event,
+                                      on_rotate=loader.flush)
+        print(f"Отслеживание файла {log_file} с позиции {state['offset']} байт.")
+        parse_line = Parser.parse_line
+        try:
+            for line in follower.lines():
+                if line is not None:
+                    values = parse_line(line)
+                    if values is None:
+                        self.rejected_lines += 1
+                    else:
+                        if batch['started'] is None:
+                            batch['started'] = time.monotonic()
+                        epoch = values[-1]
+                        if epoch is not None and (batch['oldest_epoch'] is None or epoch < batch['oldest_epoch']):
+                            batch['oldest_epoch'] = epoch
+                        loader.add(values)
+                if batch['started'] is not None and time.monotonic() - batch['started'] >= max_latency:
+                    loader.flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loader.flush()
+            store.save(state)
+            self.commit(loader, connection)
+        print(f"Отслеживание остановлено. Загружено строк: {self.rows_imported}, "
+              f"отброшено: {self.rejected_lines}")
+
+    # Загрузчик со словарным кодированием, поминутными агрегатами и скетчами, если они включены
+    def create_loader(self, connection, batch_size):
+        encoder = None
+        if self.normalized:
+            encoder = Dictionary.RowEncoder(connection, self.database_type, self.dictionary_size)
+        if self.database_type == "redis":
+            return RedisStore.RedisLoader(connection, batch_size)
+        loader = Loader.create_bulk_loader(connection, self.database_type, batch_size, encoder)
+        if self.rollups:
+            loader.observers.append(Rollup.RollupWriter(connection, self.database_type))
+        if self.sketches:
+            sketch_writer = Sketch.SketchWriter(connection, self.database_type, self.sketch_capacity)
+            sketch_writer.load()
+            loader.observers.append(sketch_writer)
+        return loader
+
+    # Фиксация загруженных строк вместе с новой версией данных для кэша результатов
+    def commit(self, loader, connection):
+        Cache.bump_version(connection, self.database_type)
+        loader.commit()
+
+    # Создание таблицы log_data (и справочников в нормализованной схеме), агрегатов и скетчей, если их нет
+    def create_table(self, connection):
+        Cache.create_version_table(connection)
+        if self.normalized:
+            self.create_normalized_tables(connection)
+        else:
+            self.create_log_data_table(connection)
+        if self.rollups:
+            rollup_writer = Rollup.RollupWriter(connection, self.database_type)
+            rollup_writer.create_tables()
+            # Строки, загруженные без --rollups, в агрегаты не попали: они пересчитываются до загрузки
+            if not rollup_writer.is_complete():
+                print("Поминутные агрегаты не покрывают log_data и пересчитываются по ней.")
+                rollup_writer.rebuild(self.normalized)
+            connection.commit()
+        if self.sketches:
+            sketch_writer = Sketch.SketchWriter(connection, self.database_type, self.sketch_capacity)
+            sketch_writer.create_table()
+            sketch_writer.load()
+            # Скетчи строятся заново по log_data, если часть её строк загружена без --sketches
+            if not sketch_writer.is_complete():
+                print("Скетчи не покрывают log_data и строятся заново по ней.")
+                sketch_writer.seed(self.normalized)
+            connection.commit()
+
+    def create_log_data_table(self, connection):
+        create_table_query = f"""
             CREATE TABLE IF NOT EXISTS log_data (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id {self.dialect.auto_increment_key},
                 ip_address VARCHAR(255),
                 forwarded_for VARCHAR(255),
-                timestamp VARCHAR(255),
-                request LONGTEXT,
+                timestamp {self.dialect.timestamp},
+                request {self.dialect.text},
                 status_code INT,
                 response_size INT,
                 time_taken INT,
-                referer LONGTEXT,
-                user_agent LONGTEXT,
-                balancer_worker_name VARCHAR(255)
+                referer {self.dialect.text},
+                user_agent {self.dialect.text},
+                balancer_worker_name VARCHAR(255),
+                epoch BIGINT
             )
         """
+        cursor = connection.cursor()
         cursor.execute(create_table_query)
+        cursor.close()
 
-        with open(log_file, 'r') as file:
-            log_data = file.readlines()
-
-        for line in log_data:
-            regex = r'^(?P<ip_address>\S+) \((?P<forwarded_for>\S+)\) - - \[(?P<timestamp>[\w:/]+\s[+\-]\d{4})\] "(?P<request>[A-Z]+ \S+ \S+)" (?P<status_code>\d+) (?P<response_size>\d+) (?P<time_taken>\d+) (?P<balancer_worker_name>\d+) "(?P<Referer>[^"]*)" "(?P<user_agent>[^"]*)"'
-            match = re.match(regex, line)
-            if match:
-                ip_address = match.group('ip_address')
-                forwarded_for = match.group('forwarded_for')
-                timestamp = match.group('timestamp')
-                request = match.group('request')
-                status_code = match.group('status_code')
-                response_size = match.group('response_size')
-                time_taken = match.group('time_taken')
-                balancer_worker_name = match.group('balancer_worker_name')
-                referer = match.group('Referer')
-                user_agent = match.group('user_agent')
-
-                sql = "INSERT INTO log_data (ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, referer, user_agent, balancer_worker_name) " \
-                      "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-                values = (
-                    ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, referer,
-                    user_agent, balancer_worker_name)
-                cursor.execute(sql, values)
-
-        self.db_connector.connection.commit()
+    def create_normalized_tables(self, connection):
+        create_table_query = f"""
+            CREATE TABLE IF NOT EXISTS log_data (
+                id {self.dialect.auto_increment_key},
+                ip_address VARCHAR(255),
+                forwarded_for VARCHAR(255),
+                timestamp {self.dialect.timestamp},
+                request_id INT,
+                status_code INT,
+                response_size INT,
+                time_taken INT,
+                referer_id INT,
+                user_agent_id INT,
+                balancer_worker_name VARCHAR(255),
+                epoch BIGINT
+            )
+        """
+        cursor = connection.cursor()
+        for table, _ in Dictionary.DIMENSIONS.values():
+            cursor.execute(Dictionary.create_dimension_table_query(table, self.dialect))
+        cursor.execute(create_table_query)
         cursor.close()
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print(f"Импорт лога в базу данных выполнен за {execution_time} секунд.")
 
-    def export_log_data(self, log_file):
+    # Перестройка индексов по всей таблице окупается, только когда загружается вся таблица.
+    # При инкрементальной загрузке дописывается малая часть; по умолчанию (None)
+    # индексы снимаются только перед загрузкой в пустую log_data
+    def defer_indexes_for_load(self, connection):
+        if self.incremental:
+            return False
+        if self.defer_indexes is not None:
+            return self.defer_indexes
+        return self.log_data_empty(connection)
+
+    def log_data_empty(self, connection):
+        if self.database_type == "mongodb":
+            return connection['log_data'].find_one({}, {'_id': 1}) is None
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM log_data LIMIT 1")
+        empty = cursor.fetchone() is None
+        cursor.close()
+        return empty
+
+    def existing_indexes(self, cursor):
+        cursor.execute("""
+            SELECT DISTINCT index_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'log_data'
+        """)
+        return {row[0] for row in cursor.fetchall()}
+
+    # Префиксные индексы по LONGTEXT есть только в MySQL: SQLite индексирует
+    # текст целиком, в PostgreSQL такие индексы не строятся
+    def managed_indexes(self):
+        indexes = NORMALIZED_INDEXES if self.normalized else LOG_DATA_INDEXES
+        managed = []
+        for name, columns in indexes:
+            columns = self.dialect.index_columns(columns)
+            if columns is not None:
+                managed.append((name, columns))
+        return managed
+
+    # Перед массовой загрузкой индексы удаляются, чтобы не перестраивать их на каждый пакет
+    def drop_indexes(self, connection):
+        cursor = connection.cursor()
+        if self.database_type == "mysql":
+            existing = self.existing_indexes(cursor)
+            drops = [f"DROP INDEX {name}" for name, _ in self.managed_indexes() if name in existing]
+            if drops:
+                cursor.execute(f"ALTER TABLE log_data {', '.join(drops)}")
+        else:
+            for name, _ in self.managed_indexes():
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+        cursor.close()
+
+    # В MySQL все недостающие индексы строятся одним ALTER TABLE за один проход по таблице
+    def create_indexes(self, connection):
+        cursor = connection.cursor()
+        if self.database_type == "mysql":
+            existing = self.existing_indexes(cursor)
+            additions = [f"ADD INDEX {name} ({columns})" for name, columns in self.managed_indexes()
+                         if name not in existing]
+            if additions:
+                cursor.execute(f"ALTER TABLE log_data {', '.join(additions)}")
+        else:
+            for name, columns in self.managed_indexes():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON log_data ({columns})")
+        connection.commit()
+        cursor.close()
+
+    # Экспорт идёт потоково: серверный курсор отдаёт строки порциями по
+    # fetch_size, каждая порция форматируется одной строкой и пишется одной
+    # записью в буферизованный (или gzip) файл, так что память не зависит
+    # от размера таблицы. При workers > 1 таблица делится на диапазоны id,
+    # каждый выгружается своим соединением из пула в отдельную часть,
+    # части склеиваются по порядку (склейка gzip-членов — тоже валидный gzip)
+    def export_log_data(self, log_file, compress=None, workers=1, fetch_size=EXPORT_FETCH_SIZE):
         self.db_connector.connect()
-        cursor = self.db_connector.connection.cursor()
         start_time = time.time()
-        select_query = "SELECT * FROM log_data"
-        cursor.execute(select_query)
-        log_data = cursor.fetchall()
-
-        with open(log_file, 'w') as file:
-            for data in log_data:
-                line = f"{data[1]} ({data[2]}) - - [{data[3]}] \"{data[4]}\" {data[5]} {data[6]} {data[7]} {data[10]} \"{data[8]}\" \"{data[9]}\"\n"
-                file.write(line)
+        if compress is None:
+            compress = log_file.endswith('.gz')
+        if self.db_connector.shared:
+            workers = 1
+
+        id_ranges = self.export_id_ranges(workers) if workers > 1 else None
+        if self.database_type == "mongodb":
+            rows = self.export_mongo(log_file, compress, fetch_size)
+        elif self.database_type == "redis":
+            rows = self.export_redis(log_file, compress, fetch_size)
+        elif id_ranges and len(id_ranges) > 1:
+            parts = [f"{log_file}.part{index}" for index in range(len(id_ranges))]
+            with ThreadPoolExecutor(max_workers=len(id_ranges)) as executor:
+                futures = [executor.submit(self.export_range, part, compress, fetch_size, id_range, f"export_{index}")
+                           for index, (part, id_range) in enumerate(zip(parts, id_ranges))]
+                rows = sum(future.result() for future in futures)
+            with open(log_file, 'wb') as output:
+                for part in parts:
+                    with open(part, 'rb') as source:
+                        shutil.copyfileobj(source, output, EXPORT_BUFFER_SIZE)
+                    os.remove(part)
+        else:
+            rows = self.export_range(log_file, compress, fetch_size)
+
         end_time = time.time()
         execution_time = end_time - start_time
-        print(f"Экспорт лога из базы данных выполнен за {execution_time} секунд.")
\ No newline at end of file
+        print(f"Экспорт лога из базы данных выполнен за {execution_time} секунд ({rows} строк).")
+
+    # Разбиение [MIN(id), MAX(id)] на равные диапазоны для параллельного экспорта
+    def export_id_ranges(self, parts):
+        result = self.db_connector.execute_query("SELECT MIN(id), MAX(id) FROM log_data")
+        if not result or result[0][0] is None:
+            return []
+        low, high = result[0]
+        step = max(1, (high - low + parts) // parts)
+        return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+    # Документы MongoDB выгружаются в порядке вставки порциями курсора по fetch_size
+    def export_mongo(self, log_file, compress, fetch_size):
+        rows = 0
+        documents = self.db_connector.connection['log_data'].find().sort('_id', 1).batch_size(fetch_size)
+        with open_export_file(log_file, compress) as file:
+            batch = []
+            for document in documents:
+                batch.append(Mongo.export_row(document))
+                if len(batch) >= fetch_size:
+                    file.write(format_log_lines(batch))
+                    rows += len(batch)
+                    batch = []
+            file.write(format_log_lines(batch))
+            rows += len(batch)
+        return rows
+
+    # В Redis хранятся только последние RedisStore.STREAM_MAXLEN строк (stream lines);
+    # они читаются порциями XRANGE, каждая следующая - после последнего прочитанного id
+    def export_redis(self, log_file, compress, fetch_size):
+        rows = 0
+        connection = self.db_connector.connection
+        start = '-'
+        with open_export_file(log_file, compress) as file:
+            while True:
+                entries = connection.xrange(RedisStore.key('lines'), min=start, count=fetch_size)
+                if not entries:
+                    break
+                file.write(''.join(RedisStore.text(fields[b'line']) for _, fields in entries))
+                rows += len(entries)
+                start = '(' + RedisStore.text(entries[-1][0])
+        return rows
+
+    # Выгрузка всей таблицы или одного диапазона id в файл
+    def export_range(self, log_file, compress, fetch_size, id_range=None, cursor_name="export"):
+        select_query = "SELECT l.id, l.ip_address, l.forwarded_for, l.timestamp, l.request, l.status_code, " \
+                       "l.response_size, l.time_taken, l.referer, l.user_agent, l.balancer_worker_name, l.epoch " \
+                       "FROM log_data l"
+        if self.normalized:
+            select_query = """
+                SELECT l.id, l.ip_address, l.forwarded_for, l.timestamp, r.value, l.status_code, l.response_size,
+                       l.time_taken, f.value, u.value, l.balancer_worker_name, l.epoch
+                FROM log_data l
+                LEFT JOIN requests r ON r.id = l.request_id
+                LEFT JOIN referers f ON f.id = l.referer_id
+                LEFT JOIN user_agents u ON u.id = l.user_agent_id
+            """
+        params = None
+        if id_range is not None:
+            select_query += " WHERE l.id BETWEEN %s AND %s"
+            params = id_range
+        select_query += " ORDER BY l.id"
+
+        rows = 0
+        with self.db_connector.pooled() as connection:
+            cursor = self.db_connector.server_cursor(connection, cursor_name)
+            try:
+                if params is None:
+                    cursor.execute(self.dialect.query(select_query))
+                else:
+                    cursor.execute(self.dialect.query(select_query), params)
+                with open_export_file(log_file, compress) as file:
+                    while True:
+                        batch = cursor.fetchmany(fetch_size)
+                        if not batch:
+                            break
+                        file.write(format_log_lines(batch))
+                        rows += len(batch)
+            finally:
+                cursor.close()
+        return rows
\ No newline at end of file
@@ -0,0 +1,158 @@
+import re
+
+# SQL-диалекты. Всё, чем DDL и запросы различаются между СУБД (плейсхолдеры,
+# автоинкремент, тип длинного текста, целочисленное деление, строковые
+# функции, upsert, префиксные индексы), собрано здесь. Запросы в коде пишутся
+# в стиле MySQL с плейсхолдерами %s и пропускаются через query().
+
+PREFIX_LENGTH = re.compile(r'\(\d+\)')
+
+
+# Первые count частей строки по разделителю (как SUBSTRING_INDEX(x, d, count)).
+# Выражение строится из instr/substr: остаток после i-й части ссылается на
+# предыдущий остаток дважды, поэтому count должен быть небольшим.
+def leading_parts(column, delimiter, count):
+    rest = column
+    end = "0"
+    for _ in range(count):
+        end = f"({end} + instr({rest} || '{delimiter}', '{delimiter}'))"
+        rest = f"substr({rest}, instr({rest} || '{delimiter}', '{delimiter}') + 1)"
+    return f"substr({column}, 1, {end} - 1)"
+
+
+# index-я часть строки по разделителю или последняя, если частей меньше
+# (как SUBSTRING_INDEX(SUBSTRING_INDEX(x, d, index), d, -1))
+def part_at(column, delimiter, index):
+    rest = column
+    for _ in range(index - 1):
+        rest = f"substr({rest}, instr({rest}, '{delimiter}') + 1)"
+    return f"substr({rest}, 1, instr({rest} || '{delimiter}', '{delimiter}') - 1)"
+
+
+class MySQLDialect:
+    name = "mysql"
+    placeholder = "%s"
+    auto_increment_key = "INT AUTO_INCREMENT PRIMARY KEY"
+    text = "LONGTEXT"
+    timestamp = "DATETIME"
+    greatest = "GREATEST"
+    # Строковые выражения дороги: сначала группировка по исходному тексту,
+    # выражение вычисляется только для различных значений
+    pregroup_text = False
+
+    def query(self, sql):
+        return sql
+
+    def integer_division(self, dividend, divisor):
+        return f"{dividend} DIV {divisor}"
+
+    def leading_words(self, column, count):
+        return f"SUBSTRING_INDEX({column}, ' ', {count})"
+
+    # Домен из URL: третья часть по '/' (https://домен/...)
+    def url_host(self, column):
+        return f"SUBSTRING_INDEX(SUBSTRING_INDEX({column}, '/', 3), '/', -1)"
+
+    # Столбцы индекса; None - индекс в этой СУБД не строится
+    def index_columns(self, columns):
+        return columns
+
+    # Запрос, возвращающий строку, если таблица (параметр %s) есть в текущей базе
+    def table_exists(self):
+        return "SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s"
+
+    def placeholders(self, count):
+        return ", ".join([self.placeholder] * count)
+
+    def insert(self, table, columns):
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({self.placeholders(len(columns))})"
+
+    # INSERT, который при совпадении ключа прибавляет (add) или берёт максимум (max)
+    def upsert(self, table, keys, columns, updates):
+        assignments = [
+            f"{column} = {column} + VALUES({column})" if operation == 'add'
+            else f"{column} = GREATEST({column}, VALUES({column}))"
+            for column, operation in updates
+        ]
+        return f"{self.insert(table, keys + columns)} ON DUPLICATE KEY UPDATE {', '.join(assignments)}"
+
+    # INSERT, который пропускает строки с уже существующим уникальным ключом
+    def insert_ignore(self, table, columns, key):
+        return "INSERT IGNORE" + self.insert(table, columns)[len("INSERT"):]
+
+
+class PostgreSQLDialect(MySQLDialect):
+    name = "postgresql"
+    auto_increment_key = "SERIAL PRIMARY KEY"
+    text = "TEXT"
+    timestamp = "TIMESTAMP"
+
+    # Деление целых в PostgreSQL целочисленное
+    def integer_division(self, dividend, divisor):
+        return f"({dividend} / {divisor})"
+
+    def leading_words(self, column, count):
+        return f"array_to_string((string_to_array({column}, ' '))[1:{count}], ' ')"
+
+    def url_host(self, column):
+        return f"CASE WHEN {column} LIKE '%%/%%/%%' THEN split_part({column}, '/', 3) " \
+               f"ELSE regexp_replace({column}, '^.*/', '') END"
+
+    # Индексы по префиксу длинного текста в PostgreSQL не строятся
+    def index_columns(self, columns):
+        return None if PREFIX_LENGTH.search(columns) else columns
+
+    def table_exists(self):
+        return "SELECT 1 FROM information_schema.tables WHERE table_schema = current_schema() AND table_name = %s"
+
+    def upsert(self, table, keys, columns, updates):
+        assignments = [
+            f"{column} = {table}.{column} + excluded.{column}" if operation == 'add'
+            else f"{column} = {self.greatest}({table}.{column}, excluded.{column})"
+            for column, operation in updates
+        ]
+        return f"{self.insert(table, keys + columns)} ON CONFLICT ({', '.join(keys)}) " \
+               f"DO UPDATE SET {', '.join(assignments)}"
+
+    def insert_ignore(self, table, columns, key):
+        return f"{self.insert(table, columns)} ON CONFLICT ({key}) DO NOTHING"
+
+
+# SQLite: INTEGER PRIMARY KEY - псевдоним rowid (без отдельного индекса),
+# строковые функции собираются из instr/substr, индексы по тексту строятся целиком
+class SQLiteDialect(PostgreSQLDialect):
+    name = "sqlite"
+    placeholder = "?"
+    auto_increment_key = "INTEGER PRIMARY KEY"
+    greatest = "MAX"
+    pregroup_text = True
+
+    def query(self, sql):
+        return sql.replace('%s', '?').replace('%%', '%')
+
+    def leading_words(self, column, count):
+        return leading_parts(column, ' ', count)
+
+    def url_host(self, column):
+        return part_at(column, '/', 3)
+
+    def index_columns(self, columns):
+        return PREFIX_LENGTH.sub('', columns)
+
+    def table_exists(self):
+        return "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s"
+
+    def insert_ignore(self, table, columns, key):
+        return "INSERT OR IGNORE" + self.insert(table, columns)[len("INSERT"):]
+
+
+DIALECTS = {
+    "mysql": MySQLDialect(),
+    "postgresql": PostgreSQLDialect(),
+    "sqlite": SQLiteDialect(),
+}
+
+
+# Диалект СУБД; для остальных (h2) - синтаксис MySQL
+def for_database(database_type):
+    return DIALECTS.get(database_type, DIALECTS["mysql"])
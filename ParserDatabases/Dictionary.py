@@ -0,0 +1,103 @@
+import hashlib
+from collections import OrderedDict
+from ParserDatabases import Dialect
+
+# Словарное кодирование длинных текстовых столбцов (user_agent, referer,
+# request) в таблицы-справочники. В log_data остаются только целые id.
+
+DICTIONARY_SIZE = 100000
+
+# Позиция столбца в кортеже парсера -> (справочник, столбец id в log_data)
+DIMENSIONS = {
+    3: ('requests', 'request_id'),
+    7: ('referers', 'referer_id'),
+    8: ('user_agents', 'user_agent_id'),
+}
+
+def value_hash(value):
+    return hashlib.md5(value.encode('utf-8', errors='replace')).hexdigest()
+
+
+def create_dimension_table_query(table, dialect):
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id {dialect.auto_increment_key},
+            value_hash CHAR(32) NOT NULL UNIQUE,
+            value {dialect.text}
+        )
+    """
+
+
+# Справочник одной таблицы с LRU-кэшем значение -> id в памяти процесса.
+# Промахи разрешаются пачкой: один SELECT по хэшам и одна вставка недостающих.
+class DimensionDictionary:
+    def __init__(self, connection, table, database_type, capacity=DICTIONARY_SIZE):
+        self.connection = connection
+        self.table = table
+        self.capacity = capacity
+        dialect = Dialect.for_database(database_type)
+        self.placeholder = dialect.placeholder
+        self.insert_query = dialect.insert_ignore(table, ['value_hash', 'value'], 'value_hash')
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, values):
+        cache = self.cache
+        missing = {value for value in values if value not in cache}
+        resolved = self.resolve(missing) if missing else {}
+        ids = []
+        for value in values:
+            if value in resolved:
+                ids.append(resolved[value])
+                self.misses += 1
+            else:
+                cache.move_to_end(value)
+                ids.append(cache[value])
+                self.hits += 1
+        for value, value_id in resolved.items():
+            cache[value] = value_id
+        while len(cache) > self.capacity:
+            cache.popitem(last=False)
+        return ids
+
+    def resolve(self, values):
+        hashes = {value_hash(value): value for value in values}
+        resolved = self.select(hashes)
+        absent = [(key, value) for key, value in hashes.items() if value not in resolved]
+        if absent:
+            cursor = self.connection.cursor()
+            cursor.executemany(self.insert_query, absent)
+            cursor.close()
+            resolved.update(self.select({key: value for key, value in absent}))
+        return resolved
+
+    def select(self, hashes, chunk=1000):
+        resolved = {}
+        keys = list(hashes)
+        cursor = self.connection.cursor()
+        for start in range(0, len(keys), chunk):
+            part = keys[start:start + chunk]
+            placeholders = ", ".join([self.placeholder] * len(part))
+            cursor.execute(f"SELECT id, value_hash FROM {self.table} WHERE value_hash IN ({placeholders})", part)
+            for value_id, key in cursor.fetchall():
+                resolved[hashes[key]] = value_id
+        cursor.close()
+        return resolved
+
+
+# Заменяет текстовые значения в пакете строк на id справочников
+class RowEncoder:
+    def __init__(self, connection, database_type, capacity=DICTIONARY_SIZE):
+        self.dictionaries = {
+            position: DimensionDictionary(connection, table, database_type, capacity)
+            for position, (table, _) in DIMENSIONS.items()
+        }
+
+    def encode_rows(self, batch):
+        rows = [list(values) for values in batch]
+        for position, dictionary in self.dictionaries.items():
+            ids = dictionary.encode([values[position] for values in batch])
+            for values, value_id in zip(rows, ids):
+                values[position] = value_id
+        return [tuple(values) for values in rows]
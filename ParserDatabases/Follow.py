@@ -0,0 +1,80 @@
+import os
+import time
+from ParserDatabases import Reader
+
+POLL_INTERVAL = 0.05
+
+
+# Чтение растущего файла по аналогии с tail -F: файл отслеживается по имени,
+# после ротации (сменился inode) дочитывается старый файл и открывается новый,
+# после усечения чтение начинается с начала. Позиция и последняя строка
+# записываются в state, как и при инкрементальном импорте. on_rotate вызывается
+# до перехода к новому файлу (или к началу усечённого), пока state ещё описывает
+# старый: так недофиксированные строки старого файла фиксируются со старой позицией.
+class LogFollower:
+    def __init__(self, log_file, state, chunk_size=Reader.CHUNK_SIZE, poll_interval=POLL_INTERVAL,
+                 stop_event=None, on_rotate=None):
+        self.log_file = log_file
+        self.state = state
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event
+        self.on_rotate = on_rotate
+        self.file = None
+
+    def open(self, offset):
+        try:
+            self.file = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            self.file = None
+            return
+        self.file.seek(offset)
+        stat = os.fstat(self.file.fileno())
+        self.state.update(inode=stat.st_ino, size=stat.st_size, offset=offset, last_line=None)
+
+    # True, если файл был переоткрыт и недочитанный хвост нужно сбросить
+    def reopen_if_rotated(self):
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            return False
+        if self.file is None or stat.st_ino != self.state['inode']:
+            if self.file is not None:
+                if self.on_rotate is not None:
+                    self.on_rotate()
+                self.file.close()
+            self.open(0)
+            return True
+        if stat.st_size < self.state['offset']:
+            if self.on_rotate is not None:
+                self.on_rotate()
+            self.file.seek(0)
+            self.state.update(size=stat.st_size, offset=0, last_line=None)
+            return True
+        self.state['size'] = stat.st_size
+        return False
+
+    # Отдаёт строки по мере появления; None - файл дочитан до конца,
+    # чтобы вызывающий код мог сбросить пакет по таймауту
+    def lines(self):
+        self.open(self.state['offset'])
+        tail = b''
+        try:
+            while self.stop_event is None or not self.stop_event.is_set():
+                chunk = self.file.read(self.chunk_size) if self.file is not None else b''
+                if chunk:
+                    lines = (tail + chunk).split(b'\n')
+                    tail = lines.pop()
+                    for line in lines:
+                        self.state['offset'] += len(line) + 1
+                        self.state['last_line'] = line
+                        yield line.decode('utf-8', errors='replace')
+                    continue
+                if self.reopen_if_rotated():
+                    tail = b''
+                    continue
+                yield None
+                time.sleep(self.poll_interval)
+        finally:
+            if self.file is not None:
+                self.file.close()
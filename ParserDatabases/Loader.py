@@ -0,0 +1,135 @@
+import io
+from ParserDatabases import Dialect
+
+# Порядок столбцов совпадает с кортежами, которые отдаёт парсер
+LOG_DATA_COLUMNS = (
+    'ip_address', 'forwarded_for', 'timestamp', 'request', 'status_code',
+    'response_size', 'time_taken', 'referer', 'user_agent', 'balancer_worker_name', 'epoch',
+)
+
+# Нормализованная схема: текстовые столбцы заменены id справочников
+NORMALIZED_COLUMNS = (
+    'ip_address', 'forwarded_for', 'timestamp', 'request_id', 'status_code',
+    'response_size', 'time_taken', 'referer_id', 'user_agent_id', 'balancer_worker_name', 'epoch',
+)
+
+BATCH_SIZE = 5000
+
+
+# Базовый загрузчик: копит строки в пакет и сбрасывает его одной операцией.
+# observers получают каждый пакет до кодирования (поминутные агрегаты и т.п.),
+# encoder (если задан) перед записью заменяет тексты на id справочников,
+# on_flush (если задан) вызывается после записи каждого пакета.
+class BulkLoader:
+    dialect = Dialect.for_database("mysql")
+
+    def __init__(self, connection, batch_size=BATCH_SIZE, encoder=None):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.encoder = encoder
+        self.columns = LOG_DATA_COLUMNS if encoder is None else NORMALIZED_COLUMNS
+        self.observers = []
+        self.on_flush = None
+        self.batch = []
+        self.rows_loaded = 0
+
+    def add(self, values):
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def load(self, rows):
+        for values in rows:
+            self.add(values)
+        self.flush()
+        return self.rows_loaded
+
+    def flush(self):
+        if self.batch:
+            for observer in self.observers:
+                observer.write_batch(self.batch)
+            if self.encoder is not None:
+                self.batch = self.encoder.encode_rows(self.batch)
+            self.write_batch(self.batch)
+            self.rows_loaded += len(self.batch)
+            self.batch = []
+            if self.on_flush is not None:
+                self.on_flush()
+
+    def write_batch(self, batch):
+        cursor = self.connection.cursor()
+        cursor.executemany(self.dialect.insert('log_data', self.columns), batch)
+        cursor.close()
+
+    def commit(self):
+        self.connection.commit()
+
+
+class MySQLBulkLoader(BulkLoader):
+    # pymysql сам переписывает executemany для INSERT ... VALUES
+    # в многострочные запросы (до max_allowed_packet)
+    def write_batch(self, batch):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(self.dialect.insert('log_data', self.columns), batch)
+
+
+# Экранирование значения для текстового формата COPY
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class PostgreSQLBulkLoader(BulkLoader):
+    # Пакет передаётся одним потоком через COPY FROM STDIN
+    def write_batch(self, batch):
+        buffer = io.StringIO()
+        for values in batch:
+            buffer.write('\t'.join(copy_value(value) for value in values))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ", ".join(self.columns)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY log_data ({columns}) FROM STDIN", buffer)
+
+
+# Все пакеты попадают в одну транзакцию, фиксируемую в commit(). На время
+# загрузки журнал не сбрасывается на диск (synchronous=OFF): при сбое
+# теряется только незафиксированная загрузка, а база в режиме WAL остаётся целой
+class SQLiteBulkLoader(BulkLoader):
+    dialect = Dialect.for_database("sqlite")
+
+    def write_batch(self, batch):
+        if not self.connection.in_transaction:
+            self.connection.execute("PRAGMA synchronous=OFF")
+            self.connection.execute("BEGIN")
+        self.connection.executemany(self.dialect.insert('log_data', self.columns), batch)
+
+    def commit(self):
+        self.connection.commit()
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+
+# Документы с типизированными полями (timestamp - BSON-дата, числа - целые),
+# пустые поля не хранятся. Неупорядоченная вставка не останавливается на
+# первой ошибке и позволяет серверу писать пакет без соблюдения порядка
+class MongoBulkLoader(BulkLoader):
+    def write_batch(self, batch):
+        documents = [{column: value for column, value in zip(LOG_DATA_COLUMNS, values) if value is not None}
+                     for values in batch]
+        self.connection['log_data'].insert_many(documents, ordered=False, bypass_document_validation=True)
+
+    def commit(self):
+        pass
+
+
+def create_bulk_loader(connection, database_type, batch_size=BATCH_SIZE, encoder=None):
+    if database_type == "mysql":
+        return MySQLBulkLoader(connection, batch_size, encoder)
+    elif database_type == "postgresql":
+        return PostgreSQLBulkLoader(connection, batch_size, encoder)
+    elif database_type == "sqlite":
+        return SQLiteBulkLoader(connection, batch_size, encoder)
+    elif database_type == "mongodb":
+        return MongoBulkLoader(connection, batch_size)
+    return BulkLoader(connection, batch_size, encoder)
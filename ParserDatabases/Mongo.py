@@ -0,0 +1,246 @@
+import time
+from ParserDatabases import Analyzer
+from ParserDatabases import Cache
+from ParserDatabases import Sketch
+
+# Хранение log_data в MongoDB: одна коллекция документов с типизированными
+# полями (timestamp - BSON-дата, числа - целые, пустые поля не хранятся),
+# загрузка неупорядоченными insert_many, а запросы LogAnalyzer - конвейеры
+# агрегации, которые выполняются на сервере; клиенту приходят только итоговые строки.
+
+# Составные индексы под запросы анализатора (те же, что LOG_DATA_INDEXES в SQL)
+MONGO_INDEXES = (
+    ('idx_log_data_epoch', [('epoch', 1)]),
+    ('idx_log_data_status_epoch', [('status_code', 1), ('epoch', 1)]),
+    ('idx_log_data_time_taken', [('time_taken', 1)]),
+    ('idx_log_data_worker_time_taken', [('balancer_worker_name', 1), ('time_taken', 1)]),
+    ('idx_log_data_user_agent', [('user_agent', 1)]),
+    ('idx_log_data_ip_user_agent', [('ip_address', 1), ('user_agent', 1)]),
+)
+
+# Порядок полей для экспорта: как в SELECT из log_data
+EXPORT_FIELDS = (
+    '_id', 'ip_address', 'forwarded_for', 'timestamp', 'request', 'status_code', 'response_size',
+    'time_taken', 'referer', 'user_agent', 'balancer_worker_name', 'epoch',
+)
+
+
+def create_indexes(database):
+    for name, keys in MONGO_INDEXES:
+        database['log_data'].create_index(keys, name=name)
+
+
+# Перед массовой загрузкой индексы удаляются и строятся заново после неё
+def drop_indexes(database):
+    existing = database['log_data'].index_information()
+    for name, _ in MONGO_INDEXES:
+        if name in existing:
+            database['log_data'].drop_index(name)
+
+
+# Документ с полями в порядке SELECT для форматирования строки лога при экспорте
+def export_row(document):
+    return tuple(document.get(field) for field in EXPORT_FIELDS)
+
+
+# Начало интервала длиной width секунд, в который попадает epoch
+def bucket_start(width):
+    return {'$subtract': ['$epoch', {'$mod': ['$epoch', width]}]}
+
+
+# Те же методы и формат результатов, что у Analyzer.LogAnalyzer
+class MongoLogAnalyzer:
+    def __init__(self, db_connector, result_cache=None):
+        self.db_connector = db_connector
+        self.result_cache = result_cache
+
+    def cache_scope(self):
+        return 'mongodb',
+
+    # Конвейер над log_data; большие группировки могут использовать диск сервера.
+    # С statement_timeout соединителя сервер прерывает конвейер по maxTimeMS
+    def aggregate(self, pipeline):
+        self.db_connector.connect()
+        options = {'allowDiskUse': True}
+        if self.db_connector.statement_timeout is not None:
+            options['maxTimeMS'] = max(int(self.db_connector.statement_timeout * 1000), 1)
+        return list(self.db_connector.connection['log_data'].aggregate(pipeline, **options))
+
+    @Cache.cached()
+    def get_ip_user_agent_statistics(self, n):
+        result = self.aggregate([
+            {'$group': {'_id': {'ip_address': '$ip_address', 'user_agent': '$user_agent'}, 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}},
+            {'$limit': n},
+        ])
+        return [(row['_id'].get('ip_address'), row['_id'].get('user_agent'), row['count']) for row in result]
+
+    @Cache.cached()
+    def get_query_frequency(self, dT):
+        width = dT * 60
+        result = self.aggregate([
+            {'$match': {'epoch': {'$ne': None}}},
+            {'$group': {'_id': bucket_start(width), 'frequency': {'$sum': 1}}},
+            {'$sort': {'_id': 1}},
+        ])
+        return [(Analyzer.bucket_label(row['_id']), row['frequency']) for row in result]
+
+    @Cache.cached()
+    def get_top_user_agents(self, N):
+        result = self.aggregate([
+            {'$group': {'_id': '$user_agent', 'frequency': {'$sum': 1}}},
+            {'$sort': {'frequency': -1}},
+            {'$limit': N},
+        ])
+        return [(row['_id'], row['frequency']) for row in result]
+
+    # Для совместимости с LogAnalyzer: скетчей в MongoDB нет
+    @Cache.cached()
+    def get_top_k_error_bounds(self):
+        return []
+
+    @Cache.cached(relative_time=True)
+    def get_status_code_statistics(self, dT):
+        since = int(time.time()) - dT * 60
+        result = self.aggregate([
+            {'$match': {'status_code': {'$gte': 500, '$lte': 599}, 'epoch': {'$gte': since}}},
+            {'$group': {'_id': '$status_code', 'frequency': {'$sum': 1}}},
+        ])
+        return [(row['_id'], row['frequency']) for row in result]
+
+    @Cache.cached()
+    def get_longest_shortest_requests(self, limit, order_by):
+        if order_by == "longest":
+            direction = -1
+        elif order_by == "shortest":
+            direction = 1
+        else:
+            raise ValueError("Invalid order_by value. Must be 'longest' or 'shortest'.")
+        result = self.aggregate([
+            {'$sort': {'time_taken': direction}},
+            {'$limit': limit},
+            {'$project': {'_id': 0, 'request': 1, 'time_taken': 1}},
+        ])
+        return [(row.get('request'), row.get('time_taken')) for row in result]
+
+    # Шаблон - первые slash_count + 1 слов запроса (как SUBSTRING_INDEX в SQL);
+    # сервер группирует по массиву слов, в строку склеиваются только итоговые N
+    @Cache.cached()
+    def get_common_requests(self, N, slash_count):
+        result = self.aggregate([
+            {'$match': {'request': {'$regex': '^GET '}}},
+            {'$group': {'_id': {'$slice': [{'$split': ['$request', ' ']}, slash_count + 1]},
+                        'frequency': {'$sum': 1}}},
+            {'$sort': {'frequency': -1}},
+            {'$limit': N},
+        ])
+        return [(' '.join(row['_id']), row['frequency']) for row in result]
+
+    @Cache.cached()
+    def get_upstream_requests_WORKER(self):
+        result = self.aggregate([
+            {'$match': {'balancer_worker_name': {'$ne': None}}},
+            {'$group': {'_id': '$balancer_worker_name', 'request_count': {'$sum': 1},
+                        'average_time': {'$avg': '$time_taken'}}},
+            {'$sort': {'_id': 1}},
+        ])
+        return [(row['_id'], row['request_count'], row['average_time']) for row in result]
+
+    # Домен - третья часть referer по '/' (https://домен/...)
+    @Cache.cached()
+    def get_conversion_statistics(self, sort_by):
+        sort_field = '_id' if sort_by == 'domain' else sort_by
+        result = self.aggregate([
+            {'$match': {'referer': {'$ne': None}}},
+            {'$group': {'_id': {'$arrayElemAt': [{'$slice': [{'$split': ['$referer', '/']}, 3]}, -1]},
+                        'conversion_count': {'$sum': 1}}},
+            {'$sort': {sort_field: -1}},
+        ])
+        return [(row['_id'], row['conversion_count']) for row in result]
+
+    @Cache.cached(relative_time=True)
+    def get_upstream_requests(self, interval):
+        since = int(time.time()) - Analyzer.interval_seconds(interval)
+        result = self.aggregate([
+            {'$match': {'epoch': {'$gte': since}, 'balancer_worker_name': {'$ne': None}}},
+            {'$group': {'_id': None, 'upstream_request_count': {'$sum': 1},
+                        'average_time': {'$avg': '$time_taken'}}},
+        ])
+        if not result:
+            return [(0, None)]
+        return [(result[0]['upstream_request_count'], result[0]['average_time'])]
+
+    @Cache.cached(relative_time=True)
+    def find_most_active_periods(self, N, interval=None):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        width = N * 60
+        result = self.aggregate([
+            {'$match': {'epoch': {'$gte': since}}},
+            {'$group': {'_id': bucket_start(width), 'request_count': {'$sum': 1}}},
+            {'$sort': {'request_count': -1}},
+            {'$limit': N},
+        ])
+        return [(Analyzer.bucket_label(row['_id']), row['request_count']) for row in result]
+
+    # Различные значения считаются в два шага группировки: сначала пары
+    # (интервал, значение), затем число пар в интервале - без массивов значений
+    def distinct_counts(self, since, width):
+        counts = {}
+        for index, (field, _) in enumerate(Sketch.DISTINCT_FIELDS):
+            bucket = 0 if width is None else bucket_start(width)
+            result = self.aggregate([
+                {'$match': {'epoch': {'$gte': since}, field: {'$ne': None}}},
+                {'$group': {'_id': {'bucket': bucket, 'value': f'${field}'}}},
+                {'$group': {'_id': '$_id.bucket', 'distinct': {'$sum': 1}}},
+            ])
+            for row in result:
+                counts.setdefault(row['_id'], [0] * len(Sketch.DISTINCT_FIELDS))[index] = row['distinct']
+        return counts
+
+    @Cache.cached(relative_time=True)
+    def get_distinct_statistics(self, dT, interval=None):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        counts = self.distinct_counts(since, dT * 60)
+        return [(Analyzer.bucket_label(bucket),) + tuple(counts[bucket]) for bucket in sorted(counts)]
+
+    @Cache.cached(relative_time=True)
+    def get_distinct_counts(self, interval=None):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        counts = self.distinct_counts(since, None)
+        return [tuple(counts.get(0, [0] * len(Sketch.DISTINCT_FIELDS)))]
+
+    # Сервер считает логарифмическую гистограмму задержек по (интервал, воркер) с корзинами
+    # QuantileSketch: в ответе только счётчики корзин, а не все значения, поэтому документ
+    # группы не упирается в предел размера BSON. Перцентили - с точностью QuantileSketch
+    @Cache.cached(relative_time=True)
+    def get_latency_percentiles(self, dT=None, interval=None, percentiles=Sketch.PERCENTILES):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        width = None if dT is None else dT * 60
+        log_gamma = Sketch.QuantileSketch().log_gamma
+        result = self.aggregate([
+            {'$match': {'epoch': {'$gte': since}, 'balancer_worker_name': {'$ne': None}}},
+            {'$group': {'_id': {'bucket': 0 if width is None else bucket_start(width),
+                                'worker': '$balancer_worker_name',
+                                'bin': {'$cond': [{'$gt': ['$time_taken', 0]},
+                                                  {'$ceil': {'$divide': [{'$ln': '$time_taken'}, log_gamma]}},
+                                                  None]}},
+                        'count': {'$sum': 1}}},
+            {'$group': {'_id': {'bucket': '$_id.bucket', 'worker': '$_id.worker'},
+                        'bins': {'$push': {'bin': '$_id.bin', 'count': '$count'}}}},
+        ])
+        statistics = []
+        for row in result:
+            sketch = Sketch.QuantileSketch()
+            for entry in row['bins']:
+                if entry.get('bin') is None:
+                    sketch.zeros += entry['count']
+                else:
+                    sketch.bins[int(entry['bin'])] += entry['count']
+                sketch.count += entry['count']
+            statistics.append(((row['_id']['bucket'], row['_id']['worker']), sketch.count,
+                               [sketch.percentile(p) for p in percentiles]))
+        statistics.sort()
+        if width is None:
+            return [(worker, count) + tuple(values) for (_, worker), count, values in statistics]
+        return [(Analyzer.bucket_label(bucket), worker, count) + tuple(values)
+                for (bucket, worker), count, values in statistics]
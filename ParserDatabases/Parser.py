@@ -0,0 +1,70 @@
+import calendar
+import re
+from datetime import datetime
+from functools import lru_cache
+
+# Разбор строки access-лога в кортеж типизированных значений.
+# Шаблон компилируется один раз при импорте модуля, а все поля извлекаются
+# одним вызовом match.groups() вместо десяти match.group(name).
+
+LOG_PATTERN = r'^(?P<ip_address>\S+) \((?P<forwarded_for>\S+)\) - - \[(?P<timestamp>[\w:/]+\s[+\-]\d{4})\] "(?P<request>[A-Z]+ \S+ \S+)" (?P<status_code>\d+) (?P<response_size>\d+) (?P<time_taken>\d+) (?P<balancer_worker_name>\d+) "(?P<Referer>[^"]*)" "(?P<user_agent>[^"]*)"'
+LOG_REGEX = re.compile(LOG_PATTERN)
+
+match_line = LOG_REGEX.match
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+MONTH_NUMBERS = {name: number for number, name in enumerate(MONTHS, 1)}
+
+
+# Метка времени вида dd/Mon/yyyy:HH:MM:SS +zzzz -> (локальное время лога, unix epoch).
+# Соседние строки почти всегда повторяют одну и ту же секунду, поэтому
+# результат кэшируется по исходной строке.
+@lru_cache(maxsize=4096)
+def parse_timestamp(value):
+    try:
+        date, zone = value.split()
+        day, month, rest = date.split('/', 2)
+        year, hour, minute, second = rest.split(':')
+        local_time = datetime(int(year), MONTH_NUMBERS[month], int(day), int(hour), int(minute), int(second))
+        offset = (int(zone[1:3]) * 60 + int(zone[3:5])) * 60
+    except (ValueError, KeyError):
+        return None, None
+    if zone[0] == '-':
+        offset = -offset
+    return local_time, calendar.timegm(local_time.timetuple()) - offset
+
+
+# Обратное преобразование для экспорта: смещение зоны восстанавливается
+# из разницы между локальным временем и epoch; соседние строки обычно
+# повторяют одну и ту же секунду, поэтому результат кэшируется
+@lru_cache(maxsize=4096)
+def format_timestamp(local_time, epoch):
+    if local_time is None or epoch is None:
+        return '-'
+    if isinstance(local_time, str):
+        local_time = datetime.fromisoformat(local_time)
+    offset = (calendar.timegm(local_time.timetuple()) - epoch) // 60
+    sign = '-' if offset < 0 else '+'
+    hours, minutes = divmod(abs(offset), 60)
+    return f"{local_time.day:02d}/{MONTHS[local_time.month - 1]}/{local_time.year}:" \
+           f"{local_time.hour:02d}:{local_time.minute:02d}:{local_time.second:02d} {sign}{hours:02d}{minutes:02d}"
+
+
+# Возвращает кортеж в порядке столбцов log_data или None для нераспознанной строки
+def parse_line(line):
+    match = match_line(line)
+    if match is None:
+        return None
+    ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, \
+        balancer_worker_name, referer, user_agent = match.groups()
+    local_time, epoch = parse_timestamp(timestamp)
+    return (ip_address, forwarded_for, local_time, request, int(status_code), int(response_size),
+            int(time_taken), referer, user_agent, balancer_worker_name, epoch)
+
+
+# Обратное к parse_line: кортеж в порядке столбцов log_data -> строка лога с переводом строки
+def format_line(values):
+    ip_address, forwarded_for, local_time, request, status_code, response_size, time_taken, \
+        referer, user_agent, balancer_worker_name, epoch = values
+    return f"{ip_address} ({forwarded_for}) - - [{format_timestamp(local_time, epoch)}] \"{request}\" " \
+           f"{status_code} {response_size} {time_taken} {balancer_worker_name} \"{referer}\" \"{user_agent}\"\n"
@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+from ParserDatabases import Parser
+from ParserDatabases import Reader
+
+# Конвейер импорта: чтение файла, разбор и запись в базу идут в разных потоках
+# и перекрываются - пока писатель ждёт ответа базы, разбирается следующая
+# порция. Очереди между стадиями ограничены: если следующая стадия не успевает,
+# предыдущая останавливается на put(). Для каждой стадии считается время работы
+# и время ожидания входа и выхода, по нему видно узкое место.
+
+# Строк в одной порции, передаваемой между стадиями
+PIPELINE_BATCH_LINES = 2000
+
+# Порций в каждой очереди между стадиями
+PIPELINE_QUEUE_SIZE = 8
+
+# Конец потока порций
+END = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.waiting_input = 0.0
+        self.waiting_output = 0.0
+
+
+class IngestPipeline:
+    def __init__(self, log_file, chunk_size=Reader.CHUNK_SIZE, batch_lines=PIPELINE_BATCH_LINES,
+                 queue_size=PIPELINE_QUEUE_SIZE, stats=None):
+        self.log_file = log_file
+        self.chunk_size = chunk_size
+        self.batch_lines = batch_lines
+        self.lines_queue = queue.Queue(queue_size)
+        self.rows_queue = queue.Queue(queue_size)
+        self.stop = threading.Event()
+        self.stats = stats if stats is not None else {'rejected': 0}
+        self.stages = [StageStats('reader'), StageStats('parser'), StageStats('writer')]
+        self.error = None
+        self.elapsed = 0.0
+
+    # put/get с периодической проверкой остановки, чтобы потоки не зависали,
+    # если потребитель прервал импорт
+    def put(self, target, item, stage):
+        start_time = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stage.waiting_output += time.perf_counter() - start_time
+
+    def get(self, source, stage):
+        start_time = time.perf_counter()
+        item = END
+        while not self.stop.is_set():
+            try:
+                item = source.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        stage.waiting_input += time.perf_counter() - start_time
+        return item
+
+    def read(self):
+        stage = self.stages[0]
+        try:
+            batch = []
+            start_time = time.perf_counter()
+            for line in Reader.read_lines(self.log_file, self.chunk_size):
+                batch.append(line)
+                if len(batch) >= self.batch_lines:
+                    stage.busy += time.perf_counter() - start_time
+                    self.put(self.lines_queue, batch, stage)
+                    batch = []
+                    start_time = time.perf_counter()
+            stage.busy += time.perf_counter() - start_time
+            if batch:
+                self.put(self.lines_queue, batch, stage)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.put(self.lines_queue, END, stage)
+
+    def parse(self):
+        stage = self.stages[1]
+        parse_line = Parser.parse_line
+        try:
+            while True:
+                lines = self.get(self.lines_queue, stage)
+                if lines is END:
+                    break
+                start_time = time.perf_counter()
+                rows = []
+                for line in lines:
+                    values = parse_line(line)
+                    if values is None:
+                        self.stats['rejected'] += 1
+                    else:
+                        rows.append(values)
+                stage.busy += time.perf_counter() - start_time
+                self.put(self.rows_queue, rows, stage)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.put(self.rows_queue, END, stage)
+
+    # Разобранные строки для загрузчика; запись в базу идёт в потоке вызывающего,
+    # её время - это время между выдачей порции и запросом следующей
+    def rows(self):
+        start_time = time.perf_counter()
+        threads = [threading.Thread(target=self.read, daemon=True), threading.Thread(target=self.parse, daemon=True)]
+        for thread in threads:
+            thread.start()
+        stage = self.stages[2]
+        try:
+            while True:
+                rows = self.get(self.rows_queue, stage)
+                if rows is END:
+                    break
+                batch_start_time = time.perf_counter()
+                yield from rows
+                stage.busy += time.perf_counter() - batch_start_time
+        finally:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.perf_counter() - start_time
+        if self.error is not None:
+            raise self.error
+
+    # Загрузка стадий: (стадия, доля работы, доля ожидания входа, доля ожидания выхода)
+    def report(self):
+        elapsed = self.elapsed or 1.0
+        return [(stage.name, stage.busy / elapsed, stage.waiting_input / elapsed, stage.waiting_output / elapsed)
+                for stage in self.stages]
@@ -0,0 +1,93 @@
+import hashlib
+import os
+
+# Потоковое чтение лога блоками фиксированного размера.
+# Файл никогда не загружается целиком: в памяти одновременно находится
+# только текущий блок и незавершённая строка на его границе.
+
+CHUNK_SIZE = 1024 * 1024
+RANGE_SIZE = 32 * 1024 * 1024
+
+
+def read_chunks(log_file, chunk_size=CHUNK_SIZE, start=0, end=None):
+    with open(log_file, 'rb') as file:
+        file.seek(start)
+        position = start
+        while end is None or position < end:
+            size = chunk_size if end is None else min(chunk_size, end - position)
+            chunk = file.read(size)
+            if not chunk:
+                break
+            position += len(chunk)
+            yield chunk
+
+
+def read_lines(log_file, chunk_size=CHUNK_SIZE, start=0, end=None):
+    tail = b''
+    for chunk in read_chunks(log_file, chunk_size, start, end):
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', errors='replace')
+    if tail:
+        yield tail.decode('utf-8', errors='replace')
+
+
+# Строки, завершённые переводом строки, вместе со смещением конца каждой строки.
+# Недописанная последняя строка не отдаётся: её дочитает следующий запуск.
+def read_complete_lines(log_file, chunk_size=CHUNK_SIZE, start=0):
+    position = start
+    tail = b''
+    for chunk in read_chunks(log_file, chunk_size, start):
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            position += len(line) + 1
+            yield line.decode('utf-8', errors='replace'), position
+
+
+# Хэш строки (без перевода строки); учитываются последние limit - 1 байт
+def hash_line(line, limit=4096):
+    return hashlib.md5(line[-(limit - 1):]).hexdigest()
+
+
+# Хэш последней строки перед смещением offset, прочитанной из файла
+def line_hash(log_file, offset, limit=4096):
+    start = max(0, offset - limit)
+    with open(log_file, 'rb') as file:
+        file.seek(start)
+        data = file.read(offset - start)
+    return hash_line(data[:-1].rsplit(b'\n', 1)[-1], limit)
+
+
+# Разбиение файла на диапазоны байт, границы которых совпадают с концами строк
+def split_ranges(log_file, range_size=RANGE_SIZE):
+    size = os.path.getsize(log_file)
+    ranges = []
+    with open(log_file, 'rb') as file:
+        start = 0
+        while start < size:
+            end = start + range_size
+            if end >= size:
+                end = size
+            else:
+                file.seek(end - 1)
+                file.readline()
+                end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def peak_memory_mb():
+    # Пиковый RSS процесса; на Windows модуля resource нет
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
@@ -0,0 +1,309 @@
+import heapq
+import time
+from collections import Counter, defaultdict
+from ParserDatabases import Analyzer
+from ParserDatabases import Cache
+from ParserDatabases import Loader
+from ParserDatabases import Parser
+from ParserDatabases import Sketch
+
+# Хранение в Redis: строки не хранятся таблицей, а при загрузке сразу
+# раскладываются по готовым к запросам структурам (ключи с префиксом log:):
+#   minutes                    - sorted set минут с данными (score = начало минуты)
+#   minute_requests            - hash минута -> число запросов
+#   status:<минута>            - hash код ответа -> число запросов
+#   workers:<минута>, workers  - hash <воркер>:requests / <воркер>:time_taken
+#   latency:<минута>           - hash <воркер>\t<корзина> -> число (гистограмма QuantileSketch)
+#   top:user_agent, top:ip_user_agent, top:domain, top:request:<слов>
+#                              - sorted set значение -> число запросов
+#   longest, shortest          - sorted set самых долгих/быстрых запросов (score = time_taken)
+#   hll:<поле>, hll:<поле>:<минута> - HyperLogLog различных значений
+#   lines                      - ограниченный stream исходных строк (для экспорта)
+# Пакет строк сначала агрегируется на клиенте, затем отправляется одним
+# конвейером без транзакции. Временные окна считаются с точностью до минуты.
+
+KEY_PREFIX = 'log:'
+# Сколько самых долгих и самых быстрых запросов хранится
+EXTREMES_KEPT = 1000
+# Верхняя граница длины stream исходных строк (примерная, MAXLEN ~)
+STREAM_MAXLEN = 1000000
+# Запрос в логе - ровно три слова (метод, путь, протокол): шаблоны из первых 1-3 слов
+REQUEST_PATTERN_WORDS = 3
+
+
+def key(name):
+    return KEY_PREFIX + name
+
+
+def text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+# Поле гистограммы задержек: корзина QuantileSketch или z для нулей
+def latency_field(worker, index):
+    return f"{worker}\t{index}"
+
+
+class RedisLoader(Loader.BulkLoader):
+    def write_batch(self, batch):
+        minute_requests = Counter()
+        statuses = defaultdict(Counter)
+        minute_workers = defaultdict(Counter)
+        workers = Counter()
+        latencies = defaultdict(Sketch.QuantileSketch)
+        user_agents = Counter()
+        ip_user_agents = Counter()
+        domains = Counter()
+        request_patterns = [Counter() for _ in range(REQUEST_PATTERN_WORDS)]
+        distinct = defaultdict(set)
+        lines = []
+
+        # Номера строк делают элементы longest/shortest уникальными при одинаковых запросах
+        first = self.connection.incrby(key('rows'), len(batch)) - len(batch)
+        for values in batch:
+            ip_address, forwarded_for, _, request, status_code, _, time_taken, \
+                referer, user_agent, worker, epoch = values
+            lines.append(Parser.format_line(values))
+            user_agents[user_agent] += 1
+            ip_user_agents[f"{ip_address}\t{user_agent}"] += 1
+            if referer is not None:
+                domains[referer.split('/', 3)[:3][-1]] += 1
+            if request.startswith('GET '):
+                words = request.split(' ', REQUEST_PATTERN_WORDS)
+                for count in range(1, REQUEST_PATTERN_WORDS + 1):
+                    request_patterns[count - 1][' '.join(words[:count])] += 1
+            if worker is not None:
+                workers[f"{worker}:requests"] += 1
+                workers[f"{worker}:time_taken"] += time_taken
+            for field, position in Sketch.DISTINCT_FIELDS:
+                if values[position] is not None:
+                    distinct[key(f"hll:{field}")].add(values[position])
+            if epoch is None:
+                continue
+            minute = epoch - epoch % 60
+            minute_requests[minute] += 1
+            statuses[minute][status_code] += 1
+            if worker is not None:
+                minute_workers[minute][f"{worker}:requests"] += 1
+                minute_workers[minute][f"{worker}:time_taken"] += time_taken
+                latencies[(minute, worker)].add(time_taken)
+            for field, position in Sketch.DISTINCT_FIELDS:
+                if values[position] is not None:
+                    distinct[key(f"hll:{field}:{minute}")].add(values[position])
+
+        # Кандидаты в самые долгие/быстрые: больше EXTREMES_KEPT из пакета не понадобится
+        rows = [(values[6], f"{number}\t{values[3]}") for number, values in enumerate(batch, first)]
+        longest = heapq.nlargest(EXTREMES_KEPT, rows)
+        shortest = heapq.nsmallest(EXTREMES_KEPT, rows)
+
+        pipeline = self.connection.pipeline(transaction=False)
+        if minute_requests:
+            pipeline.zadd(key('minutes'), {minute: minute for minute in minute_requests})
+        for minute, count in minute_requests.items():
+            pipeline.hincrby(key('minute_requests'), minute, count)
+        for minute, counts in statuses.items():
+            for status_code, count in counts.items():
+                pipeline.hincrby(key(f"status:{minute}"), status_code, count)
+        for minute, counts in minute_workers.items():
+            for field, count in counts.items():
+                pipeline.hincrby(key(f"workers:{minute}"), field, count)
+        for field, count in workers.items():
+            pipeline.hincrby(key('workers'), field, count)
+        for (minute, worker), sketch in latencies.items():
+            if sketch.zeros:
+                pipeline.hincrby(key(f"latency:{minute}"), latency_field(worker, 'z'), sketch.zeros)
+            for index, count in sketch.bins.items():
+                pipeline.hincrby(key(f"latency:{minute}"), latency_field(worker, index), count)
+        for name, counts in (('top:user_agent', user_agents), ('top:ip_user_agent', ip_user_agents),
+                             ('top:domain', domains)):
+            for member, count in counts.items():
+                pipeline.zincrby(key(name), count, member)
+        for words, counts in enumerate(request_patterns, 1):
+            for member, count in counts.items():
+                pipeline.zincrby(key(f"top:request:{words}"), count, member)
+        pipeline.zadd(key('longest'), {member: time_taken for time_taken, member in longest})
+        pipeline.zremrangebyrank(key('longest'), 0, -EXTREMES_KEPT - 1)
+        pipeline.zadd(key('shortest'), {member: time_taken for time_taken, member in shortest})
+        pipeline.zremrangebyrank(key('shortest'), EXTREMES_KEPT, -1)
+        for name, members in distinct.items():
+            pipeline.pfadd(name, *members)
+        for line in lines:
+            pipeline.xadd(key('lines'), {'line': line}, maxlen=STREAM_MAXLEN, approximate=True)
+        pipeline.execute()
+
+    def commit(self):
+        pass
+
+
+# Те же методы и формат результатов, что у Analyzer.LogAnalyzer; каждый
+# запрос - чтение готовой структуры (ZREVRANGE, HGETALL, PFCOUNT), а не проход по строкам
+class RedisLogAnalyzer:
+    def __init__(self, db_connector, result_cache=None):
+        self.db_connector = db_connector
+        self.result_cache = result_cache
+
+    def cache_scope(self):
+        return 'redis',
+
+    @property
+    def client(self):
+        self.db_connector.connect()
+        return self.db_connector.connection
+
+    # Минуты с данными, начиная с минуты, в которую попадает since
+    def minutes_since(self, since):
+        return [int(minute) for minute in self.client.zrangebyscore(key('minutes'), since - since % 60, '+inf')]
+
+    # Содержимое hash-ей по минутам одним конвейером
+    def minute_hashes(self, prefix, minutes):
+        pipeline = self.client.pipeline(transaction=False)
+        for minute in minutes:
+            pipeline.hgetall(key(f"{prefix}:{minute}"))
+        return zip(minutes, pipeline.execute())
+
+    def top(self, name, count):
+        return [(text(member), int(score)) for member, score in
+                self.client.zrevrange(key(name), 0, count - 1, withscores=True)]
+
+    @Cache.cached()
+    def get_ip_user_agent_statistics(self, n):
+        return [tuple(member.split('\t', 1)) + (count,) for member, count in self.top('top:ip_user_agent', n)]
+
+    @Cache.cached()
+    def get_query_frequency(self, dT):
+        width = dT * 60
+        buckets = Counter()
+        for minute, count in self.client.hgetall(key('minute_requests')).items():
+            minute = int(minute)
+            buckets[minute - minute % width] += int(count)
+        return [(Analyzer.bucket_label(bucket), buckets[bucket]) for bucket in sorted(buckets)]
+
+    @Cache.cached()
+    def get_top_user_agents(self, N):
+        return self.top('top:user_agent', N)
+
+    # Для совместимости с LogAnalyzer: счётчики в Redis точные
+    @Cache.cached()
+    def get_top_k_error_bounds(self):
+        return []
+
+    @Cache.cached(relative_time=True)
+    def get_status_code_statistics(self, dT):
+        since = int(time.time()) - dT * 60
+        statistics = Counter()
+        for _, counts in self.minute_hashes('status', self.minutes_since(since)):
+            for status_code, count in counts.items():
+                status_code = int(status_code)
+                if 500 <= status_code <= 599:
+                    statistics[status_code] += int(count)
+        return list(statistics.items())
+
+    # Хранятся только EXTREMES_KEPT запросов с каждой стороны
+    @Cache.cached()
+    def get_longest_shortest_requests(self, limit, order_by):
+        if order_by == "longest":
+            result = self.client.zrevrange(key('longest'), 0, limit - 1, withscores=True)
+        elif order_by == "shortest":
+            result = self.client.zrange(key('shortest'), 0, limit - 1, withscores=True)
+        else:
+            raise ValueError("Invalid order_by value. Must be 'longest' or 'shortest'.")
+        return [(text(member).split('\t', 1)[1], int(score)) for member, score in result]
+
+    @Cache.cached()
+    def get_common_requests(self, N, slash_count):
+        return self.top(f"top:request:{min(slash_count + 1, REQUEST_PATTERN_WORDS)}", N)
+
+    @Cache.cached()
+    def get_upstream_requests_WORKER(self):
+        counts = {text(field): int(value) for field, value in self.client.hgetall(key('workers')).items()}
+        result = []
+        for field in sorted(counts):
+            worker, name = field.rsplit(':', 1)
+            if name == 'requests':
+                result.append((worker, counts[field], counts[f"{worker}:time_taken"] / counts[field]))
+        return result
+
+    @Cache.cached()
+    def get_conversion_statistics(self, sort_by):
+        result = [(text(member), int(score)) for member, score in
+                  self.client.zrange(key('top:domain'), 0, -1, withscores=True)]
+        position = 0 if sort_by == 'domain' else 1
+        return sorted(result, key=lambda row: row[position], reverse=True)
+
+    @Cache.cached(relative_time=True)
+    def get_upstream_requests(self, interval):
+        since = int(time.time()) - Analyzer.interval_seconds(interval)
+        requests = 0
+        time_taken = 0
+        for _, counts in self.minute_hashes('workers', self.minutes_since(since)):
+            for field, value in counts.items():
+                if text(field).endswith(':requests'):
+                    requests += int(value)
+                else:
+                    time_taken += int(value)
+        return [(requests, time_taken / requests if requests else None)]
+
+    @Cache.cached(relative_time=True)
+    def find_most_active_periods(self, N, interval=None):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        width = N * 60
+        periods = Counter()
+        for minute, count in self.client.hgetall(key('minute_requests')).items():
+            minute = int(minute)
+            if minute >= since - since % 60:
+                periods[minute - minute % width] += int(count)
+        return [(Analyzer.bucket_label(period), count) for period, count in periods.most_common(N)]
+
+    # PFCOUNT по нескольким ключам - число различных значений в их объединении
+    # (minutes=None - за всё время по общим ключам)
+    def distinct_counts(self, minutes):
+        if minutes is not None and not minutes:
+            return (0,) * len(Sketch.DISTINCT_FIELDS)
+        pipeline = self.client.pipeline(transaction=False)
+        for field, _ in Sketch.DISTINCT_FIELDS:
+            if minutes is None:
+                pipeline.pfcount(key(f"hll:{field}"))
+            else:
+                pipeline.pfcount(*[key(f"hll:{field}:{minute}") for minute in minutes])
+        return tuple(pipeline.execute())
+
+    @Cache.cached(relative_time=True)
+    def get_distinct_statistics(self, dT, interval=None):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        width = dT * 60
+        buckets = defaultdict(list)
+        for minute in self.minutes_since(since):
+            buckets[minute - minute % width].append(minute)
+        return [(Analyzer.bucket_label(bucket),) + self.distinct_counts(buckets[bucket]) for bucket in sorted(buckets)]
+
+    @Cache.cached(relative_time=True)
+    def get_distinct_counts(self, interval=None):
+        if interval is None:
+            return [self.distinct_counts(None)]
+        since = int(time.time()) - Analyzer.interval_seconds(interval)
+        return [self.distinct_counts(self.minutes_since(since))]
+
+    # Поминутные гистограммы задержек складываются в QuantileSketch по (интервал, воркер);
+    # перцентили приближённые, с относительной точностью Sketch.LATENCY_ACCURACY
+    @Cache.cached(relative_time=True)
+    def get_latency_percentiles(self, dT=None, interval=None, percentiles=Sketch.PERCENTILES):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        width = None if dT is None else dT * 60
+        groups = defaultdict(Sketch.QuantileSketch)
+        for minute, counts in self.minute_hashes('latency', self.minutes_since(since)):
+            bucket = 0 if width is None else minute - minute % width
+            for field, count in counts.items():
+                worker, index = text(field).split('\t')
+                sketch = groups[(bucket, worker)]
+                count = int(count)
+                if index == 'z':
+                    sketch.zeros += count
+                else:
+                    sketch.bins[int(index)] += count
+                sketch.count += count
+        statistics = sorted((group, sketch.count, [sketch.percentile(p) for p in percentiles])
+                            for group, sketch in groups.items())
+        if width is None:
+            return [(worker, count) + tuple(values) for (_, worker), count, values in statistics]
+        return [(Analyzer.bucket_label(bucket), worker, count) + tuple(values)
+                for (bucket, worker), count, values in statistics]
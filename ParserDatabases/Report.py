@@ -0,0 +1,106 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Полный отчёт: независимые запросы анализатора выполняются параллельно
+# (не больше concurrency одновременно, каждый на своём соединении из пула),
+# а результаты выводятся в исходном порядке. Запрос, не уложившийся в timeout
+# секунд, отмечается как прерванный; на время отчёта то же ограничение задаётся
+# соединениям анализатора, и сервер сам прерывает запрос, а не выполняет его до конца.
+
+# Запросы отчёта: (метод, аргументы, заголовок, формат строки результата)
+REPORT_QUERIES = (
+    ('get_ip_user_agent_statistics', (5,), "IP Address\tUser Agent\tFrequency", "{0}\t{1}\t{2}"),
+    ('get_query_frequency', (60,), "Interval Start\tFrequency", "{0}\t{1}"),
+    ('get_top_user_agents', (10,), "User Agent\tFrequency", "{0}\t{1}"),
+    ('get_status_code_statistics', (60,), "Status Code\tFrequency", "{0}\t{1}"),
+    ('get_longest_shortest_requests', (5, "longest"), "Longest Requests", "Request: {0}\tTime Taken: {1}"),
+    ('get_longest_shortest_requests', (5, "shortest"), "Shortest Requests", "Request: {0}\tTime Taken: {1}"),
+    ('get_common_requests', (5, 2), "Request Pattern\tFrequency", "{0}\t{1}"),
+    ('get_upstream_requests_WORKER', (), "Balancer Worker\tRequest Count\tAverage Time", "{0}\t{1}\t{2}"),
+    ('get_conversion_statistics', ("conversion_count",), "Domain\tConversion Count", "{0}\t{1}"),
+    ('get_upstream_requests', ('30 SECOND',), "Upstream Request Count\tAverage Time", "{0}\t{1}"),
+    ('find_most_active_periods', (5,), "Period\tRequest Count", "{0}\t{1}"),
+)
+
+REPORT_CONCURRENCY = 4
+REPORT_TIMEOUT = 60.0
+
+
+class ReportResult:
+    def __init__(self, method, args, rows=None, error=None, elapsed=None):
+        self.method = method
+        self.args = args
+        self.rows = rows
+        self.error = error
+        self.elapsed = elapsed
+
+
+# Результаты в порядке queries; concurrency=1 - последовательно в текущем потоке
+def run_report(log_analyzer, concurrency=REPORT_CONCURRENCY, timeout=REPORT_TIMEOUT, queries=REPORT_QUERIES):
+    db_connector = getattr(log_analyzer, 'db_connector', None)
+    if db_connector is None:
+        return collect_report(log_analyzer, concurrency, timeout, queries)
+    previous_timeout = db_connector.statement_timeout
+    db_connector.statement_timeout = timeout
+    try:
+        return collect_report(log_analyzer, concurrency, timeout, queries)
+    finally:
+        db_connector.statement_timeout = previous_timeout
+
+
+def collect_report(log_analyzer, concurrency, timeout, queries):
+    results = [ReportResult(method, args) for method, args, _, _ in queries]
+    started = {}
+
+    def run(index):
+        result = results[index]
+        started[index] = time.monotonic()
+        rows = getattr(log_analyzer, result.method)(*result.args)
+        return rows, time.monotonic() - started[index]
+
+    if concurrency <= 1:
+        for index, result in enumerate(results):
+            try:
+                result.rows, result.elapsed = run(index)
+            except Exception as error:
+                result.error = query_error(error, time.monotonic() - started[index], timeout)
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    futures = {executor.submit(run, index): index for index in range(len(results))}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = results[futures[future]]
+                try:
+                    result.rows, result.elapsed = future.result()
+                except Exception as error:
+                    result.error = query_error(error, time.monotonic() - started[futures[future]], timeout)
+            # Время ожидания отсчитывается от начала выполнения запроса, а не от постановки в очередь
+            now = time.monotonic()
+            for future in list(pending):
+                index = futures[future]
+                if index in started and now - started[index] > timeout:
+                    results[index].error = TimeoutError(f"Query exceeded {timeout} s")
+                    results[index].elapsed = now - started[index]
+                    pending.discard(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+# Запрос, прерванный сервером по истечении timeout, отмечается как превысивший время
+def query_error(error, elapsed, timeout):
+    return TimeoutError(f"Query exceeded {timeout} s") if elapsed >= timeout else error
+
+
+def print_report(results, queries=REPORT_QUERIES):
+    for (_, _, header, row_format), result in zip(queries, results):
+        print(header)
+        if result.error is not None:
+            print(f"Ошибка: {result.error}")
+            continue
+        for row in result.rows:
+            print(row_format.format(*row))
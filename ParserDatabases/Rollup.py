@@ -0,0 +1,177 @@
+from collections import Counter
+from ParserDatabases import Dialect
+from ParserDatabases import Dictionary
+
+# Поминутные агрегаты, которые обновляются при каждой записи пакета строк
+# в той же транзакции, что и сами строки. LogAnalyzer(rollups=True) отвечает
+# по ним вместо полного прохода по log_data. Если часть строк log_data
+# загружена без агрегатов (флаг включили на непустой таблице или
+# загружали без него), импорт пересчитывает агрегаты по log_data,
+# а анализатор до пересчёта отвечает по самой log_data.
+
+ROLLUP_TABLES = (
+    """
+        CREATE TABLE IF NOT EXISTS rollup_status_minute (
+            minute_epoch BIGINT NOT NULL,
+            status_code INT NOT NULL,
+            requests BIGINT NOT NULL,
+            PRIMARY KEY (minute_epoch, status_code)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS rollup_worker_minute (
+            minute_epoch BIGINT NOT NULL,
+            balancer_worker_name VARCHAR(255) NOT NULL,
+            requests BIGINT NOT NULL,
+            time_taken_sum BIGINT NOT NULL,
+            time_taken_max INT NOT NULL,
+            PRIMARY KEY (minute_epoch, balancer_worker_name)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS rollup_user_agent_minute (
+            minute_epoch BIGINT NOT NULL,
+            user_agent_hash CHAR(32) NOT NULL,
+            user_agent {text},
+            requests BIGINT NOT NULL,
+            PRIMARY KEY (minute_epoch, user_agent_hash)
+        )
+    """,
+)
+
+ROLLUP_TABLE_NAMES = ('rollup_status_minute', 'rollup_worker_minute', 'rollup_user_agent_minute')
+
+# Число строк log_data, учтённых в агрегатах: в rollup_status_minute попадает каждая строка с epoch
+COVERED_ROWS_QUERY = "SELECT COALESCE(SUM(requests), 0) FROM rollup_status_minute"
+LOG_DATA_ROWS_QUERY = "SELECT COUNT(*) FROM log_data WHERE epoch IS NOT NULL"
+
+# Строк в одной порции при пересчёте rollup_user_agent_minute
+REBUILD_FETCH_SIZE = 10000
+
+
+class RollupWriter:
+    def __init__(self, connection, database_type):
+        self.connection = connection
+        self.dialect = Dialect.for_database(database_type)
+        self.status_query = self.dialect.upsert(
+            'rollup_status_minute', ['minute_epoch', 'status_code'], ['requests'],
+            [('requests', 'add')])
+        self.worker_query = self.dialect.upsert(
+            'rollup_worker_minute', ['minute_epoch', 'balancer_worker_name'],
+            ['requests', 'time_taken_sum', 'time_taken_max'],
+            [('requests', 'add'), ('time_taken_sum', 'add'), ('time_taken_max', 'max')])
+        self.user_agent_query = self.dialect.upsert(
+            'rollup_user_agent_minute', ['minute_epoch', 'user_agent_hash'],
+            ['user_agent', 'requests'], [('requests', 'add')])
+        self.hashes = {}
+
+    def create_tables(self):
+        cursor = self.connection.cursor()
+        for query in ROLLUP_TABLES:
+            cursor.execute(query.format(text=self.dialect.text))
+        cursor.close()
+
+    # True, если агрегаты учитывают все строки log_data
+    def is_complete(self):
+        cursor = self.connection.cursor()
+        cursor.execute(COVERED_ROWS_QUERY)
+        covered = cursor.fetchone()[0]
+        cursor.execute(LOG_DATA_ROWS_QUERY)
+        total = cursor.fetchone()[0]
+        cursor.close()
+        return int(covered) == int(total)
+
+    # Пересчёт агрегатов по всей log_data: статусы и воркеры - одним INSERT ... SELECT
+    # с группировкой на сервере, User-Agent - группировкой на сервере и вставкой
+    # с хэшем, посчитанным здесь (у SQLite нет MD5). Фиксирует вызывающий код.
+    def rebuild(self, normalized=False):
+        minute = f"{self.dialect.integer_division('epoch', '60')} * 60"
+        cursor = self.connection.cursor()
+        for table in ROLLUP_TABLE_NAMES:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO rollup_status_minute (minute_epoch, status_code, requests)
+            SELECT {minute}, status_code, COUNT(*)
+            FROM log_data
+            WHERE epoch IS NOT NULL
+            GROUP BY {minute}, status_code
+        """)
+        cursor.execute(f"""
+            INSERT INTO rollup_worker_minute (minute_epoch, balancer_worker_name, requests,
+                                              time_taken_sum, time_taken_max)
+            SELECT {minute}, balancer_worker_name, COUNT(*), SUM(time_taken), MAX(time_taken)
+            FROM log_data
+            WHERE epoch IS NOT NULL AND balancer_worker_name IS NOT NULL
+            GROUP BY {minute}, balancer_worker_name
+        """)
+        if normalized:
+            cursor.execute(f"""
+                SELECT t.minute_epoch, u.value, t.requests
+                FROM (
+                    SELECT {minute} AS minute_epoch, user_agent_id, COUNT(*) AS requests
+                    FROM log_data
+                    WHERE epoch IS NOT NULL
+                    GROUP BY {minute}, user_agent_id
+                ) t
+                LEFT JOIN user_agents u ON u.id = t.user_agent_id
+            """)
+        else:
+            cursor.execute(f"""
+                SELECT {minute}, user_agent, COUNT(*)
+                FROM log_data
+                WHERE epoch IS NOT NULL
+                GROUP BY {minute}, user_agent
+            """)
+        insert_cursor = self.connection.cursor()
+        while True:
+            rows = cursor.fetchmany(REBUILD_FETCH_SIZE)
+            if not rows:
+                break
+            insert_cursor.executemany(self.user_agent_query, [
+                (minute_epoch, self.user_agent_hash(user_agent), user_agent, requests)
+                for minute_epoch, user_agent, requests in rows if user_agent is not None
+            ])
+        insert_cursor.close()
+        cursor.close()
+
+    def user_agent_hash(self, user_agent):
+        value = self.hashes.get(user_agent)
+        if value is None:
+            if len(self.hashes) >= Dictionary.DICTIONARY_SIZE:
+                self.hashes.clear()
+            value = self.hashes[user_agent] = Dictionary.value_hash(user_agent)
+        return value
+
+    # Пакет сворачивается в памяти, в базу уходит по одной строке на минуту и ключ
+    def write_batch(self, batch):
+        statuses = Counter()
+        workers = {}
+        user_agents = Counter()
+        texts = {}
+        for values in batch:
+            epoch = values[10]
+            if epoch is None:
+                continue
+            minute = epoch - epoch % 60
+            statuses[(minute, values[4])] += 1
+            time_taken = values[6]
+            worker = workers.get((minute, values[9]))
+            if worker is None:
+                workers[(minute, values[9])] = [1, time_taken, time_taken]
+            else:
+                worker[0] += 1
+                worker[1] += time_taken
+                if time_taken > worker[2]:
+                    worker[2] = time_taken
+            user_agent_hash = self.user_agent_hash(values[8])
+            texts[user_agent_hash] = values[8]
+            user_agents[(minute, user_agent_hash)] += 1
+
+        cursor = self.connection.cursor()
+        cursor.executemany(self.status_query, [key + (count,) for key, count in statuses.items()])
+        cursor.executemany(self.worker_query, [key + tuple(worker) for key, worker in workers.items()])
+        cursor.executemany(self.user_agent_query, [
+            (minute, user_agent_hash, texts[user_agent_hash], count)
+            for (minute, user_agent_hash), count in user_agents.items()
+        ])
+        cursor.close()
@@ -0,0 +1,447 @@
+import base64
+import hashlib
+import heapq
+import json
+import math
+import re
+import zlib
+from array import array
+from collections import Counter
+from ParserDatabases import Dialect
+
+# Вероятностные структуры (скетчи) фиксированного размера, которые обновляются
+# при импорте вместе со строками и объединяются между файлами и процессами.
+# Хранятся в таблице sketches в виде JSON. Если часть строк log_data
+# загружена без скетчей, импорт строит их заново по всей log_data.
+
+# Число счётчиков в скетче тяжёлых элементов (top-K)
+TOP_K_CAPACITY = 1000
+
+# Точность HyperLogLog: 2 ** 14 регистров, стандартная ошибка 1.04 / sqrt(2 ** 14) ~ 0.8%
+HLL_PRECISION = 14
+
+# Поля, для которых по минутам считается число различных значений, и их позиции в строке
+DISTINCT_FIELDS = (('ip_address', 0), ('user_agent', 8), ('forwarded_for', 1))
+
+# Относительная точность скетча задержек: оценка квантиля отличается
+# от значения соответствующей строки не больше чем на 1%
+LATENCY_ACCURACY = 0.01
+
+# Перцентили time_taken, которые возвращает анализатор
+PERCENTILES = (50, 95, 99)
+
+# Поиск ненулевых регистров на стороне C вместо цикла по всем регистрам
+NONZERO_REGISTER = re.compile(rb'[^\x00]')
+
+# Сколько последних минут со скетчами HyperLogLog держит в памяти импорт
+MINUTE_CACHE = 120
+
+# Строк log_data в одной порции при построении скетчей по уже загруженной таблице
+SEED_BATCH_SIZE = 10000
+
+SKETCH_TABLE_NAMES = ('sketches', 'hll_minute', 'latency_minute')
+
+# Каждая строка log_data попадает в скетч top-K по User-Agent: его total - число учтённых строк
+LOG_DATA_ROWS_QUERY = "SELECT COUNT(*) FROM log_data"
+
+SKETCHES_TABLE = """
+    CREATE TABLE IF NOT EXISTS sketches (
+        name VARCHAR(64) PRIMARY KEY,
+        data {text} NOT NULL
+    )
+"""
+
+HLL_MINUTE_TABLE = """
+    CREATE TABLE IF NOT EXISTS hll_minute (
+        minute_epoch BIGINT NOT NULL,
+        field VARCHAR(32) NOT NULL,
+        registers {text} NOT NULL,
+        PRIMARY KEY (minute_epoch, field)
+    )
+"""
+
+LATENCY_MINUTE_TABLE = """
+    CREATE TABLE IF NOT EXISTS latency_minute (
+        minute_epoch BIGINT NOT NULL,
+        balancer_worker_name VARCHAR(255) NOT NULL,
+        histogram {text} NOT NULL,
+        PRIMARY KEY (minute_epoch, balancer_worker_name)
+    )
+"""
+
+
+# Space-Saving: не более capacity счётчиков [оценка, погрешность]. Оценка
+# завышает истинную частоту не больше чем на погрешность, а любой элемент
+# вне скетча встречался не чаще floor() раз; обе величины не превышают
+# total / capacity. Новые значения сначала точно считаются в pending и
+# вливаются в скетч, когда их набирается capacity, по тому же правилу,
+# что и при объединении двух скетчей.
+class SpaceSaving:
+    def __init__(self, capacity=TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.total = 0
+        self.counters = {}
+        self.pending = Counter()
+
+    def add(self, key, count=1):
+        self.pending[key] += count
+        if len(self.pending) >= self.capacity:
+            self.fold()
+
+    def update(self, counts):
+        self.pending.update(counts)
+        if len(self.pending) >= self.capacity:
+            self.fold()
+
+    def floor(self):
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def fold(self):
+        if self.pending:
+            pending = {key: (count, 0) for key, count in self.pending.items()}
+            self.total += sum(self.pending.values())
+            self.pending = Counter()
+            self.combine(pending, 0)
+
+    # Сложение со счётчиками другого скетча, у которого отсутствующие
+    # элементы оцениваются сверху значением other_floor
+    def combine(self, counters, other_floor):
+        own_floor = self.floor()
+        merged = {}
+        for key, (count, error) in self.counters.items():
+            other = counters.get(key)
+            if other is None:
+                merged[key] = (count + other_floor, error + other_floor)
+            else:
+                merged[key] = (count + other[0], error + other[1])
+        for key, (count, error) in counters.items():
+            if key not in merged:
+                merged[key] = (count + own_floor, error + own_floor)
+        if len(merged) > self.capacity:
+            merged = dict(heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0]))
+        self.counters = merged
+
+    def merge(self, other):
+        self.fold()
+        other.fold()
+        self.combine(other.counters, other.floor())
+        self.total += other.total
+        return self
+
+    # Самые частые элементы: (элемент, оценка, погрешность) по убыванию оценки
+    def most_common(self, n=None):
+        self.fold()
+        items = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        if n is not None:
+            items = items[:n]
+        return [(key, count, error) for key, (count, error) in items]
+
+    def max_error(self):
+        self.fold()
+        return self.floor()
+
+    def to_json(self):
+        self.fold()
+        return json.dumps({
+            'capacity': self.capacity,
+            'total': self.total,
+            'counters': [[key, count, error] for key, (count, error) in self.counters.items()],
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        state = json.loads(data)
+        sketch = cls(state['capacity'])
+        sketch.total = state['total']
+        sketch.counters = {
+            tuple(key) if isinstance(key, list) else key: (count, error)
+            for key, count, error in state['counters']
+        }
+        return sketch
+
+
+# HyperLogLog: оценка числа различных значений по 2 ** precision регистрам.
+# Объединение двух скетчей - поэлементный максимум регистров, поэтому
+# поминутные скетчи складываются в скетч любого окна. В базе хранится
+# либо список ненулевых регистров (S), либо все регистры (D), сжатые zlib.
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8', 'replace'), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        bits = 64 - self.precision
+        index = x >> bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def to_string(self):
+        registers = self.registers
+        if self.size - registers.count(0) < self.size // 4:
+            packed = array('I', [match.start() << 8 | registers[match.start()]
+                                 for match in NONZERO_REGISTER.finditer(registers)])
+            return 'S' + base64.b64encode(zlib.compress(packed.tobytes())).decode('ascii')
+        return 'D' + base64.b64encode(zlib.compress(bytes(registers))).decode('ascii')
+
+    # Объединение с сохранённым скетчем без промежуточного объекта
+    def merge_string(self, data):
+        raw = zlib.decompress(base64.b64decode(data[1:]))
+        if data[0] == 'S':
+            registers = self.registers
+            packed = array('I')
+            packed.frombytes(raw)
+            for value in packed:
+                index = value >> 8
+                rank = value & 0xFF
+                if rank > registers[index]:
+                    registers[index] = rank
+        else:
+            self.registers = bytearray(map(max, self.registers, raw))
+        return self
+
+    @classmethod
+    def from_string(cls, data, precision=HLL_PRECISION):
+        return cls(precision).merge_string(data)
+
+
+# Скетч квантилей с относительной точностью accuracy: значения раскладываются
+# по логарифмическим корзинам [gamma ** (i - 1), gamma ** i), нули - отдельно.
+# Скетчи объединяются сложением счётчиков корзин.
+class QuantileSketch:
+    def __init__(self, accuracy=LATENCY_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = Counter()
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            self.bins[math.ceil(math.log(value) / self.log_gamma)] += count
+        self.count += count
+
+    def merge(self, other):
+        self.bins.update(other.bins)
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    # Перцентиль по рангу ceil(p / 100 * count), как у точного расчёта по отсортированным значениям
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        if rank <= self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen >= rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    def to_json(self):
+        return json.dumps({'accuracy': self.accuracy, 'zeros': self.zeros, 'bins': list(self.bins.items())})
+
+    @classmethod
+    def from_json(cls, data):
+        state = json.loads(data)
+        sketch = cls(state['accuracy'])
+        for index, count in state['bins']:
+            sketch.bins[index] += count
+        sketch.zeros = state['zeros']
+        sketch.count = state['zeros'] + sum(sketch.bins.values())
+        return sketch
+
+
+# Точный перцентиль по отсортированному списку значений
+def exact_percentile(values, p):
+    if not values:
+        return None
+    return values[max(1, math.ceil(p / 100 * len(values))) - 1]
+
+
+def load_sketch(db_connector, name):
+    query = Dialect.for_database(db_connector.database).query("SELECT data FROM sketches WHERE name = %s")
+    result = db_connector.execute_query(query, (name,))
+    if not result:
+        return None
+    return SpaceSaving.from_json(result[0][0])
+
+
+# Наблюдатель загрузчика: обновляет скетчи по каждому пакету и сохраняет их
+# в той же транзакции, что и строки пакета. Сохранённые ранее скетчи
+# подгружаются и продолжают накапливаться. Скетчи HyperLogLog и скетчи
+# задержек по воркерам ведутся по минутам, в базу перезаписываются
+# только минуты, затронутые пакетом.
+class SketchWriter:
+    def __init__(self, connection, database_type, capacity=TOP_K_CAPACITY):
+        self.connection = connection
+        self.dialect = Dialect.for_database(database_type)
+        self.placeholder = self.dialect.placeholder
+        self.capacity = capacity
+        self.top_k = {
+            'ip_user_agent': SpaceSaving(capacity),
+            'user_agent': SpaceSaving(capacity),
+        }
+        self.minutes = {}
+
+    def create_table(self):
+        cursor = self.connection.cursor()
+        for query in (SKETCHES_TABLE, HLL_MINUTE_TABLE, LATENCY_MINUTE_TABLE):
+            cursor.execute(query.format(text=self.dialect.text))
+        cursor.close()
+
+    def load(self):
+        cursor = self.connection.cursor()
+        for name in self.top_k:
+            cursor.execute(f"SELECT data FROM sketches WHERE name = {self.placeholder}", (name,))
+            row = cursor.fetchone()
+            if row is not None:
+                self.top_k[name] = SpaceSaving(self.capacity).merge(SpaceSaving.from_json(row[0]))
+        cursor.close()
+
+    def covered_rows(self):
+        sketch = self.top_k['user_agent']
+        sketch.fold()
+        return sketch.total
+
+    # True, если загруженные скетчи учитывают все строки log_data
+    def is_complete(self):
+        cursor = self.connection.cursor()
+        cursor.execute(LOG_DATA_ROWS_QUERY)
+        total = cursor.fetchone()[0]
+        cursor.close()
+        return self.covered_rows() == int(total)
+
+    # Скетчи по всем строкам log_data: сохранённые удаляются, строки читаются порциями
+    # по id и проходят через write_batch, как при импорте. Фиксирует вызывающий код.
+    def seed(self, normalized=False):
+        cursor = self.connection.cursor()
+        for table in SKETCH_TABLE_NAMES:
+            cursor.execute(f"DELETE FROM {table}")
+        self.top_k = {name: SpaceSaving(self.capacity) for name in self.top_k}
+        self.minutes = {}
+        if normalized:
+            user_agent, join = "u.value", "LEFT JOIN user_agents u ON u.id = l.user_agent_id"
+        else:
+            user_agent, join = "l.user_agent", ""
+        query = self.dialect.query(f"""
+            SELECT l.id, l.ip_address, l.forwarded_for, l.time_taken, {user_agent}, l.balancer_worker_name, l.epoch
+            FROM log_data l
+            {join}
+            WHERE l.id > %s
+            ORDER BY l.id
+            LIMIT %s
+        """)
+        last_id = -1
+        while True:
+            cursor.execute(query, (last_id, SEED_BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            self.write_batch([
+                (ip_address, forwarded_for, None, None, None, None, time_taken, None, user_agent, worker, epoch)
+                for _, ip_address, forwarded_for, time_taken, user_agent, worker, epoch in rows
+            ])
+        cursor.close()
+
+    # Скетчи минуты из кэша или из базы: (HyperLogLog по полям, задержки по воркерам)
+    def minute_sketches(self, cursor, minute):
+        sketches = self.minutes.get(minute)
+        if sketches is None:
+            distinct = {field: HyperLogLog() for field, _ in DISTINCT_FIELDS}
+            cursor.execute(f"SELECT field, registers FROM hll_minute WHERE minute_epoch = {self.placeholder}",
+                           (minute,))
+            for field, registers in cursor.fetchall():
+                if field in distinct:
+                    distinct[field].merge_string(registers)
+            latencies = {}
+            cursor.execute(f"SELECT balancer_worker_name, histogram FROM latency_minute "
+                           f"WHERE minute_epoch = {self.placeholder}", (minute,))
+            for worker, histogram in cursor.fetchall():
+                latencies[worker] = QuantileSketch.from_json(histogram)
+            sketches = self.minutes[minute] = (distinct, latencies)
+        return sketches
+
+    def write_batch(self, batch):
+        self.top_k['ip_user_agent'].update(Counter((values[0], values[8]) for values in batch))
+        self.top_k['user_agent'].update(Counter(values[8] for values in batch))
+        # Значения сначала собираются в множества, чтобы хешировать каждое один раз
+        values_by_minute = {}
+        for values in batch:
+            epoch = values[10]
+            if epoch is None:
+                continue
+            minute = epoch - epoch % 60
+            fields = values_by_minute.get(minute)
+            if fields is None:
+                fields = values_by_minute[minute] = ([set() for _ in DISTINCT_FIELDS], {})
+            for (_, position), seen in zip(DISTINCT_FIELDS, fields[0]):
+                if values[position] is not None:
+                    seen.add(values[position])
+            if values[9] is not None:
+                fields[1].setdefault(values[9], Counter())[values[6]] += 1
+        cursor = self.connection.cursor()
+        distinct_rows = []
+        latency_rows = []
+        for minute, (fields, workers) in values_by_minute.items():
+            distinct, latencies = self.minute_sketches(cursor, minute)
+            for (field, _), seen in zip(DISTINCT_FIELDS, fields):
+                sketch = distinct[field]
+                for value in seen:
+                    sketch.add(value)
+                distinct_rows.append((minute, field, sketch.to_string()))
+            for worker, time_taken in workers.items():
+                sketch = latencies.get(worker)
+                if sketch is None:
+                    sketch = latencies[worker] = QuantileSketch()
+                for value, count in time_taken.items():
+                    sketch.add(value, count)
+                latency_rows.append((minute, worker, sketch.to_json()))
+        placeholder = self.placeholder
+        cursor.executemany(f"DELETE FROM hll_minute WHERE minute_epoch = {placeholder} AND field = {placeholder}",
+                           [row[:2] for row in distinct_rows])
+        cursor.executemany(f"INSERT INTO hll_minute (minute_epoch, field, registers) "
+                           f"VALUES ({placeholder}, {placeholder}, {placeholder})", distinct_rows)
+        cursor.executemany(f"DELETE FROM latency_minute WHERE minute_epoch = {placeholder} "
+                           f"AND balancer_worker_name = {placeholder}", [row[:2] for row in latency_rows])
+        cursor.executemany(f"INSERT INTO latency_minute (minute_epoch, balancer_worker_name, histogram) "
+                           f"VALUES ({placeholder}, {placeholder}, {placeholder})", latency_rows)
+        cursor.close()
+        if len(self.minutes) > MINUTE_CACHE:
+            for minute in sorted(self.minutes)[:len(self.minutes) - MINUTE_CACHE]:
+                if minute not in values_by_minute:
+                    del self.minutes[minute]
+        self.save()
+
+    def save(self):
+        cursor = self.connection.cursor()
+        for name, sketch in self.top_k.items():
+            cursor.execute(f"DELETE FROM sketches WHERE name = {self.placeholder}", (name,))
+            cursor.execute(f"INSERT INTO sketches (name, data) VALUES ({self.placeholder}, {self.placeholder})",
+                           (name, sketch.to_json()))
+        cursor.close()
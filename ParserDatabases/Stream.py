@@ -0,0 +1,189 @@
+import heapq
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from ParserDatabases import Analyzer
+from ParserDatabases import Parser
+from ParserDatabases import Reader
+from ParserDatabases import Sketch
+
+# Анализ лога без базы данных: за один потоковый проход по файлу собираются
+# счётчики, из которых методы с теми же именами и результатами, что и у
+# LogAnalyzer, строят ответ. Частичные результаты по кускам файла
+# объединяются методом merge, поэтому файл можно разбирать на нескольких ядрах.
+# С top_k_capacity пары IP/User-Agent и User-Agent считаются приближённо
+# скетчами Space-Saving фиксированного размера вместо точных счётчиков.
+
+# Сколько самых долгих/быстрых запросов хранится в ограниченных кучах
+TOP_REQUESTS = 100
+
+
+class StreamAnalyzer:
+    def __init__(self, top_requests=TOP_REQUESTS, top_k_capacity=None):
+        self.top_requests = top_requests
+        self.top_k_capacity = top_k_capacity
+        self.rows = 0
+        self.rejected = 0
+        if top_k_capacity is None:
+            self.ip_user_agents = Counter()
+            self.user_agents = Counter()
+        else:
+            self.ip_user_agents = Sketch.SpaceSaving(top_k_capacity)
+            self.user_agents = Sketch.SpaceSaving(top_k_capacity)
+        self.seconds = Counter()
+        self.time_taken_seconds = Counter()
+        self.errors = Counter()
+        self.workers = Counter()
+        self.worker_time_taken = Counter()
+        self.get_requests = Counter()
+        self.domains = Counter()
+        self.longest = []
+        self.shortest = []
+
+    def add(self, values):
+        ip_address, _, _, request, status_code, _, time_taken, referer, user_agent, \
+            balancer_worker_name, epoch = values
+        self.rows += 1
+        if self.top_k_capacity is None:
+            self.ip_user_agents[(ip_address, user_agent)] += 1
+            self.user_agents[user_agent] += 1
+        else:
+            self.ip_user_agents.add((ip_address, user_agent))
+            self.user_agents.add(user_agent)
+        if epoch is not None:
+            self.seconds[epoch] += 1
+            self.time_taken_seconds[epoch] += time_taken
+            if 500 <= status_code <= 599:
+                self.errors[(epoch, status_code)] += 1
+        self.workers[balancer_worker_name] += 1
+        self.worker_time_taken[balancer_worker_name] += time_taken
+        if request.startswith('GET '):
+            self.get_requests[request] += 1
+        # Аналог SUBSTRING_INDEX(SUBSTRING_INDEX(referer, '/', 3), '/', -1)
+        self.domains[referer.split('/', 3)[:3][-1]] += 1
+        self.push(self.longest, (time_taken, request))
+        self.push(self.shortest, (-time_taken, request))
+
+    def push(self, heap, item):
+        if len(heap) < self.top_requests:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    # Уже разобранные строки, например из колоночного кэша
+    def process_rows(self, rows):
+        for values in rows:
+            self.add(values)
+        return self
+
+    def process_lines(self, lines):
+        parse_line = Parser.parse_line
+        for line in lines:
+            values = parse_line(line)
+            if values is None:
+                self.rejected += 1
+            else:
+                self.add(values)
+        return self
+
+    def process_file(self, log_file, chunk_size=Reader.CHUNK_SIZE, workers=1, range_size=Reader.RANGE_SIZE):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(analyze_log_range, log_file, start, end, chunk_size, self.top_requests,
+                                    self.top_k_capacity)
+                    for start, end in Reader.split_ranges(log_file, range_size)
+                ]
+                for future in futures:
+                    self.merge(future.result())
+            return self
+        return self.process_lines(Reader.read_lines(log_file, chunk_size))
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.rejected += other.rejected
+        if self.top_k_capacity is None:
+            self.ip_user_agents.update(other.ip_user_agents)
+            self.user_agents.update(other.user_agents)
+        else:
+            self.ip_user_agents.merge(other.ip_user_agents)
+            self.user_agents.merge(other.user_agents)
+        for name in ('seconds', 'time_taken_seconds', 'errors', 'workers', 'worker_time_taken', 'get_requests',
+                     'domains'):
+            getattr(self, name).update(getattr(other, name))
+        for item in other.longest:
+            self.push(self.longest, item)
+        for item in other.shortest:
+            self.push(self.shortest, item)
+        return self
+
+    def get_ip_user_agent_statistics(self, n):
+        return [(ip_address, user_agent, count)
+                for (ip_address, user_agent), count, *_ in self.ip_user_agents.most_common(n)]
+
+    def get_query_frequency(self, dT):
+        width = dT * 60
+        buckets = Counter()
+        for epoch, count in self.seconds.items():
+            buckets[epoch // width] += count
+        return [(Analyzer.bucket_label(bucket * width), buckets[bucket]) for bucket in sorted(buckets)]
+
+    def get_top_user_agents(self, N):
+        return [(user_agent, count) for user_agent, count, *_ in self.user_agents.most_common(N)]
+
+    def get_status_code_statistics(self, dT):
+        since = int(time.time()) - dT * 60
+        statistics = Counter()
+        for (epoch, status_code), count in self.errors.items():
+            if epoch >= since:
+                statistics[status_code] += count
+        return list(statistics.items())
+
+    def get_longest_shortest_requests(self, limit, order_by):
+        if order_by == "longest":
+            heap, sign = self.longest, 1
+        elif order_by == "shortest":
+            heap, sign = self.shortest, -1
+        else:
+            raise ValueError("Invalid order_by value. Must be 'longest' or 'shortest'.")
+        if limit > self.top_requests:
+            raise ValueError(f"Limit must not exceed top_requests ({self.top_requests}).")
+        return [(request, sign * time_taken) for time_taken, request in heapq.nlargest(limit, heap)]
+
+    def get_common_requests(self, N, slash_count):
+        patterns = Counter()
+        for request, count in self.get_requests.items():
+            patterns[' '.join(request.split(' ')[:slash_count + 1])] += count
+        return patterns.most_common(N)
+
+    def get_upstream_requests_WORKER(self):
+        return [(worker, count, self.worker_time_taken[worker] / count) for worker, count in sorted(self.workers.items())]
+
+    def get_conversion_statistics(self, sort_by):
+        if sort_by == "domain":
+            return sorted(self.domains.items(), reverse=True)
+        elif sort_by == "conversion_count":
+            return self.domains.most_common()
+        raise ValueError("Invalid sort_by value. Must be 'domain' or 'conversion_count'.")
+
+    def get_upstream_requests(self, interval):
+        since = int(time.time()) - Analyzer.interval_seconds(interval)
+        count = sum(value for epoch, value in self.seconds.items() if epoch >= since)
+        total = sum(value for epoch, value in self.time_taken_seconds.items() if epoch >= since)
+        return [(count, total / count if count else None)]
+
+    def find_most_active_periods(self, N, interval=None):
+        since = 0 if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+        width = N * 60
+        periods = Counter()
+        for epoch, count in self.seconds.items():
+            if epoch >= since:
+                periods[epoch // width] += count
+        return [(Analyzer.bucket_label(period * width), count) for period, count in periods.most_common(N)]
+
+
+# Разбор одного диапазона байт файла; выполняется в дочернем процессе
+def analyze_log_range(log_file, start, end, chunk_size=Reader.CHUNK_SIZE, top_requests=TOP_REQUESTS,
+                      top_k_capacity=None):
+    analyzer = StreamAnalyzer(top_requests, top_k_capacity)
+    return analyzer.process_lines(Reader.read_lines(log_file, chunk_size, start, end))
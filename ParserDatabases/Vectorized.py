@@ -0,0 +1,221 @@
+import time
+import numpy as np
+from ParserDatabases import Analyzer
+from ParserDatabases import Columnar
+from ParserDatabases import Parser
+from ParserDatabases import Reader
+from ParserDatabases import Sketch
+
+# Анализ в памяти процесса на NumPy: log_data хранится столбцами-массивами,
+# строки - кодами словарей (категориальные столбцы). Группировки считаются
+# через np.unique/np.bincount, top-N - через np.argpartition, временные окна -
+# через np.searchsorted по отсортированному epoch. Методы называются и
+# возвращают то же, что и методы LogAnalyzer.
+
+# Строковые столбцы, которые нужны анализатору
+STRING_COLUMNS = ('ip_address', 'forwarded_for', 'request', 'referer', 'user_agent', 'balancer_worker_name')
+
+# Позиции столбцов в кортеже, который отдаёт Parser.parse_line
+POSITIONS = {
+    'ip_address': 0, 'forwarded_for': 1, 'request': 3, 'status_code': 4, 'time_taken': 6,
+    'referer': 7, 'user_agent': 8, 'balancer_worker_name': 9, 'epoch': 10,
+}
+
+
+# Первые N индексов по убыванию (или возрастанию) значений без полной сортировки
+def top_indexes(values, n, descending=True):
+    if n <= 0 or len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    keys = -values if descending else values
+    if n < len(values):
+        candidates = np.argpartition(keys, n - 1)[:n]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(keys[candidates], kind='stable')]
+
+
+class NumpyLogAnalyzer:
+    def __init__(self, codes, dictionaries, status_code, time_taken, epoch):
+        self.codes = codes
+        self.dictionaries = {name: np.array(values, dtype=object) for name, values in dictionaries.items()}
+        self.status_code = status_code
+        self.time_taken = time_taken
+        # Строки без epoch (NULL) сортируются в начало и не попадают ни в одно окно
+        self.epoch_order = np.argsort(epoch, kind='stable')
+        self.sorted_epoch = epoch[self.epoch_order]
+        self.valid_from = int(np.searchsorted(self.sorted_epoch, Columnar.NULL, side='right'))
+
+    # Кортежи в формате Parser.parse_line
+    @classmethod
+    def from_rows(cls, rows):
+        dictionaries = {name: {} for name in STRING_COLUMNS}
+        codes = {name: [] for name in STRING_COLUMNS}
+        numbers = {name: [] for name in ('status_code', 'time_taken', 'epoch')}
+        for values in rows:
+            for name in STRING_COLUMNS:
+                value = values[POSITIONS[name]]
+                dictionary = dictionaries[name]
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                codes[name].append(code)
+            numbers['status_code'].append(values[4])
+            numbers['time_taken'].append(values[6])
+            numbers['epoch'].append(Columnar.NULL if values[10] is None else values[10])
+        return cls(
+            {name: np.array(values, dtype=np.int32) for name, values in codes.items()},
+            {name: list(dictionary) for name, dictionary in dictionaries.items()},
+            np.array(numbers['status_code'], dtype=np.int64),
+            np.array(numbers['time_taken'], dtype=np.int64),
+            np.array(numbers['epoch'], dtype=np.int64),
+        )
+
+    @classmethod
+    def from_log_file(cls, log_file, chunk_size=Reader.CHUNK_SIZE):
+        parse_line = Parser.parse_line
+        rows = (values for values in map(parse_line, Reader.read_lines(log_file, chunk_size)) if values is not None)
+        return cls.from_rows(rows)
+
+    # Столбцы колоночного кэша отображаются в массивы без копирования
+    @classmethod
+    def from_columnar(cls, path):
+        cache = Columnar.ColumnarCache(path)
+        return cls(
+            {name: np.frombuffer(cache.column(name), dtype=np.int32) for name in STRING_COLUMNS},
+            {name: cache.dictionary(name) for name in STRING_COLUMNS},
+            np.frombuffer(cache.column('status_code'), dtype=np.int64),
+            np.frombuffer(cache.column('time_taken'), dtype=np.int64),
+            np.frombuffer(cache.column('epoch'), dtype=np.int64),
+        )
+
+    # Индексы строк с epoch >= since
+    def window(self, since=None):
+        start = self.valid_from if since is None else max(
+            self.valid_from, int(np.searchsorted(self.sorted_epoch, since, side='left')))
+        return self.epoch_order[start:], self.sorted_epoch[start:]
+
+    def since(self, interval):
+        return None if interval is None else int(time.time()) - Analyzer.interval_seconds(interval)
+
+    def get_ip_user_agent_statistics(self, n):
+        user_agents = len(self.dictionaries['user_agent'])
+        pairs = self.codes['ip_address'].astype(np.int64) * user_agents + self.codes['user_agent']
+        keys, counts = np.unique(pairs, return_counts=True)
+        ip_addresses = self.dictionaries['ip_address']
+        user_agent_values = self.dictionaries['user_agent']
+        return [(ip_addresses[keys[i] // user_agents], user_agent_values[keys[i] % user_agents], int(counts[i]))
+                for i in top_indexes(counts, n)]
+
+    def get_query_frequency(self, dT):
+        width = dT * 60
+        _, epochs = self.window()
+        buckets, counts = np.unique(epochs // width, return_counts=True)
+        return [(Analyzer.bucket_label(int(bucket) * width), int(count)) for bucket, count in zip(buckets, counts)]
+
+    def get_top_user_agents(self, N):
+        counts = np.bincount(self.codes['user_agent'], minlength=len(self.dictionaries['user_agent']))
+        values = self.dictionaries['user_agent']
+        return [(values[i], int(counts[i])) for i in top_indexes(counts, N)]
+
+    def get_status_code_statistics(self, dT):
+        rows, _ = self.window(int(time.time()) - dT * 60)
+        statuses = self.status_code[rows]
+        statuses = statuses[(statuses >= 500) & (statuses <= 599)]
+        codes, counts = np.unique(statuses, return_counts=True)
+        return [(int(code), int(count)) for code, count in zip(codes, counts)]
+
+    def get_longest_shortest_requests(self, limit, order_by):
+        if order_by == "longest":
+            indexes = top_indexes(self.time_taken, limit, descending=True)
+        elif order_by == "shortest":
+            indexes = top_indexes(self.time_taken, limit, descending=False)
+        else:
+            raise ValueError("Invalid order_by value. Must be 'longest' or 'shortest'.")
+        requests = self.dictionaries['request']
+        return [(requests[self.codes['request'][i]], int(self.time_taken[i])) for i in indexes]
+
+    def get_common_requests(self, N, slash_count):
+        # Шаблон считается один раз на каждое различное значение request
+        patterns = {}
+        pattern_codes = np.full(len(self.dictionaries['request']), -1, dtype=np.int64)
+        for code, request in enumerate(self.dictionaries['request']):
+            if request.startswith('GET '):
+                pattern = ' '.join(request.split(' ')[:slash_count + 1])
+                pattern_codes[code] = patterns.setdefault(pattern, len(patterns))
+        rows = pattern_codes[self.codes['request']]
+        counts = np.bincount(rows[rows >= 0], minlength=len(patterns))
+        values = list(patterns)
+        return [(values[i], int(counts[i])) for i in top_indexes(counts, N)]
+
+    def get_upstream_requests_WORKER(self):
+        workers = self.codes['balancer_worker_name']
+        size = len(self.dictionaries['balancer_worker_name'])
+        counts = np.bincount(workers, minlength=size)
+        totals = np.bincount(workers, weights=self.time_taken, minlength=size)
+        values = self.dictionaries['balancer_worker_name']
+        return sorted((values[i], int(counts[i]), float(totals[i] / counts[i])) for i in np.flatnonzero(counts))
+
+    def get_conversion_statistics(self, sort_by):
+        domains = {}
+        domain_codes = np.empty(len(self.dictionaries['referer']), dtype=np.int64)
+        for code, referer in enumerate(self.dictionaries['referer']):
+            # Аналог SUBSTRING_INDEX(SUBSTRING_INDEX(referer, '/', 3), '/', -1)
+            domain_codes[code] = domains.setdefault(referer.split('/', 3)[:3][-1], len(domains))
+        counts = np.bincount(domain_codes[self.codes['referer']], minlength=len(domains))
+        statistics = [(domain, int(counts[code])) for domain, code in domains.items() if counts[code]]
+        if sort_by == "domain":
+            return sorted(statistics, reverse=True)
+        elif sort_by == "conversion_count":
+            return sorted(statistics, key=lambda item: item[1], reverse=True)
+        raise ValueError("Invalid sort_by value. Must be 'domain' or 'conversion_count'.")
+
+    def get_upstream_requests(self, interval):
+        rows, _ = self.window(self.since(interval))
+        if len(rows) == 0:
+            return [(0, None)]
+        return [(len(rows), float(self.time_taken[rows].mean()))]
+
+    def find_most_active_periods(self, N, interval=None):
+        width = N * 60
+        _, epochs = self.window(self.since(interval))
+        periods, counts = np.unique(epochs // width, return_counts=True)
+        return [(Analyzer.bucket_label(int(periods[i]) * width), int(counts[i])) for i in top_indexes(counts, N)]
+
+    def get_distinct_statistics(self, dT, interval=None):
+        width = dT * 60
+        rows, epochs = self.window(self.since(interval))
+        buckets, bucket_codes = np.unique(epochs // width, return_inverse=True)
+        statistics = []
+        for name in ('ip_address', 'user_agent', 'forwarded_for'):
+            size = len(self.dictionaries[name])
+            pairs = np.unique(bucket_codes.astype(np.int64) * size + self.codes[name][rows])
+            statistics.append(np.bincount(pairs // size, minlength=len(buckets)))
+        return [(Analyzer.bucket_label(int(bucket) * width),) + tuple(int(column[i]) for column in statistics)
+                for i, bucket in enumerate(buckets)]
+
+    def get_distinct_counts(self, interval=None):
+        rows, _ = self.window(self.since(interval))
+        return [tuple(len(np.unique(self.codes[name][rows])) for name in ('ip_address', 'user_agent', 'forwarded_for'))]
+
+    # Точные перцентили по рангу ceil(p / 100 * count) в каждой группе (интервал, воркер)
+    def get_latency_percentiles(self, dT=None, interval=None, percentiles=Sketch.PERCENTILES):
+        width = None if dT is None else dT * 60
+        rows, epochs = self.window(self.since(interval))
+        workers = self.codes['balancer_worker_name'][rows].astype(np.int64)
+        size = len(self.dictionaries['balancer_worker_name'])
+        groups = workers if width is None else (epochs // width) * size + workers
+        time_taken = self.time_taken[rows]
+        order = np.lexsort((time_taken, groups))
+        keys, starts, counts = np.unique(groups[order], return_index=True, return_counts=True)
+        values = time_taken[order]
+        columns = [values[starts + np.maximum(1, np.ceil(p / 100 * counts).astype(np.int64)) - 1]
+                   for p in percentiles]
+        names = self.dictionaries['balancer_worker_name']
+        result = []
+        for i, key in enumerate(keys):
+            key = int(key)
+            row = (names[key % size], int(counts[i])) + tuple(int(column[i]) for column in columns)
+            if width is not None:
+                row = (Analyzer.bucket_label(key // size * width),) + row
+            result.append(row)
+        return sorted(result)
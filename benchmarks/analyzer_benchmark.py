@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ParserDatabases import Parser
+from ParserDatabases import Reader
+from ParserDatabases import Stream
+from ParserDatabases import Vectorized
+
+SAMPLE_LINES = [
+    '192.168.1.10 (10.0.0.1) - - [10/Oct/2023:13:55:36 +0300] "GET /api/v1/items HTTP/1.1" 200 5124 87 1 "https://example.com/catalog" "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"',
+    '192.168.1.11 (10.0.0.2) - - [10/Oct/2023:13:55:36 +0300] "POST /api/v1/orders HTTP/1.1" 201 312 143 2 "-" "curl/8.1.2"',
+    '192.168.1.12 (10.0.0.3) - - [10/Oct/2023:13:55:37 +0300] "GET /static/app.js HTTP/1.1" 304 0 3 1 "https://example.com/" "Mozilla/5.0 (X11; Linux x86_64)"',
+    '192.168.1.13 (10.0.0.4) - - [10/Oct/2023:13:55:38 +0300] "GET /api/v1/items/7 HTTP/1.1" 502 0 3012 3 "https://example.org/item" "Mozilla/5.0 (Macintosh)"',
+]
+
+# Вызовы анализатора, которые сравниваются
+QUERIES = (
+    ('get_ip_user_agent_statistics', (5,)),
+    ('get_query_frequency', (60,)),
+    ('get_top_user_agents', (10,)),
+    ('get_status_code_statistics', (60,)),
+    ('get_longest_shortest_requests', (5, "longest")),
+    ('get_longest_shortest_requests', (5, "shortest")),
+    ('get_common_requests', (5, 2)),
+    ('get_upstream_requests_WORKER', ()),
+    ('get_conversion_statistics', ("conversion_count",)),
+    ('get_upstream_requests', ('30 SECOND',)),
+    ('find_most_active_periods', (5,)),
+)
+
+
+# Разобранные строки: из файла или из образцов со сдвигом времени на секунду на строку
+def load_rows(log_file, lines):
+    if log_file:
+        parse_line = Parser.parse_line
+        return [values for values in map(parse_line, Reader.read_lines(log_file)) if values is not None]
+    sample = [Parser.parse_line(line) for line in SAMPLE_LINES]
+    return [sample[i % len(sample)][:10] + (sample[i % len(sample)][10] + i,) for i in range(lines)]
+
+
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LogAnalyzer backend benchmark")
+    parser.add_argument("--log_file", type=str, default=None, help="Log file to benchmark on (default: built-in sample)")
+    parser.add_argument("--lines", type=int, default=200000, help="Number of sample rows when no log file is given")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs; the best one is reported")
+    args = parser.parse_args()
+
+    rows = load_rows(args.log_file, args.lines)
+    start_time = time.perf_counter()
+    numpy_analyzer = Vectorized.NumpyLogAnalyzer.from_rows(rows)
+    print(f"Rows: {len(rows)}, NumPy column build: {time.perf_counter() - start_time:.3f} s")
+
+    # Без базы и без массивов каждый запрос - полный проход по строкам на Python
+    print("Query\tPython scan, ms\tNumPy, ms\tSpeed-up")
+    for name, query_args in QUERIES:
+        python_time = measure(
+            lambda: getattr(Stream.StreamAnalyzer().process_rows(rows), name)(*query_args), args.repeat)
+        numpy_time = measure(lambda: getattr(numpy_analyzer, name)(*query_args), args.repeat)
+        print(f"{name}{query_args}\t{python_time * 1000:.1f}\t{numpy_time * 1000:.2f}\t"
+              f"{python_time / numpy_time:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ParserDatabases import Analyzer
+from ParserDatabases import Connector
+from ParserDatabases import Data
+from ParserDatabases import Mongo
+from ParserDatabases import RedisStore
+from ParserDatabases import Report
+from ParserDatabases import Stream
+
+from log_generator import LogGenerator
+
+# Проверка бэкенда без SQL: один и тот же синтетический лог загружается в бэкенд
+# и в эталон, после чего результаты запросов сравниваются. Для MongoDB эталон -
+# LogAnalyzer над SQLite, для Redis - Stream.StreamAnalyzer по тому же файлу.
+# С --mock вместо сервера используется mongomock или fakeredis
+# (pip install -r requirements-dev.txt). Код возврата 1, если результаты расходятся.
+
+# Запросы сверх отчёта; сравниваются, если они есть и у бэкенда, и у эталона
+EXTRA_QUERIES = (
+    ('get_distinct_statistics', (60,)),
+    ('get_distinct_counts', ()),
+    ('get_latency_percentiles', ()),
+    ('get_latency_percentiles', (60,)),
+)
+
+
+# Результаты совпадают с точностью до порядка строк с равной частотой (последний столбец):
+# такие строки могут идти в любом порядке, а на границе top-N может попасть любая из них
+def same_result(expected, actual):
+    if expected == actual:
+        return True
+    if len(expected) != len(actual) or [row[-1] for row in expected] != [row[-1] for row in actual]:
+        return False
+    cutoff = expected[-1][-1]
+    return sorted(row for row in expected if row[-1] != cutoff) == sorted(row for row in actual if row[-1] != cutoff)
+
+
+def connect_mongodb(args):
+    db_connector = Connector.DatabaseConnector("mongodb", host=args.host, port=args.port, username=args.username,
+                                               password=args.password, db_name=args.db_name)
+    if args.mock:
+        import mongomock
+        db_connector.connection = mongomock.MongoClient()[args.db_name]
+    db_connector.connect()
+    for collection in ('log_data', 'data_version'):
+        db_connector.connection.drop_collection(collection)
+    return db_connector
+
+
+# Загрузка лога в SQLite и в MongoDB; анализаторы (эталон, проверяемый)
+def load_mongodb(log_file, work_dir, args):
+    sqlite_connector = Connector.DatabaseConnector("sqlite", db_name=os.path.join(work_dir, "reference.db"))
+    mongo_connector = connect_mongodb(args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        Data.LogDataManager(sqlite_connector, database_type="sqlite").import_log_data(log_file)
+        Data.LogDataManager(mongo_connector, database_type="mongodb").import_log_data(log_file)
+    return Analyzer.LogAnalyzer(sqlite_connector), Mongo.MongoLogAnalyzer(mongo_connector)
+
+
+# Из Redis удаляются только ключи log:, остальные данные сервера не трогаются
+def connect_redis(args):
+    db_connector = Connector.DatabaseConnector("redis", host=args.host, port=args.port, password=args.password,
+                                               db_name=args.db_name)
+    if args.mock:
+        import fakeredis
+        db_connector.connection = fakeredis.FakeRedis()
+    db_connector.connect()
+    keys = list(db_connector.connection.scan_iter(match=RedisStore.KEY_PREFIX + '*'))
+    if keys:
+        db_connector.connection.delete(*keys)
+    return db_connector
+
+
+def load_redis(log_file, work_dir, args):
+    redis_connector = connect_redis(args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        Data.LogDataManager(redis_connector, database_type="redis").import_log_data(log_file)
+    return Stream.StreamAnalyzer().process_file(log_file), RedisStore.RedisLogAnalyzer(redis_connector)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a non-SQL backend answers like the reference analyzer")
+    parser.add_argument("--backend", choices=("mongodb", "redis"), default="mongodb", help="Backend to check")
+    parser.add_argument("--mock", action="store_true", help="Use mongomock or fakeredis instead of a server")
+    parser.add_argument("--host", type=str, default=None, help="Server host")
+    parser.add_argument("--port", type=int, default=None, help="Server port")
+    parser.add_argument("--username", type=str, default=None, help="Username")
+    parser.add_argument("--password", type=str, default=None, help="Password")
+    parser.add_argument("--db_name", type=str, default=None,
+                        help="Scratch database, cleared before loading (default: parity_check for MongoDB, 0 for Redis)")
+    parser.add_argument("--lines", type=int, default=5000, help="Lines of the synthetic log")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic log")
+    args = parser.parse_args()
+    if args.db_name is None:
+        args.db_name = "parity_check" if args.backend == "mongodb" else 0
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_file = os.path.join(work_dir, "access.log")
+        LogGenerator(lines=args.lines, seed=args.seed).write(log_file)
+        load = load_mongodb if args.backend == "mongodb" else load_redis
+        reference, backend = load(log_file, work_dir, args)
+        queries = [(method, query_args) for method, query_args, _, _ in Report.REPORT_QUERIES] + [
+            (method, query_args) for method, query_args in EXTRA_QUERIES
+            if hasattr(reference, method) and hasattr(backend, method)
+        ]
+        mismatches = 0
+        for method, query_args in queries:
+            expected = getattr(reference, method)(*query_args)
+            actual = getattr(backend, method)(*query_args)
+            matches = same_result(expected, actual)
+            mismatches += not matches
+            print(f"{'OK' if matches else 'MISMATCH'}\t{method}{query_args}")
+            if not matches:
+                print(f"\texpected: {expected[:5]}\n\tactual:   {actual[:5]}")
+        if isinstance(reference, Analyzer.LogAnalyzer):
+            reference.db_connector.close()
+    print(f"Запросов: {len(queries)}, расхождений: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
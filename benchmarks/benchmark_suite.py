@@ -0,0 +1,288 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ParserDatabases import Analyzer
+from ParserDatabases import Connector
+from ParserDatabases import Data
+from ParserDatabases import Dictionary
+from ParserDatabases import Mongo
+from ParserDatabases import Parser
+from ParserDatabases import RedisStore
+from ParserDatabases import Report
+from ParserDatabases import Stream
+from ParserDatabases import Vectorized
+
+from log_generator import LogGenerator
+
+# Набор бенчмарков: разбор строк, импорт в каждый выбранный бэкенд, задержка
+# каждого запроса отчёта и экспорт. Результаты пишутся в JSON; если передана
+# базовая линия, метрики сравниваются с ней и ухудшения больше tolerance
+# отмечаются как регрессии (код возврата 1).
+
+# Допустимое относительное ухудшение метрики
+TOLERANCE = 0.25
+# Разница задержек меньше этой (секунды) - шум таймера, а не регрессия
+NOISE_FLOOR_SECONDS = 0.001
+# Режимы SQL-бэкендов: sqlite+rollups, postgresql+normalized и т. п.
+MODES = ('normalized', 'rollups', 'sketches')
+# Таблицы, которые удаляются в базе сервера перед импортом
+SCRATCH_TABLES = (
+    'log_data', 'rollup_status_minute', 'rollup_worker_minute', 'rollup_user_agent_minute',
+    'sketches', 'hll_minute', 'latency_minute', 'data_version', 'import_checkpoints', 'ingest_lag',
+) + tuple(table for table, _ in Dictionary.DIMENSIONS.values())
+
+
+def metric(value, unit, higher_is_better):
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+# Лучшее время из repeat запусков, в секундах
+def measure(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# Вывод загрузчиков и экспорта подавляется, чтобы не смешиваться с таблицей результатов
+def quietly(verbose):
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def query_name(method, args):
+    return f"{method}({', '.join(map(repr, args))})"
+
+
+def benchmark_parse(log_file, repeat):
+    with open(log_file, 'r', errors='replace') as file:
+        lines = file.readlines()
+    parse_line = Parser.parse_line
+
+    def parse():
+        for line in lines:
+            parse_line(line)
+
+    return {'parse': metric(len(lines) / measure(parse, repeat), 'lines/s', True)}
+
+
+# Задержка каждого запроса отчёта без кэша результатов
+def benchmark_queries(log_analyzer, backend, repeat):
+    metrics = {}
+    for method, args, _, _ in Report.REPORT_QUERIES:
+        function = getattr(log_analyzer, method)
+        elapsed = measure(lambda: function(*args), repeat)
+        metrics[f"query.{backend}.{query_name(method, args)}"] = metric(elapsed, 's', False)
+    return metrics
+
+
+# Бэкенды без базы: загрузка - однопроходный разбор файла или построение столбцов NumPy
+def benchmark_in_memory(backend, log_file, repeat):
+    analyzers = []
+
+    def load():
+        if backend == 'stream':
+            analyzers.append(Stream.StreamAnalyzer().process_file(log_file))
+        else:
+            analyzers.append(Vectorized.NumpyLogAnalyzer.from_log_file(log_file))
+
+    elapsed = measure(load, repeat)
+    log_analyzer = analyzers[-1]
+    rows = log_analyzer.rows if backend == 'stream' else len(log_analyzer.status_code)
+    metrics = {f"import.{backend}": metric(rows / elapsed, 'rows/s', True)}
+    metrics.update(benchmark_queries(log_analyzer, backend, repeat))
+    return metrics
+
+
+# Пустая база перед импортом: у SQLite - новый файл, у серверов - удаление таблиц,
+# коллекций и ключей, которые пишет импорт
+def reset_database(db_connector):
+    db_connector.connect()
+    connection = db_connector.connection
+    if db_connector.database == "mongodb":
+        for collection in ('log_data', 'data_version'):
+            connection.drop_collection(collection)
+    elif db_connector.database == "redis":
+        keys = list(connection.scan_iter(match=RedisStore.KEY_PREFIX + '*'))
+        if keys:
+            connection.delete(*keys)
+    else:
+        cursor = connection.cursor()
+        for table in SCRATCH_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.close()
+        connection.commit()
+
+
+def create_connector(database, args, work_dir, run):
+    db_name = os.path.join(work_dir, f"benchmark-{run}.db") if database == "sqlite" else args.db_name
+    return Connector.DatabaseConnector(database, host=args.host, port=args.port, username=args.username,
+                                       password=args.password, db_name=db_name)
+
+
+def create_analyzer(database, db_connector, modes):
+    if database == "mongodb":
+        return Mongo.MongoLogAnalyzer(db_connector)
+    if database == "redis":
+        return RedisStore.RedisLogAnalyzer(db_connector)
+    return Analyzer.LogAnalyzer(db_connector, normalized='normalized' in modes, rollups='rollups' in modes,
+                                sketches='sketches' in modes)
+
+
+# Импорт в чистую базу (лучший из import_repeat), затем запросы и экспорт по последней загрузке
+def benchmark_database(backend, log_file, args, work_dir):
+    database, *modes = backend.split('+')
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise ValueError(f"Unknown mode for {database}: {', '.join(unknown)}")
+    best = None
+    db_connector = None
+    for run in range(args.import_repeat):
+        if db_connector is not None:
+            db_connector.close()
+        db_connector = create_connector(database, args, work_dir, f"{backend}-{run}")
+        reset_database(db_connector)
+        manager = Data.LogDataManager(db_connector, database_type=database, batch_size=args.batch_size,
+                                      normalized='normalized' in modes, rollups='rollups' in modes,
+                                      sketches='sketches' in modes)
+        start_time = time.perf_counter()
+        with quietly(args.verbose):
+            manager.import_log_data(log_file)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    metrics = {f"import.{backend}": metric(manager.rows_imported / best, 'rows/s', True)}
+    metrics.update(benchmark_queries(create_analyzer(database, db_connector, modes), backend, args.repeat))
+
+    export_file = os.path.join(work_dir, f"export-{backend}.log")
+
+    def export():
+        with quietly(args.verbose):
+            manager.export_log_data(export_file, compress=False)
+
+    elapsed = measure(export, args.repeat)
+    metrics[f"export.{backend}"] = metric(manager.rows_imported / elapsed, 'rows/s', True)
+    metrics[f"export.{backend}.bytes"] = metric(os.path.getsize(export_file) / elapsed / 2 ** 20, 'MiB/s', True)
+    os.remove(export_file)
+    db_connector.close()
+    return metrics
+
+
+# Метрики, которые ухудшились сильнее tolerance: (имя, базовое значение, текущее, изменение)
+def find_regressions(metrics, baseline, tolerance=TOLERANCE):
+    regressions = []
+    for name, current in metrics.items():
+        previous = baseline.get(name)
+        if previous is None or not previous['value']:
+            continue
+        change = current['value'] / previous['value'] - 1
+        if current['higher_is_better']:
+            worse = change < -tolerance
+        else:
+            worse = change > tolerance and current['value'] - previous['value'] > NOISE_FLOOR_SECONDS
+        if worse:
+            regressions.append((name, previous['value'], current['value'], change))
+    return regressions
+
+
+def print_comparison(metrics, baseline):
+    print("Metric\tUnit\tBaseline\tCurrent\tChange")
+    for name, current in metrics.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name}\t{current['unit']}\t-\t{current['value']:.6g}\tnew")
+        else:
+            change = current['value'] / previous['value'] - 1 if previous['value'] else 0.0
+            print(f"{name}\t{current['unit']}\t{previous['value']:.6g}\t{current['value']:.6g}\t{change:+.1%}")
+    for name in baseline:
+        if name not in metrics:
+            print(f"{name}\t{baseline[name]['unit']}\t{baseline[name]['value']:.6g}\t-\tmissing")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite: parsing, import, queries and export")
+    parser.add_argument("--backends", type=str, default="stream,numpy,sqlite",
+                        help="Comma-separated backends: stream, numpy, sqlite, mysql, postgresql, mongodb, redis; "
+                             "SQL backends accept modes, e.g. sqlite+rollups")
+    parser.add_argument("--log_file", type=str, default=None, help="Existing log file (default: generate one)")
+    parser.add_argument("--lines", type=int, default=100000, help="Generated lines")
+    parser.add_argument("--seed", type=int, default=1, help="Generator seed")
+    parser.add_argument("--ips", type=int, default=5000, help="Distinct client IPs in the generated log")
+    parser.add_argument("--user_agents", type=int, default=500, help="Distinct User-Agent strings")
+    parser.add_argument("--paths", type=int, default=2000, help="Distinct request paths")
+    parser.add_argument("--domains", type=int, default=50, help="Distinct referer domains")
+    parser.add_argument("--workers", type=int, default=8, help="Distinct balancer workers")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of value frequencies (0 = uniform)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per parse, query and export measurement")
+    parser.add_argument("--import_repeat", type=int, default=1, help="Imports into a fresh database per backend")
+    parser.add_argument("--batch_size", type=int, default=5000, help="Rows per bulk insert batch")
+    parser.add_argument("--host", type=str, default=None, help="Database host for server backends")
+    parser.add_argument("--port", type=int, default=None, help="Database port for server backends")
+    parser.add_argument("--username", type=str, default=None, help="Database username")
+    parser.add_argument("--password", type=str, default=None, help="Database password")
+    parser.add_argument("--db_name", type=str, default="log_benchmark",
+                        help="Scratch database for server backends (its log tables are dropped)")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="JSON file for the results")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed relative slowdown")
+    parser.add_argument("--verbose", action="store_true", help="Show import and export output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="log_benchmark_") as work_dir:
+        if args.log_file:
+            log_file = args.log_file
+            config = {'log_file': os.path.abspath(log_file), 'size': os.path.getsize(log_file)}
+        else:
+            generator = LogGenerator(lines=args.lines, seed=args.seed, ips=args.ips, user_agents=args.user_agents,
+                                     paths=args.paths, domains=args.domains, workers=args.workers,
+                                     skew=args.skew)
+            log_file = os.path.join(work_dir, "access.log")
+            generator.write(log_file)
+            config = generator.config()
+        config.update(repeat=args.repeat, batch_size=args.batch_size)
+
+        metrics = benchmark_parse(log_file, args.repeat)
+        for backend in args.backends.split(','):
+            print(f"Бенчмарк {backend}...")
+            if backend in ('stream', 'numpy'):
+                metrics.update(benchmark_in_memory(backend, log_file, args.repeat))
+            else:
+                metrics.update(benchmark_database(backend, log_file, args, work_dir))
+
+    results = {
+        'config': config,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'metrics': metrics,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline is None:
+        print_comparison(metrics, {})
+        return
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get('config') != config:
+        print("Внимание: параметры базовой линии отличаются, сравнение может быть некорректным.")
+    print_comparison(metrics, baseline['metrics'])
+    regressions = find_regressions(metrics, baseline['metrics'], args.tolerance)
+    for name, previous, current, change in regressions:
+        print(f"Регрессия: {name}: {previous:.6g} -> {current:.6g} ({change:+.1%})")
+    if regressions:
+        sys.exit(1)
+    print("Регрессий нет.")
+
+
+if __name__ == '__main__':
+    main()
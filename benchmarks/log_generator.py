@@ -0,0 +1,152 @@
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+# Детерминированный генератор access-лога в формате Parser.LOG_PATTERN.
+# Одинаковые параметры и seed дают побайтно одинаковый файл. Число различных
+# IP, User-Agent, путей, доменов referer и воркеров задаётся явно, а перекос
+# skew - показатель закона Ципфа: 0 - равномерное распределение, 1 и выше -
+# несколько значений забирают большую часть строк, как в реальных логах.
+
+# Начало лога по умолчанию - фиксированный момент, чтобы файл не зависел от даты запуска
+START_EPOCH = 1696950000
+ZONE = '+0300'
+# Строки генерируются порциями: выборки по весам делаются одним вызовом на порцию
+GENERATE_CHUNK = 100000
+
+METHODS = (('GET', 80), ('POST', 15), ('PUT', 3), ('DELETE', 2))
+STATUS_CODES = ((200, 85), (304, 5), (404, 5), (500, 2), (502, 2), (503, 1))
+SECTIONS = ('api', 'static', 'catalog', 'search', 'account', 'cart')
+# Доля запросов без referer ("-")
+NO_REFERER_SHARE = 0.3
+
+
+# Накопленные веса Ципфа для count значений: вес k-го значения 1 / (k + 1) ** skew
+def zipf_weights(count, skew):
+    total = 0.0
+    weights = []
+    for rank in range(count):
+        total += 1.0 / (rank + 1) ** skew
+        weights.append(total)
+    return weights
+
+
+def cumulative(pairs):
+    total = 0
+    weights = []
+    for _, weight in pairs:
+        total += weight
+        weights.append(total)
+    return [value for value, _ in pairs], weights
+
+
+class LogGenerator:
+    def __init__(self, lines=100000, seed=1, ips=5000, user_agents=500, paths=2000, domains=50, workers=8,
+                 skew=1.0, invalid_ratio=0.001, start_epoch=START_EPOCH, duration=86400):
+        self.lines = lines
+        self.seed = seed
+        self.ips = ips
+        self.user_agents = user_agents
+        self.paths = paths
+        self.domains = domains
+        self.workers = workers
+        self.skew = skew
+        self.invalid_ratio = invalid_ratio
+        self.start_epoch = start_epoch
+        self.duration = duration
+
+    # Параметры генерации: пишутся в результаты бенчмарка для сравнения с базовой линией
+    def config(self):
+        return {
+            'lines': self.lines, 'seed': self.seed, 'ips': self.ips, 'user_agents': self.user_agents,
+            'paths': self.paths, 'domains': self.domains, 'workers': self.workers, 'skew': self.skew,
+            'invalid_ratio': self.invalid_ratio, 'start_epoch': self.start_epoch, 'duration': self.duration,
+        }
+
+    # Строки лога с переводом строки; время растёт равномерно на duration секунд
+    def generate(self):
+        rng = random.Random(self.seed)
+        ip_pool = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(self.ips)]
+        forwarded_pool = [f"172.16.{i >> 8 & 255}.{i & 255}" for i in range(self.ips)]
+        agent_pool = [f"Mozilla/5.0 (compatible; Agent/{i}.0; +https://agent{i}.example)"
+                      for i in range(self.user_agents)]
+        path_pool = [f"/{SECTIONS[i % len(SECTIONS)]}/v{i % 3 + 1}/item/{i}" for i in range(self.paths)]
+        domain_pool = [f"https://site{i}.example.com" for i in range(self.domains)]
+        worker_pool = [str(i + 1) for i in range(self.workers)]
+        ip_weights = zipf_weights(self.ips, self.skew)
+        agent_weights = zipf_weights(self.user_agents, self.skew)
+        path_weights = zipf_weights(self.paths, self.skew)
+        domain_weights = zipf_weights(self.domains, self.skew)
+        worker_weights = zipf_weights(self.workers, self.skew / 4)
+        methods, method_weights = cumulative(METHODS)
+        status_codes, status_weights = cumulative(STATUS_CODES)
+        zone = timezone(timedelta(hours=int(ZONE[1:3]), minutes=int(ZONE[3:5])))
+        step = self.duration / max(self.lines, 1)
+
+        timestamps = {}
+        for chunk_start in range(0, self.lines, GENERATE_CHUNK):
+            count = min(GENERATE_CHUNK, self.lines - chunk_start)
+            ips = rng.choices(range(self.ips), cum_weights=ip_weights, k=count)
+            forwarded = rng.choices(range(self.ips), cum_weights=ip_weights, k=count)
+            agents = rng.choices(agent_pool, cum_weights=agent_weights, k=count)
+            paths = rng.choices(path_pool, cum_weights=path_weights, k=count)
+            domains = rng.choices(domain_pool, cum_weights=domain_weights, k=count)
+            workers = rng.choices(worker_pool, cum_weights=worker_weights, k=count)
+            request_methods = rng.choices(methods, cum_weights=method_weights, k=count)
+            statuses = rng.choices(status_codes, cum_weights=status_weights, k=count)
+            for i in range(count):
+                if rng.random() < self.invalid_ratio:
+                    yield f"malformed line {chunk_start + i} without the expected fields\n"
+                    continue
+                epoch = self.start_epoch + int((chunk_start + i) * step)
+                timestamp = timestamps.get(epoch)
+                if timestamp is None:
+                    # Соседние строки повторяют одну секунду; хранится только последняя
+                    timestamps.clear()
+                    timestamp = timestamps[epoch] = \
+                        datetime.fromtimestamp(epoch, zone).strftime('%d/%b/%Y:%H:%M:%S ') + ZONE
+                status_code = statuses[i]
+                size = 0 if status_code == 304 else rng.randint(200, 50000)
+                time_taken = int(rng.expovariate(0.01))
+                referer = '-' if rng.random() < NO_REFERER_SHARE \
+                    else f"{domains[i]}{paths[rng.randrange(count)]}"
+                yield f"{ip_pool[ips[i]]} ({forwarded_pool[forwarded[i]]}) - - [{timestamp}] " \
+                      f"\"{request_methods[i]} {paths[i]} HTTP/1.1\" {status_code} {size} {time_taken} " \
+                      f"{workers[i]} \"{referer}\" \"{agents[i]}\"\n"
+
+    # Пишет лог в файл и возвращает число строк, которые разберёт Parser.parse_line
+    def write(self, log_file):
+        valid = 0
+        with open(log_file, 'w', buffering=1024 * 1024) as file:
+            for line in self.generate():
+                file.write(line)
+                valid += not line.startswith('malformed')
+        return valid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic synthetic access log generator")
+    parser.add_argument("output", type=str, help="Log file to write")
+    parser.add_argument("--lines", type=int, default=100000, help="Number of lines")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed gives the same file")
+    parser.add_argument("--ips", type=int, default=5000, help="Distinct client IPs")
+    parser.add_argument("--user_agents", type=int, default=500, help="Distinct User-Agent strings")
+    parser.add_argument("--paths", type=int, default=2000, help="Distinct request paths")
+    parser.add_argument("--domains", type=int, default=50, help="Distinct referer domains")
+    parser.add_argument("--workers", type=int, default=8, help="Distinct balancer workers")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent (0 = uniform)")
+    parser.add_argument("--invalid_ratio", type=float, default=0.001, help="Share of malformed lines")
+    parser.add_argument("--start_epoch", type=int, default=START_EPOCH, help="Unix time of the first line")
+    parser.add_argument("--duration", type=int, default=86400, help="Seconds covered by the log")
+    args = parser.parse_args()
+
+    generator = LogGenerator(lines=args.lines, seed=args.seed, ips=args.ips, user_agents=args.user_agents,
+                             paths=args.paths, domains=args.domains, workers=args.workers, skew=args.skew,
+                             invalid_ratio=args.invalid_ratio, start_epoch=args.start_epoch,
+                             duration=args.duration)
+    valid = generator.write(args.output)
+    print(f"Записано строк: {args.lines}, из них корректных: {valid}")
+
+
+if __name__ == '__main__':
+    main()
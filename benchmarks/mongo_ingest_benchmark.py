@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ParserDatabases import Loader
+from ParserDatabases import Mongo
+from ParserDatabases import Parser
+from ParserDatabases import Reader
+
+SAMPLE_LINES = [
+    '192.168.1.10 (10.0.0.1) - - [10/Oct/2023:13:55:36 +0300] "GET /api/v1/items HTTP/1.1" 200 5124 87 1 "https://example.com/catalog" "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"',
+    '192.168.1.11 (10.0.0.2) - - [10/Oct/2023:13:55:36 +0300] "POST /api/v1/orders HTTP/1.1" 201 312 143 2 "-" "curl/8.1.2"',
+    '192.168.1.12 (10.0.0.3) - - [10/Oct/2023:13:55:37 +0300] "GET /static/app.js HTTP/1.1" 304 0 3 1 "https://example.com/" "Mozilla/5.0 (X11; Linux x86_64)"',
+    '192.168.1.13 (10.0.0.4) - - [10/Oct/2023:13:55:38 +0300] "GET /api/v1/items/7 HTTP/1.1" 502 0 3012 3 "https://example.org/item" "Mozilla/5.0 (Macintosh)"',
+]
+
+
+# Загрузка в том виде, в котором она была: упорядоченная вставка документов со всеми полями
+class OrderedMongoLoader(Loader.BulkLoader):
+    def write_batch(self, batch):
+        documents = [dict(zip(Loader.LOG_DATA_COLUMNS, values)) for values in batch]
+        self.connection['log_data'].insert_many(documents)
+
+    def commit(self):
+        pass
+
+
+def load_rows(log_file, lines):
+    if log_file:
+        parse_line = Parser.parse_line
+        return [values for values in map(parse_line, Reader.read_lines(log_file)) if values is not None]
+    sample = [Parser.parse_line(line) for line in SAMPLE_LINES]
+    return [sample[i % len(sample)][:10] + (sample[i % len(sample)][10] + i,) for i in range(lines)]
+
+
+def connect(args):
+    if args.mock:
+        import mongomock
+        return mongomock.MongoClient()[args.db_name]
+    from pymongo import MongoClient
+    return MongoClient(args.host, args.port, username=args.username, password=args.password)[args.db_name]
+
+
+# Строк в секунду для одного варианта; коллекция пересоздаётся перед каждым прогоном
+def measure(database, loader_class, rows, batch_size, indexes_during_load):
+    database.drop_collection('log_data')
+    if indexes_during_load:
+        Mongo.create_indexes(database)
+    start_time = time.perf_counter()
+    loader_class(database, batch_size).load(rows)
+    if not indexes_during_load:
+        Mongo.create_indexes(database)
+    return len(rows) / (time.perf_counter() - start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MongoDB ingestion benchmark")
+    parser.add_argument("--host", type=str, default="localhost", help="MongoDB host")
+    parser.add_argument("--port", type=int, default=27017, help="MongoDB port")
+    parser.add_argument("--username", type=str, default=None, help="MongoDB username")
+    parser.add_argument("--password", type=str, default=None, help="MongoDB password")
+    parser.add_argument("--db_name", type=str, default="log_benchmark", help="Scratch database (log_data is dropped)")
+    parser.add_argument("--mock", action="store_true", help="Use mongomock instead of a running mongod")
+    parser.add_argument("--log_file", type=str, default=None, help="Log file to load (default: built-in sample)")
+    parser.add_argument("--lines", type=int, default=200000, help="Number of sample rows when no log file is given")
+    parser.add_argument("--batch_sizes", type=str, default="1000,5000,20000", help="Comma-separated batch sizes")
+    args = parser.parse_args()
+
+    rows = load_rows(args.log_file, args.lines)
+    database = connect(args)
+    print(f"Rows: {len(rows)}")
+    print("Loader\tBatch size\tIndexes\tRows/sec")
+    for batch_size in map(int, args.batch_sizes.split(',')):
+        for name, loader_class in (("ordered, all fields", OrderedMongoLoader),
+                                   ("unordered, typed", Loader.MongoBulkLoader)):
+            for indexes_during_load in (True, False):
+                rate = measure(database, loader_class, rows, batch_size, indexes_during_load)
+                print(f"{name}\t{batch_size}\t{'during load' if indexes_during_load else 'after load'}\t{rate:.0f}")
+    database.drop_collection('log_data')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ParserDatabases import Parser
+
+SAMPLE_LINES = [
+    '192.168.1.10 (10.0.0.1) - - [10/Oct/2023:13:55:36 +0300] "GET /api/v1/items HTTP/1.1" 200 5124 87 1 "https://example.com/catalog" "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"',
+    '192.168.1.11 (10.0.0.2) - - [10/Oct/2023:13:55:36 +0300] "POST /api/v1/orders HTTP/1.1" 201 312 143 2 "-" "curl/8.1.2"',
+    '192.168.1.12 (10.0.0.3) - - [10/Oct/2023:13:55:37 +0300] "GET /static/app.js HTTP/1.1" 304 0 3 1 "https://example.com/" "Mozilla/5.0 (X11; Linux x86_64)"',
+    'malformed line without the expected fields',
+]
+
+
+# Разбор в том виде, в котором он был в import_log_data
+def parse_legacy(lines):
+    for line in lines:
+        regex = r'^(?P<ip_address>\S+) \((?P<forwarded_for>\S+)\) - - \[(?P<timestamp>[\w:/]+\s[+\-]\d{4})\] "(?P<request>[A-Z]+ \S+ \S+)" (?P<status_code>\d+) (?P<response_size>\d+) (?P<time_taken>\d+) (?P<balancer_worker_name>\d+) "(?P<Referer>[^"]*)" "(?P<user_agent>[^"]*)"'
+        match = re.match(regex, line)
+        if match:
+            ip_address = match.group('ip_address')
+            forwarded_for = match.group('forwarded_for')
+            timestamp = match.group('timestamp')
+            request = match.group('request')
+            status_code = match.group('status_code')
+            response_size = match.group('response_size')
+            time_taken = match.group('time_taken')
+            balancer_worker_name = match.group('balancer_worker_name')
+            referer = match.group('Referer')
+            user_agent = match.group('user_agent')
+
+
+def parse_compiled(lines):
+    parse_line = Parser.parse_line
+    for line in lines:
+        parse_line(line)
+
+
+def measure(function, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(lines)
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return len(lines) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Access log parser micro-benchmark")
+    parser.add_argument("--log_file", type=str, default=None, help="Log file to benchmark on (default: built-in sample)")
+    parser.add_argument("--lines", type=int, default=200000, help="Number of sample lines when no log file is given")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs; the best one is reported")
+    args = parser.parse_args()
+
+    if args.log_file:
+        with open(args.log_file, 'r', errors='replace') as file:
+            lines = file.read().splitlines()
+    else:
+        lines = (SAMPLE_LINES * (args.lines // len(SAMPLE_LINES) + 1))[:args.lines]
+
+    legacy = measure(parse_legacy, lines, args.repeat)
+    compiled = measure(parse_compiled, lines, args.repeat)
+    print("Parser\tLines/sec")
+    print(f"legacy re.match + group()\t{legacy:.0f}")
+    print(f"Parser.parse_line\t{compiled:.0f}")
+    print(f"Speed-up\t{compiled / legacy:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -81,28 +81,27 @@ def import_log_data(connection, log_file):
     """
     cursor.execute(create_table_query)
 
+    # Файл читается построчно, без загрузки целиком в память
     with open(log_file, 'r') as file:
-        log_data = file.readlines()
-
-    for line in log_data:
-        regex = r'^(?P<ip_address>\S+) \((?P<forwarded_for>\S+)\) - - \[(?P<timestamp>[\w:/]+\s[+\-]\d{4})\] "(?P<request>[A-Z]+ \S+ \S+)" (?P<status_code>\d+) (?P<response_size>\d+) (?P<time_taken>\d+) (?P<balancer_worker_name>\d+) "(?P<Referer>[^"]*)" "(?P<user_agent>[^"]*)"'
-        match = re.match(regex, line)
-        if match:
-            ip_address = match.group('ip_address')
-            forwarded_for = match.group('forwarded_for')
-            timestamp = match.group('timestamp')
-            request = match.group('request')
-            status_code = match.group('status_code')
-            response_size = match.group('response_size')
-            time_taken = match.group('time_taken')
-            balancer_worker_name = match.group('balancer_worker_name')
-            referer = match.group('Referer')
-            user_agent = match.group('user_agent')
-
-            sql = "INSERT INTO log_data (ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, referer, user_agent, balancer_worker_name) " \
-                  "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-            values = (ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, referer, user_agent, balancer_worker_name)
-            cursor.execute(sql, values)
+        for line in file:
+            regex = r'^(?P<ip_address>\S+) \((?P<forwarded_for>\S+)\) - - \[(?P<timestamp>[\w:/]+\s[+\-]\d{4})\] "(?P<request>[A-Z]+ \S+ \S+)" (?P<status_code>\d+) (?P<response_size>\d+) (?P<time_taken>\d+) (?P<balancer_worker_name>\d+) "(?P<Referer>[^"]*)" "(?P<user_agent>[^"]*)"'
+            match = re.match(regex, line)
+            if match:
+                ip_address = match.group('ip_address')
+                forwarded_for = match.group('forwarded_for')
+                timestamp = match.group('timestamp')
+                request = match.group('request')
+                status_code = match.group('status_code')
+                response_size = match.group('response_size')
+                time_taken = match.group('time_taken')
+                balancer_worker_name = match.group('balancer_worker_name')
+                referer = match.group('Referer')
+                user_agent = match.group('user_agent')
+
+                sql = "INSERT INTO log_data (ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, referer, user_agent, balancer_worker_name) " \
+                      "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+                values = (ip_address, forwarded_for, timestamp, request, status_code, response_size, time_taken, referer, user_agent, balancer_worker_name)
+                cursor.execute(sql, values)
 
     connection.commit()
     cursor.close()
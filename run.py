@@ -1,39 +1,149 @@
 import argparse
 import logging 
+import sys
+import time
 from ParserDatabases import Connector
 from ParserDatabases import Analyzer
+from ParserDatabases import Cache
+from ParserDatabases import Columnar
 from ParserDatabases import Data
+from ParserDatabases import Mongo
+from ParserDatabases import RedisStore
+from ParserDatabases import Report
+from ParserDatabases import Stream
+from ParserDatabases import Vectorized
 
 def main():
     parser = argparse.ArgumentParser(description="Log Analyzer")
-    parser.add_argument("--database", type=str, required=True, choices=["mysql", "postgresql", "sqlite", "h2", "mongodb", "redis"], help="Database type")
-    parser.add_argument("--host", type=str, required=True, help="Database host")
-    parser.add_argument("--port", type=int, required=True, help="Database port")
-    parser.add_argument("--username", type=str, required=True, help="Database username")
-    parser.add_argument("--password", type=str, required=True, help="Database password")
-    parser.add_argument("--db_name", type=str, required=True, help="Database name")
+    parser.add_argument("--database", type=str, choices=["mysql", "postgresql", "sqlite", "h2", "mongodb", "redis"], help="Database type")
+    parser.add_argument("--host", type=str, help="Database host")
+    parser.add_argument("--port", type=int, help="Database port")
+    parser.add_argument("--username", type=str, help="Database username")
+    parser.add_argument("--password", type=str, help="Database password")
+    parser.add_argument("--db_name", type=str, help="Database name")
     parser.add_argument("--log_file", type=str, required=True, help="Path to the log file")
+    parser.add_argument("--chunk_size", type=int, default=1024 * 1024, help="Read buffer size in bytes")
+    parser.add_argument("--batch_size", type=int, default=5000, help="Rows per bulk insert batch")
+    parser.add_argument("--workers", type=int, default=1, help="Number of parser processes")
+    parser.add_argument("--defer_indexes", action=argparse.BooleanOptionalAction, default=None,
+                        help="Drop secondary indexes during bulk load and rebuild them afterwards "
+                             "(default: only when log_data is empty)")
+    parser.add_argument("--normalized", action="store_true",
+                        help="Store user_agent, referer and request in dictionary tables")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Import only lines appended since the previous run (checkpoint per file)")
+    parser.add_argument("--follow", action="store_true",
+                        help="Tail the log file like tail -F and load new lines in micro-batches")
+    parser.add_argument("--follow_batch_rows", type=int, default=5000, help="Max rows per micro-batch in follow mode")
+    parser.add_argument("--follow_latency_ms", type=int, default=500, help="Max micro-batch latency in follow mode")
+    parser.add_argument("--rollups", action="store_true",
+                        help="Maintain per-minute rollup tables during import and answer queries from them")
+    parser.add_argument("--sqlite_cache_mb", type=int, default=None,
+                        help="SQLite page cache for the import connection in MB (default: SQLite's own)")
+    parser.add_argument("--sqlite_mmap_mb", type=int, default=None,
+                        help="SQLite memory-mapped I/O for the import connection in MB (default: off)")
+    parser.add_argument("--max_memory_mb", type=float, default=None, help="Fail if peak memory during import exceeds this value")
+    parser.add_argument("--sketches", action="store_true",
+                        help="Maintain sketches during import (top-K user agents and IP/UA pairs, per-minute "
+                             "HyperLogLog distinct counts, per-worker latency quantiles) and answer those queries from them")
+    parser.add_argument("--top_k_capacity", type=int, default=1000, help="Counters per top-K sketch")
+    parser.add_argument("--columnar_cache", type=str, default=None,
+                        help="Directory of the columnar cache of parsed records (written if missing or stale)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap reading, parsing and database writes in separate threads")
+    parser.add_argument("--result_cache_file", type=str, default=None,
+                        help="Persist LogAnalyzer results between runs; entries expire when new data is imported")
+    parser.add_argument("--report_concurrency", type=int, default=4,
+                        help="Maximum number of report queries running at the same time")
+    parser.add_argument("--report_timeout", type=float, default=60.0, help="Per-query report timeout in seconds")
+    parser.add_argument("--export_file", type=str, default="exported_log_file.txt",
+                        help="Export destination; a .gz suffix enables gzip compression")
+    parser.add_argument("--export_workers", type=int, default=1, help="Parallel export connections (split by id range)")
+    parser.add_argument("--export_fetch_size", type=int, default=10000, help="Rows per fetchmany batch during export")
+    parser.add_argument("--no-db", dest="no_db", action="store_true",
+                        help="Compute the report in a single pass over the log file without a database")
+    parser.add_argument("--engine", type=str, default="stream", choices=["stream", "numpy"],
+                        help="In-memory engine for --no-db: single-pass counters or NumPy column arrays")
     args = parser.parse_args()
 
+    if args.no_db and args.engine == "numpy":
+        if args.columnar_cache is not None:
+            if not Columnar.is_fresh(args.columnar_cache, args.log_file):
+                Columnar.build_cache(args.columnar_cache, args.log_file, chunk_size=args.chunk_size)
+            numpy_analyzer = Vectorized.NumpyLogAnalyzer.from_columnar(args.columnar_cache)
+        else:
+            numpy_analyzer = Vectorized.NumpyLogAnalyzer.from_log_file(args.log_file, chunk_size=args.chunk_size)
+        Report.print_report(Report.run_report(numpy_analyzer, concurrency=1))
+        return
+    if args.no_db:
+        stream_analyzer = Stream.StreamAnalyzer(top_k_capacity=args.top_k_capacity if args.sketches else None)
+        if args.columnar_cache is not None:
+            if not Columnar.is_fresh(args.columnar_cache, args.log_file):
+                Columnar.build_cache(args.columnar_cache, args.log_file, chunk_size=args.chunk_size)
+            cache = Columnar.ColumnarCache(args.columnar_cache)
+            stream_analyzer.process_rows(cache.iter_rows())
+            stream_analyzer.rejected = cache.rejected
+            cache.close()
+        else:
+            stream_analyzer.process_file(args.log_file, chunk_size=args.chunk_size, workers=args.workers)
+        print(f"Обработано строк: {stream_analyzer.rows}, отброшено: {stream_analyzer.rejected}")
+        Report.print_report(Report.run_report(stream_analyzer, concurrency=1))
+        return
+    # Встроенной SQLite нужен только путь к файлу базы (или :memory:)
+    required = ("database", "db_name") if args.database == "sqlite" \
+        else ("database", "host", "port", "username", "password", "db_name")
+    missing = [name for name in required if getattr(args, name) is None]
+    if missing:
+        parser.error("the following arguments are required without --no-db: "
+                     + ", ".join("--" + name for name in missing))
+
     db_connector = Connector.DatabaseConnector(
         args.database,
         host=args.host,
         port=args.port,
         username=args.username,
         password=args.password,
-        db_name=args.db_name
+        db_name=args.db_name,
+        pool_size=args.report_concurrency + 1,
+        sqlite_cache_mb=args.sqlite_cache_mb,
+        sqlite_mmap_mb=args.sqlite_mmap_mb
     )
     db_connector.connect()
-    log_data_manager = Data.LogDataManager(db_connector, database_type=args.database)
+    log_data_manager = Data.LogDataManager(db_connector, database_type=args.database, chunk_size=args.chunk_size,
+                                           batch_size=args.batch_size, workers=args.workers,
+                                           defer_indexes=args.defer_indexes, normalized=args.normalized,
+                                           incremental=args.incremental, rollups=args.rollups,
+                                           sketches=args.sketches, sketch_capacity=args.top_k_capacity,
+                                           columnar_cache=args.columnar_cache, pipeline=args.pipeline)
+    if args.follow:
+        log_data_manager.follow_log_data(args.log_file, max_batch_rows=args.follow_batch_rows,
+                                         max_latency=args.follow_latency_ms / 1000)
+        return
     log_data_manager.import_log_data(args.log_file)
-    log_analyzer = Analyzer.LogAnalyzer(db_connector)
-    log_data_manager.export_log_data("exported_log_file.txt")
-    
-    ip_user_agent_stats = log_analyzer.get_ip_user_agent_statistics(5)
-    print("IP Address\tUser Agent\tFrequency")
-    for stats in ip_user_agent_stats:
-        print(f"{stats[0]}\t{stats[1]}\t{stats[2]}")
-        
+    if args.max_memory_mb is not None and log_data_manager.peak_memory_mb is not None \
+            and log_data_manager.peak_memory_mb > args.max_memory_mb:
+        print(f"Превышен лимит памяти: {log_data_manager.peak_memory_mb:.1f} МБ > {args.max_memory_mb} МБ")
+        sys.exit(1)
+    result_cache = Cache.ResultCache(path=args.result_cache_file) if args.result_cache_file else None
+    if args.database == "mongodb":
+        log_analyzer = Mongo.MongoLogAnalyzer(db_connector, result_cache=result_cache)
+    elif args.database == "redis":
+        log_analyzer = RedisStore.RedisLogAnalyzer(db_connector, result_cache=result_cache)
+    else:
+        log_analyzer = Analyzer.LogAnalyzer(db_connector, normalized=args.normalized, rollups=args.rollups,
+                                            sketches=args.sketches, result_cache=result_cache)
+    log_data_manager.export_log_data(args.export_file, workers=args.export_workers, fetch_size=args.export_fetch_size)
+
+    # Запросы отчёта независимы и идут параллельно на соединениях из пула;
+    # клиенты MongoDB и Redis потокобезопасны и ведут собственные пулы
+    concurrency = 1 if db_connector.shared and args.database not in ("mongodb", "redis") else args.report_concurrency
+    start_time = time.time()
+    results = Report.run_report(log_analyzer, concurrency=concurrency, timeout=args.report_timeout)
+    Report.print_report(results)
+    print(f"Отчёт построен за {time.time() - start_time} секунд.")
+    if result_cache is not None:
+        result_cache.close()
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     main()